@@ -0,0 +1,256 @@
+"""
+Admission Control
+Caps concurrent outbound work per upstream host and bounds the total
+number of requests waiting for a slot. When saturated, requests are shed
+immediately with 503 + Retry-After instead of piling up and slowing every
+route down together; auth/device-code polling is admitted ahead of search
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Lower value = admitted first
+PRIORITY_AUTH = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_SEARCH = 2
+
+# (path prefix, upstream host, priority); first match wins, so more
+# specific prefixes come first. Unlisted routes aren't admission-controlled
+ADMISSION_ROUTES: Tuple[Tuple[str, str, int], ...] = (
+    ("/api/debrid/real-debrid/device-code", "api.real-debrid.com", PRIORITY_AUTH),
+    ("/api/debrid/real-debrid/credentials", "api.real-debrid.com", PRIORITY_AUTH),
+    ("/api/debrid/real-debrid/token", "api.real-debrid.com", PRIORITY_AUTH),
+    ("/api/debrid/alldebrid/pin", "api.alldebrid.com", PRIORITY_AUTH),
+    ("/api/debrid/torbox/device-", "api.torbox.app", PRIORITY_AUTH),
+    ("/api/trakt/device/", "api.trakt.tv", PRIORITY_AUTH),
+    ("/api/debrid/cache/search/", "api.real-debrid.com", PRIORITY_SEARCH),
+    ("/api/debrid/cache/stream", "api.real-debrid.com", PRIORITY_DEFAULT),
+    ("/api/debrid/cache/check", "multi-debrid", PRIORITY_SEARCH),
+    ("/api/debrid/cache/season", "api.real-debrid.com", PRIORITY_SEARCH),
+    ("/api/debrid/real-debrid/", "api.real-debrid.com", PRIORITY_DEFAULT),
+    ("/api/debrid/alldebrid/cache/", "api.alldebrid.com", PRIORITY_SEARCH),
+    ("/api/debrid/premiumize/cache/", "www.premiumize.me", PRIORITY_SEARCH),
+    ("/api/debrid/premiumize/", "www.premiumize.me", PRIORITY_DEFAULT),
+    ("/api/debrid/torbox/", "api.torbox.app", PRIORITY_DEFAULT),
+    ("/api/torrents/torrentio/", "torrentio.strem.fun", PRIORITY_SEARCH),
+    ("/api/torrentio/", "torrentio.strem.fun", PRIORITY_SEARCH),
+    ("/api/torrents/", "scrapers", PRIORITY_SEARCH),
+    ("/api/proxy/", "proxy", PRIORITY_DEFAULT),
+    ("/api/debug/upload-gofile", "api.gofile.io", PRIORITY_DEFAULT),
+)
+
+
+def match_route(path: str) -> Optional[Tuple[str, int]]:
+    """Upstream host and priority for a request path, None if uncontrolled"""
+    for prefix, host, priority in ADMISSION_ROUTES:
+        if path.startswith(prefix):
+            return host, priority
+    return None
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; carries the suggested Retry-After"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _HostGate:
+    """Priority semaphore for one upstream host (event-loop only)"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.admitted = 0
+        self.shed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.hold_ewma = 0.5
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self.waiters if not future.done())
+
+    def release(self, held: float):
+        self.hold_ewma = 0.8 * self.hold_ewma + 0.2 * held
+        # Hand the slot straight to the best live waiter
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        backlog = self.queued / max(self.limit, 1) + 1
+        return max(1, min(30, math.ceil(self.hold_ewma * backlog)))
+
+
+class AdmissionController:
+    """
+    Per-host concurrency limits plus a global bound on queued requests
+
+    Auth requests may use `auth_reserve` queue places beyond `max_queue`,
+    and are always woken before other priorities on the same host
+    """
+
+    def __init__(
+        self,
+        host_limit: int = 32,
+        host_limits: Optional[Dict[str, int]] = None,
+        max_queue: int = 200,
+        auth_reserve: int = 20,
+        max_wait: float = 10
+    ):
+        self.host_limit = host_limit
+        self.host_limits = host_limits or {}
+        self.max_queue = max_queue
+        self.auth_reserve = auth_reserve
+        self.max_wait = max_wait
+        self._gates: Dict[str, _HostGate] = {}
+        self._seq = itertools.count()
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        # ADMISSION_HOST_LIMITS="api.real-debrid.com=16,torrentio.strem.fun=24"
+        host_limits = {}
+        for item in os.environ.get("ADMISSION_HOST_LIMITS", "").split(","):
+            if "=" in item:
+                host, limit = item.split("=", 1)
+                host_limits[host.strip()] = int(limit)
+        return cls(
+            host_limit=int(os.environ.get("ADMISSION_HOST_LIMIT", "32")),
+            host_limits=host_limits,
+            max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", "200")),
+            auth_reserve=int(os.environ.get("ADMISSION_AUTH_RESERVE", "20")),
+            max_wait=float(os.environ.get("ADMISSION_MAX_WAIT", "10")),
+        )
+
+    def _gate(self, host: str) -> _HostGate:
+        gate = self._gates.get(host)
+        if gate is None:
+            gate = _HostGate(self.host_limits.get(host, self.host_limit))
+            self._gates[host] = gate
+        return gate
+
+    async def admit(self, host: str, priority: int) -> float:
+        """Wait for a slot on `host`; returns the time spent queued, raises Overloaded"""
+        gate = self._gate(host)
+        if gate.active < gate.limit and not gate.queued:
+            gate.active += 1
+            gate.admitted += 1
+            return 0.0
+
+        queue_limit = self.max_queue + (self.auth_reserve if priority == PRIORITY_AUTH else 0)
+        if self.queued >= queue_limit:
+            gate.shed += 1
+            self.shed_queue_full += 1
+            raise Overloaded("Server busy, queue full", gate.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(gate.waiters, (priority, next(self._seq), future))
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Client went away: pass on a slot that was already handed to us
+            if future.done() and not future.cancelled():
+                gate.release(0.0)
+            future.cancel()
+            raise
+        finally:
+            self.queued -= 1
+        waited = time.monotonic() - started
+
+        if not future.done():
+            future.cancel()
+            gate.shed += 1
+            self.shed_timeout += 1
+            raise Overloaded(f"Server busy, no {host} slot within {self.max_wait:.0f}s", gate.retry_after())
+
+        gate.admitted += 1
+        gate.wait_seconds += waited
+        gate.max_wait_seconds = max(gate.max_wait_seconds, waited)
+        return waited
+
+    def release(self, host: str, held: float):
+        self._gate(host).release(held)
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "hosts": {
+                host: {
+                    "limit": gate.limit,
+                    "active": gate.active,
+                    "queued": gate.queued,
+                    "admitted": gate.admitted,
+                    "shed": gate.shed,
+                    "avg_queue_wait_ms": round(gate.wait_seconds / gate.admitted * 1000, 1) if gate.admitted else 0.0,
+                    "max_queue_wait_ms": round(gate.max_wait_seconds * 1000, 1),
+                }
+                for host, gate in self._gates.items()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware applying an AdmissionController to ADMISSION_ROUTES
+
+    The slot is held until the response (including streamed bodies) has
+    been sent, since that's how long the upstream connection is in use
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        route = match_route(scope["path"])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        host, priority = route
+        try:
+            waited = await self.controller.admit(host, priority)
+        except Overloaded as e:
+            response = JSONResponse(
+                {"detail": e.reason},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        if waited > 1.0:
+            logger.info(f"Admission: {scope['path']} queued {waited:.2f}s for {host}")
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(host, time.monotonic() - started)
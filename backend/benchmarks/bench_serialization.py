@@ -0,0 +1,76 @@
+"""
+Serialization benchmark for search responses
+Compares FastAPI's default path (jsonable_encoder + stdlib json) with the
+orjson and msgpack responses from fast_response, per response size
+
+Run from backend/:  python benchmarks/bench_serialization.py
+"""
+
+import json
+import sys
+import timeit
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fast_response import FastJSONResponse, MsgPackResponse  # noqa: E402
+
+SIZES = [10, 100, 500, 1000, 5000]
+QUALITIES = ['4K', '1080p', '720p', '480p']
+
+
+def build_payload(count: int) -> dict:
+    """Build a cache-search style response with `count` results"""
+    results = []
+    for i in range(count):
+        info_hash = f"{i:040x}"
+        results.append({
+            'hash': info_hash,
+            'title': f"Some.Movie.2024.{QUALITIES[i % 4]}.WEB-DL.x265 👤 {i * 3} 💾 {1 + i % 20}.4 GB",
+            'quality': QUALITIES[i % 4],
+            'size': f"{1 + i % 20}.4 GB",
+            'seeders': i * 3,
+            'source': 'Torrentio',
+            'cached': i % 3 == 0,
+            'file_id': str(i % 7) if i % 3 == 0 else None,
+            'filename': f"Some.Movie.2024.{QUALITIES[i % 4]}.mkv" if i % 3 == 0 else '',
+            'filesize': 1_500_000_000 + i,
+            'magnet': f"magnet:?xt=urn:btih:{info_hash}",
+        })
+    return {"success": True, "count": count, "results": results, "source": "Real-Debrid Cache"}
+
+
+def default_path(payload: dict) -> bytes:
+    """What FastAPI does for a plain dict return value"""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def main():
+    print(f"{'results':>8} {'default µs':>12} {'orjson µs':>11} {'msgpack µs':>11} "
+          f"{'json KB':>9} {'msgpack KB':>11} {'speedup':>8}")
+
+    for size in SIZES:
+        payload = build_payload(size)
+        number = max(5, 20000 // size)
+
+        default_us = timeit.timeit(lambda: default_path(payload), number=number) / number * 1e6
+        orjson_us = timeit.timeit(lambda: FastJSONResponse(payload).body, number=number) / number * 1e6
+        msgpack_us = timeit.timeit(lambda: MsgPackResponse(payload).body, number=number) / number * 1e6
+
+        json_kb = len(FastJSONResponse(payload).body) / 1024
+        msgpack_kb = len(MsgPackResponse(payload).body) / 1024
+
+        print(f"{size:>8} {default_us:>12.1f} {orjson_us:>11.1f} {msgpack_us:>11.1f} "
+              f"{json_kb:>9.1f} {msgpack_kb:>11.1f} {default_us / orjson_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
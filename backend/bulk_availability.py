@@ -0,0 +1,295 @@
+"""
+Bulk Availability Jobs
+Answers "which of these (up to 100) titles are instantly playable, and at
+what quality" for watchlist badges. A job is submitted once and its
+per-title results are streamed back as NDJSON while it runs.
+
+- Indexer fan-outs from every running job share a fixed worker pool and
+  are taken round-robin across jobs, so one large watchlist can't starve
+  another user's; they go through TorrentIndexers (and its cache)
+- Titles whose hashes are ready are grouped, and each group gets one
+  batched debrid availability check instead of one per title
+- Job progress lives in MongoDB (TTL-indexed), so any worker can serve
+  a job's stream; debrid credentials are only held in memory
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+import orjson
+from pymongo.errors import PyMongoError
+from starlette.concurrency import run_in_threadpool
+
+from debrid_cache_search import MultiDebridAvailability, RealDebridCacheSearch, TorrentIndexers
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    def __init__(self, job_id: str, total: int, credentials: Dict[str, str]):
+        self.job_id = job_id
+        self.total = total
+        self.credentials = credentials
+        self.ready: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+
+class BulkAvailabilityService:
+    """Runs bulk availability jobs on the event loop of this worker"""
+
+    def __init__(
+        self,
+        db,
+        workers: int = 4,
+        batch_titles: int = 10,
+        batch_wait: float = 1.0,
+        job_ttl: float = 3600,
+        max_titles: int = 100
+    ):
+        self.jobs = db.availability_jobs
+        self.workers = workers
+        self.batch_titles = batch_titles
+        self.batch_wait = batch_wait
+        self.job_ttl = job_ttl
+        self.max_titles = max_titles
+        self._pending: "OrderedDict[str, Deque[Dict]]" = OrderedDict()
+        self._running: Dict[str, _Job] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self.jobs_submitted = 0
+        self.titles_checked = 0
+        self.availability_batches = 0
+
+    @classmethod
+    def from_env(cls, db) -> "BulkAvailabilityService":
+        return cls(
+            db,
+            workers=int(os.environ.get("BULK_AVAILABILITY_WORKERS", "4")),
+            batch_titles=int(os.environ.get("BULK_AVAILABILITY_BATCH", "10")),
+        )
+
+    async def ensure_indexes(self):
+        try:
+            await self.jobs.create_index("expires_at", expireAfterSeconds=0)
+        except PyMongoError as e:
+            logger.error(f"Bulk availability index error: {e}")
+
+    def start(self):
+        """Start the shared indexer workers on the running event loop"""
+        if self._worker_tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        tasks = self._worker_tasks + [job.task for job in self._running.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._running.clear()
+        self._pending.clear()
+
+    # ----------------------------------------
+    # Submission
+    # ----------------------------------------
+
+    async def submit(self, items: List[Dict], credentials: Dict[str, str]) -> Dict:
+        """
+        Queue a job for `items` ({imdb_id, type, season, episode}); returns
+        its Mongo document. Duplicate IMDB IDs are checked once
+        """
+        unique = list(OrderedDict((item["imdb_id"], item) for item in items).values())[:self.max_titles]
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        doc = {
+            "_id": job_id,
+            "status": "running",
+            "total": len(unique),
+            "done": 0,
+            "results": [],
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=self.job_ttl),
+        }
+        await self.jobs.insert_one(doc)
+
+        job = _Job(job_id, len(unique), credentials)
+        self._running[job_id] = job
+        job.task = asyncio.create_task(self._collect(job))
+        self._pending[job_id] = deque(unique)
+        self._wakeup.set()
+        self.jobs_submitted += 1
+        return doc
+
+    # ----------------------------------------
+    # Fair indexer scheduling
+    # ----------------------------------------
+
+    async def _next_title(self):
+        """Next title, taking one from each job in turn"""
+        while True:
+            if self._pending:
+                job_id, queue = next(iter(self._pending.items()))
+                item = queue.popleft()
+                if queue:
+                    self._pending.move_to_end(job_id)
+                else:
+                    del self._pending[job_id]
+                return job_id, item
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _worker(self):
+        while True:
+            job_id, item = await self._next_title()
+            job = self._running.get(job_id)
+            if job is None:
+                continue
+            series = item.get("type") in ("series", "tv")
+            try:
+                hashes = await run_in_threadpool(
+                    TorrentIndexers.get_all_hashes,
+                    imdb_id=item["imdb_id"],
+                    content_type="tv" if series else "movie",
+                    season=(item.get("season") or 1) if series else None,
+                    episode=(item.get("episode") or 1) if series else None
+                )
+            except Exception as e:
+                logger.error(f"Bulk availability indexer error for {item['imdb_id']}: {e}")
+                hashes = None
+            job.ready.put_nowait((item, hashes))
+
+    # ----------------------------------------
+    # Batched availability
+    # ----------------------------------------
+
+    @staticmethod
+    def _check_batch(batch: List[tuple], credentials: Dict[str, str]) -> List[Dict]:
+        """
+        One availability check for every hash of every title in the batch.
+        Providers that failed or timed out are listed on each result, and a
+        title is an error (not "uncached") when none of them answered
+        """
+        union = list(dict.fromkeys(h for _, hashes in batch if hashes for h in hashes))
+        check = {"providers": {}, "availability": {}}
+        if union:
+            check = MultiDebridAvailability.check(union, credentials, timeout=30)
+        availability = check["availability"]
+        failed = sorted(p for p, info in check["providers"].items() if info["status"] != "ok")
+        unanswered = bool(failed) and len(failed) == len(check["providers"])
+
+        results = []
+        for item, hashes in batch:
+            if hashes is None:
+                results.append({"imdb_id": item["imdb_id"], "status": "error", "cached": False})
+                continue
+            if hashes and unanswered:
+                results.append({"imdb_id": item["imdb_id"], "status": "error", "cached": False, "failed_providers": failed})
+                continue
+            candidates = []
+            for info_hash, torrent_info in hashes.items():
+                providers = [p for p, cached in availability.get(info_hash, {}).items() if cached]
+                if providers:
+                    candidates.append({
+                        "hash": info_hash,
+                        "cached": True,
+                        "quality": torrent_info.get("quality", "720p"),
+                        "seeders": torrent_info.get("seeders", 0),
+                        "providers": providers,
+                    })
+            best = RealDebridCacheSearch._sort_results(candidates)[0] if candidates else None
+            results.append({
+                "imdb_id": item["imdb_id"],
+                "status": "ok",
+                "indexed": len(hashes),
+                "cached": best is not None,
+                "best_quality": best["quality"] if best else None,
+                "hash": best["hash"] if best else None,
+                "providers": best["providers"] if best else [],
+                "failed_providers": failed,
+            })
+        return results
+
+    async def _collect(self, job: _Job):
+        """Group titles as their hashes arrive, check each group, record results"""
+        loop = asyncio.get_running_loop()
+        remaining = job.total
+        try:
+            while remaining:
+                batch = [await job.ready.get()]
+                deadline = loop.time() + self.batch_wait
+                while len(batch) < min(self.batch_titles, remaining):
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(job.ready.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                results = await run_in_threadpool(self._check_batch, batch, job.credentials)
+                self.availability_batches += 1
+                self.titles_checked += len(results)
+                remaining -= len(batch)
+                await self.jobs.update_one(
+                    {"_id": job.job_id},
+                    {"$push": {"results": {"$each": results}}, "$inc": {"done": len(results)}}
+                )
+
+            await self.jobs.update_one(
+                {"_id": job.job_id},
+                {"$set": {"status": "done", "finished_at": datetime.utcnow()}}
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Bulk availability job {job.job_id} failed: {e}")
+            await self.jobs.update_one({"_id": job.job_id}, {"$set": {"status": "failed", "error": str(e)}})
+        finally:
+            self._running.pop(job.job_id, None)
+            self._pending.pop(job.job_id, None)
+
+    # ----------------------------------------
+    # Reading results
+    # ----------------------------------------
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await self.jobs.find_one({"_id": job_id})
+
+    async def stream(self, job_id: str, poll_interval: float = 0.5) -> AsyncIterator[bytes]:
+        """NDJSON: one {"type": "result"} line per title, then a {"type": "done"} line"""
+        sent = 0
+        while True:
+            doc = await self.jobs.find_one(
+                {"_id": job_id},
+                {"status": 1, "total": 1, "done": 1, "results": {"$slice": [sent, self.max_titles]}}
+            )
+            if doc is None:
+                yield orjson.dumps({"type": "error", "detail": "Job expired"}) + b"\n"
+                return
+            for result in doc.get("results", []):
+                yield orjson.dumps({"type": "result", **result}) + b"\n"
+            sent += len(doc.get("results", []))
+            if doc["status"] != "running" and sent >= doc["done"]:
+                yield orjson.dumps({
+                    "type": "done",
+                    "status": doc["status"],
+                    "total": doc["total"],
+                    "done": doc["done"],
+                }) + b"\n"
+                return
+            await asyncio.sleep(poll_interval)
+
+    def stats(self) -> Dict:
+        return {
+            "running_jobs": len(self._running),
+            "queued_titles": sum(len(queue) for queue in self._pending.values()),
+            "jobs_submitted": self.jobs_submitted,
+            "titles_checked": self.titles_checked,
+            "availability_batches": self.availability_batches,
+        }
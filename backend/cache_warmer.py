@@ -0,0 +1,185 @@
+"""
+Cache Warmer
+Background job that reads the trending Torrentio catalogs and runs the
+indexer fan-out for the top titles ahead of demand, so new releases
+don't pay the cold-miss latency on the first user search
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from debrid_cache_search import IndexerCache, TorrentIndexers
+from rate_limit import BucketRegistry
+from torrentio_indexer import TorrentioIndexer
+
+logger = logging.getLogger(__name__)
+
+
+def _latest_episode(meta: Dict) -> Tuple[int, int]:
+    """Most recent regular episode listed in a series meta, S01E01 if unknown"""
+    latest = (1, 1)
+    for video in meta.get("videos") or []:
+        season = video.get("season") or 0
+        episode = video.get("episode") or video.get("number") or 0
+        if season > 0 and (season, episode) > latest:
+            latest = (season, episode)
+    return latest
+
+
+class CacheWarmer:
+    """
+    Periodically warms TorrentIndexers.cache for trending titles
+
+    Each indexer has its own token bucket (requests/minute), so warming
+    never eats into more than its budget of an indexer's capacity. A title
+    is warmed only when every indexer has budget: searches read the cache
+    as the full fan-out, so a partial one is never stored
+    """
+
+    def __init__(
+        self,
+        catalogs: List[str],
+        top_n: int = 20,
+        interval: float = 1800,
+        indexer_budget: float = 30,
+        initial_delay: float = 30,
+        enabled: bool = True
+    ):
+        self.catalogs = catalogs
+        self.top_n = top_n
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.enabled = enabled
+        self.budgets = BucketRegistry(capacity=indexer_budget, rate=indexer_budget / 60.0)
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.titles_warmed = 0
+        self.already_warm = 0
+        self.budget_exhausted = 0
+        self.catalog_errors = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "CacheWarmer":
+        catalogs = os.environ.get("CACHE_WARM_CATALOGS", "movie/top,series/top")
+        return cls(
+            catalogs=[c.strip() for c in catalogs.split(",") if c.strip()],
+            top_n=int(os.environ.get("CACHE_WARM_TOP_N", "20")),
+            interval=float(os.environ.get("CACHE_WARM_INTERVAL", "1800")),
+            indexer_budget=float(os.environ.get("CACHE_WARM_INDEXER_BUDGET", "30")),
+            enabled=os.environ.get("CACHE_WARM_ENABLED", "true").lower() == "true",
+        )
+
+    def start(self):
+        """Schedule the warming loop on the running event loop"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Cache warmer started for catalogs: {self.catalogs}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            try:
+                await self.warm_once()
+            except Exception as e:
+                logger.error(f"Cache warmer error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def fetch_catalog(self, catalog: str) -> List[Tuple[str, str, Optional[int], Optional[int]]]:
+        """Top N titles of a "type/id" catalog as (imdb_id, content_type, season, episode)"""
+        catalog_type, catalog_id = catalog.split("/", 1)
+        async with httpx.AsyncClient() as http_client:
+            response = await http_client.get(
+                TorrentioIndexer.catalog_url(catalog_type, catalog_id),
+                timeout=15.0
+            )
+            response.raise_for_status()
+            metas = response.json().get("metas", [])
+
+        titles = []
+        for meta in metas[:self.top_n]:
+            imdb_id = meta.get("imdb_id") or meta.get("id", "")
+            if not imdb_id.startswith("tt"):
+                continue
+            if catalog_type == "movie":
+                titles.append((imdb_id, "movie", None, None))
+            else:
+                season, episode = _latest_episode(meta)
+                titles.append((imdb_id, "tv", season, episode))
+        return titles
+
+    async def warm_once(self):
+        """One pass over every configured catalog"""
+        started = time.time()
+        self.runs += 1
+        self.last_run_at = started
+
+        for catalog in self.catalogs:
+            try:
+                titles = await self.fetch_catalog(catalog)
+            except Exception as e:
+                self.catalog_errors += 1
+                logger.error(f"Cache warmer catalog error ({catalog}): {e}")
+                continue
+
+            for imdb_id, content_type, season, episode in titles:
+                if TorrentIndexers.cache.contains(IndexerCache.key(imdb_id, content_type, season, episode)):
+                    self.already_warm += 1
+                    continue
+
+                buckets = [self.budgets.get(name) for name in TorrentIndexers.INDEXER_NAMES]
+                if any(bucket.available < 1 for bucket in buckets):
+                    self.budget_exhausted += 1
+                    logger.info("Cache warmer: indexer budgets exhausted, resuming next run")
+                    self.last_run_seconds = time.time() - started
+                    return
+                for bucket in buckets:
+                    bucket.try_acquire()
+
+                await run_in_threadpool(
+                    TorrentIndexers.get_all_hashes,
+                    imdb_id=imdb_id,
+                    content_type=content_type,
+                    season=season,
+                    episode=episode,
+                    warm=True
+                )
+                self.titles_warmed += 1
+
+        self.last_run_seconds = time.time() - started
+        logger.info(f"Cache warmer run finished in {self.last_run_seconds:.1f}s")
+
+    def stats(self) -> Dict:
+        cache_stats = TorrentIndexers.cache.stats()
+        warmed = cache_stats["warmed"]
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": self.last_run_seconds,
+            "titles_warmed": self.titles_warmed,
+            "already_warm": self.already_warm,
+            "budget_exhausted": self.budget_exhausted,
+            "catalog_errors": self.catalog_errors,
+            "warm_hits": cache_stats["warm_hits"],
+            "warm_hit_rate": round(cache_stats["warm_hits"] / warmed, 3) if warmed else 0.0,
+            "indexer_budget": self.budgets.snapshot(),
+        }
@@ -0,0 +1,265 @@
+"""
+Cluster Coordination
+MongoDB-backed primitives shared by every uvicorn worker and node: a
+distributed token bucket (one document per key, refilled and debited in a
+single atomic pipeline update) and a singleflight lease, so identical
+upstream work runs once cluster-wide and throughput stays within upstream
+quotas however many workers are running
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# All timestamps are taken from the MongoDB server ($$NOW) so nodes with
+# skewed clocks still agree on refills and lease expiry
+_NOW_MS = {"$toLong": "$$NOW"}
+
+
+def flight_key(*parts: Any) -> str:
+    """Compact key for a unit of work (hashed, so tokens never land in Mongo)"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+class ClusterCoordinator:
+    """
+    Cross-worker rate limiting and request coalescing on top of `db`
+
+    Collections (all TTL-indexed on `expires_at`, created by ensure_indexes):
+    - coord_buckets: distributed token buckets
+    - coord_leases:  singleflight leases, one owner per key
+    - coord_results: results handed from the lease owner to the workers
+                     already waiting on it; they live `result_ttl`
+                     seconds (a few poll intervals), so this is a
+                     hand-off, not a cache
+
+    Mongo errors fail open: the caller proceeds, limited only by the
+    in-process buckets, rather than failing user requests
+    """
+
+    def __init__(
+        self,
+        db,
+        lease_ttl: float = 30,
+        result_ttl: float = 3,
+        poll_interval: float = 0.2,
+        enabled: bool = True
+    ):
+        self.buckets = db.coord_buckets
+        self.leases = db.coord_leases
+        self.results = db.coord_results
+        self.lease_ttl = lease_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.enabled = enabled
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.granted = 0
+        self.throttled = 0
+        self.flights_led = 0
+        self.flights_shared = 0
+        self.lease_timeouts = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, db) -> "ClusterCoordinator":
+        return cls(
+            db,
+            lease_ttl=float(os.environ.get("COORD_LEASE_TTL", "30")),
+            result_ttl=float(os.environ.get("COORD_RESULT_TTL", "3")),
+            enabled=os.environ.get("COORD_ENABLED", "true").lower() == "true",
+        )
+
+    async def ensure_indexes(self):
+        """TTL indexes so abandoned buckets, leases and results clean themselves up"""
+        if not self.enabled:
+            return
+        try:
+            for collection in (self.buckets, self.leases, self.results):
+                await collection.create_index("expires_at", expireAfterSeconds=0)
+        except PyMongoError as e:
+            self.errors += 1
+            logger.error(f"Cluster coordination index error: {e}")
+
+    def _failed(self, what: str, error: Exception):
+        self.errors += 1
+        logger.warning(f"Cluster coordination {what} failed, continuing uncoordinated: {error}")
+
+    # ----------------------------------------
+    # Distributed token bucket
+    # ----------------------------------------
+
+    async def try_acquire(self, key: str, capacity: float, rate: float, tokens: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take `tokens` from the cluster-wide bucket `key` if available
+        Returns (granted, seconds until enough tokens would be available)
+        """
+        elapsed = {"$divide": [{"$subtract": [_NOW_MS, {"$ifNull": ["$updated_ms", _NOW_MS]}]}, 1000]}
+        # A bucket left alone long enough to refill is equivalent to no bucket
+        idle_ms = int((capacity / rate + 60) * 1000)
+        pipeline = [
+            {"$set": {
+                "tokens": {"$min": [
+                    capacity,
+                    {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]},
+                ]},
+                "updated_ms": _NOW_MS,
+            }},
+            {"$set": {"granted": {"$gte": ["$tokens", tokens]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$granted", {"$subtract": ["$tokens", tokens]}, "$tokens"]},
+                "expires_at": {"$add": ["$$NOW", idle_ms]},
+            }},
+        ]
+        for _ in range(2):
+            try:
+                doc = await self.buckets.find_one_and_update(
+                    {"_id": key},
+                    pipeline,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                break
+            except DuplicateKeyError:
+                # Two workers created the bucket at once; the retry updates it
+                continue
+        else:
+            return True, 0.0
+
+        if doc["granted"]:
+            return True, 0.0
+        return False, (tokens - doc["tokens"]) / rate if rate > 0 else float("inf")
+
+    async def acquire(self, key: str, capacity: float, rate: float, timeout: float = 10) -> bool:
+        """Wait up to `timeout` seconds for a token from the cluster-wide bucket `key`"""
+        if not self.enabled:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                granted, wait = await self.try_acquire(key, capacity, rate)
+            except PyMongoError as e:
+                self._failed("rate limit", e)
+                return True
+            if granted:
+                self.granted += 1
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or wait > remaining:
+                self.throttled += 1
+                return False
+            await asyncio.sleep(min(max(wait, self.poll_interval), 1.0))
+
+    # ----------------------------------------
+    # Singleflight
+    # ----------------------------------------
+
+    async def _take_lease(self, key: str) -> bool:
+        """Claim the lease for `key` unless another live owner holds it"""
+        try:
+            await self.leases.update_one(
+                {"_id": key, "$expr": {"$lt": ["$expires_at", "$$NOW"]}},
+                [{"$set": {
+                    "owner": self.owner,
+                    "expires_at": {"$add": ["$$NOW", int(self.lease_ttl * 1000)]},
+                }}],
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _shared_result(self, key: str) -> Optional[Dict]:
+        return await self.results.find_one(
+            {"_id": key, "$expr": {"$gt": ["$expires_at", "$$NOW"]}}
+        )
+
+    async def _publish(self, key: str, value: Any):
+        try:
+            await self.results.update_one(
+                {"_id": key},
+                [{"$set": {
+                    "value": {"$literal": value},
+                    "owner": self.owner,
+                    "expires_at": {"$add": ["$$NOW", int(self.result_ttl * 1000)]},
+                }}],
+                upsert=True,
+            )
+        except Exception as e:
+            # Unencodable values or a Mongo hiccup only cost the waiters a retry
+            self._failed("result publish", e)
+
+    async def singleflight(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        wait_timeout: Optional[float] = None,
+        share: bool = True
+    ) -> Any:
+        """
+        Run `fn` at most once cluster-wide per `key` at a time
+
+        The worker that takes the lease runs `fn` and publishes its result
+        (must be BSON-encodable); the others poll for that result. If the
+        owner dies its lease expires and a waiter takes over; if waiting
+        exceeds `wait_timeout` (default: the lease TTL) the waiter runs `fn`
+        itself. Exceptions from `fn` are not shared
+
+        share=False is for results that must not be stored in Mongo (e.g.
+        per-user links): nothing is published and waiters run `fn` one
+        after another as they get the lease, so `fn` should first check
+        for work a previous owner already did
+        """
+        if not self.enabled:
+            return await fn()
+        deadline = time.monotonic() + (self.lease_ttl if wait_timeout is None else wait_timeout)
+
+        while True:
+            try:
+                shared = await self._shared_result(key) if share else None
+                if shared is not None:
+                    self.flights_shared += 1
+                    return shared["value"]
+                if await self._take_lease(key):
+                    break
+            except PyMongoError as e:
+                self._failed("singleflight", e)
+                return await fn()
+            if time.monotonic() >= deadline:
+                self.lease_timeouts += 1
+                return await fn()
+            await asyncio.sleep(self.poll_interval)
+
+        self.flights_led += 1
+        try:
+            value = await fn()
+            if share:
+                await self._publish(key, value)
+            return value
+        finally:
+            try:
+                await self.leases.delete_one({"_id": key, "owner": self.owner})
+            except PyMongoError as e:
+                self._failed("lease release", e)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "owner": self.owner,
+            "rate_limit_granted": self.granted,
+            "rate_limit_throttled": self.throttled,
+            "flights_led": self.flights_led,
+            "flights_shared": self.flights_shared,
+            "lease_timeouts": self.lease_timeouts,
+            "errors": self.errors,
+        }
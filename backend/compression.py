@@ -0,0 +1,214 @@
+"""
+HTTP Content-Encoding helpers
+Accept-Encoding negotiation, incremental gzip/brotli compressors and the
+negotiated compression middleware
+"""
+
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Preferred first when the client weights them equally
+SUPPORTED_ENCODINGS = ("br", "gzip")
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # Streaming-friendly; 11 is far too slow for on-the-fly use
+
+# Bodies below this aren't worth the CPU or the extra header bytes
+MINIMUM_SIZE = 1024
+
+# Already compressed, or must be flushed to the client as written
+EXCLUDED_MEDIA_TYPES = (
+    "application/gzip",
+    "application/zip",
+    "text/event-stream",
+    "application/x-ndjson",
+    "image/",
+    "video/",
+    "audio/",
+)
+
+# ASGI scope flag: an endpoint sets it to send its response uncompressed
+SKIP_COMPRESSION = "compression.skip"
+
+
+def parse_accept_encoding(header: Optional[str]) -> dict:
+    """Parse an Accept-Encoding header into {coding: q}"""
+    codings = {}
+    for part in (header or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+def accepts_encoding(header: Optional[str], encoding: str) -> bool:
+    """Check whether a specific coding is acceptable to the client"""
+    codings = parse_accept_encoding(header)
+    q = codings.get(encoding, codings.get("*", 0.0))
+    return q > 0
+
+
+def negotiate_encoding(header: Optional[str]) -> Optional[str]:
+    """
+    Pick the best supported coding for the client
+    Returns None when the response should go out uncompressed
+    """
+    codings = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = codings.get(encoding, codings.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class StreamCompressor:
+    """Incremental compressor for one response body"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._gzip.compress(chunk)
+        return self._brotli.process(chunk)
+
+    def flush(self) -> bytes:
+        """Emit whatever is buffered without ending the stream"""
+        if self.encoding == "gzip":
+            return self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        return self._brotli.flush()
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self._gzip.flush(zlib.Z_FINISH)
+        return self._brotli.finish()
+
+
+def skip_compression(scope: Scope):
+    """Have CompressionMiddleware pass this request's response through as-is"""
+    scope[SKIP_COMPRESSION] = True
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    """One-shot compression of a complete body"""
+    compressor = StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def decompress_bytes(data: bytes, encoding: str) -> bytes:
+    """One-shot decompression of a complete body"""
+    if encoding == "gzip":
+        return zlib.decompress(data, 47)  # gzip or zlib header
+    if encoding == "br":
+        return brotli.decompress(data)
+    if encoding == "deflate":
+        return zlib.decompress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli compression for responses above a size threshold
+    Responses that already carry a Content-Encoding (passthrough proxies,
+    precompressed cache entries) or whose endpoint called skip_compression()
+    are left untouched
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(scope, send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Per-request send wrapper that decides on compression at the first body chunk"""
+
+    def __init__(self, scope: Scope, send: Send, encoding: str, minimum_size: int):
+        self.scope = scope
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+            # The endpoint runs before its response starts, so its flag is set by now
+            self.passthrough = self.scope.get(SKIP_COMPRESSION, False) or "content-encoding" in headers or any(
+                media_type.startswith(excluded) for excluded in EXCLUDED_MEDIA_TYPES
+            )
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+
+            if not more_body:
+                # Complete body in one message: compress it whole, or not at all
+                if len(body) >= self.minimum_size:
+                    body = compress_bytes(body, self.encoding)
+                    headers["Content-Encoding"] = self.encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+
+            # Streaming body: length is unknown, compress as it goes
+            headers["Content-Encoding"] = self.encoding
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            headers.add_vary_header("Accept-Encoding")
+            self.compressor = StreamCompressor(self.encoding)
+            await self._send(self.start_message)
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -6,14 +6,85 @@ Uses multiple indexers: Torrentio, Knightcrawler, Comet, Jackettio
 
 import requests
 import logging
+import os
 import re
 import hashlib
-from typing import List, Dict, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple, Iterable
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from realdebrid_scheduler import rd_scheduler, PRIORITY_PLAY, PRIORITY_BROWSE
+from episode_matcher import EpisodeFileCache, match_episode_file, matches_episode, parse_episode
+
 logger = logging.getLogger(__name__)
 
 
+class IndexerCache:
+    """
+    TTL cache of combined indexer results (hash -> torrent info)
+    Keyed by IMDB ID + episode, since indexers only answer IMDB lookups.
+    Entries filled by the cache warmer are flagged so their hits can be
+    counted separately
+    """
+    
+    def __init__(self, ttl: float = 1800, max_entries: int = 2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, Dict[str, Dict], bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.warm_hits = 0
+        self.warmed = 0
+    
+    @staticmethod
+    def key(imdb_id: str, content_type: str, season: Optional[int], episode: Optional[int]) -> Tuple:
+        if content_type == "movie":
+            return (imdb_id, "movie", None, None)
+        return (imdb_id, "tv", season or 1, episode or 1)
+    
+    def get(self, key: Tuple) -> Optional[Dict[str, Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if entry[2]:
+                self.warm_hits += 1
+            return dict(entry[1])
+    
+    def contains(self, key: Tuple) -> bool:
+        """Freshness check that doesn't count as a hit or miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.time()
+    
+    def put(self, key: Tuple, hashes: Dict[str, Dict], warmed: bool = False):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, dict(hashes), warmed)
+            self._entries.move_to_end(key)
+            if warmed:
+                self.warmed += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "warm_hits": self.warm_hits,
+                "warmed": self.warmed,
+            }
+
+
 class TorrentIndexers:
     """
     Multi-source torrent indexer
@@ -27,6 +98,12 @@ class TorrentIndexers:
     JACKETTIO_URL = "https://jackettio.elfhosted.com"
     MEDIAFUSION_URL = "https://mediafusion.elfhosted.com"
     
+    # Indexer names, in fan-out order; each maps to _get_<name>_hashes
+    INDEXER_NAMES = ("Torrentio", "Knightcrawler", "Comet", "Jackettio", "Mediafusion")
+    
+    # Combined results per IMDB ID/episode, shared by searches and the warmer
+    cache = IndexerCache()
+    
     @staticmethod
     def get_all_hashes(
         imdb_id: Optional[str] = None,
@@ -34,38 +111,41 @@ class TorrentIndexers:
         content_type: str = "movie",
         year: Optional[int] = None,
         season: Optional[int] = None,
-        episode: Optional[int] = None
+        episode: Optional[int] = None,
+        indexers: Optional[Iterable[str]] = None,
+        warm: bool = False
     ) -> Dict[str, Dict]:
         """
         Query all indexers in parallel and combine results
         Returns dict of hash -> torrent info
+        
+        indexers: subset of INDEXER_NAMES to query (default all); partial
+                  results are returned but never cached, since searches
+                  read the cache expecting every indexer's hashes
+        warm: fill the cache ahead of demand (skips the cache lookup)
         """
+        cache_key = None
+        if imdb_id:
+            cache_key = IndexerCache.key(imdb_id, content_type, season, episode)
+            if not warm:
+                cached = TorrentIndexers.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Indexer cache hit: {len(cached)} hashes for {cache_key}")
+                    return cached
+        
         all_hashes = {}
+        names = [name for name in TorrentIndexers.INDEXER_NAMES if indexers is None or name in indexers]
         
         with ThreadPoolExecutor(max_workers=5) as executor:
             futures = []
             
             # Submit all indexer queries
-            futures.append(executor.submit(
-                TorrentIndexers._get_torrentio_hashes,
-                imdb_id, title, content_type, year, season, episode
-            ))
-            futures.append(executor.submit(
-                TorrentIndexers._get_knightcrawler_hashes,
-                imdb_id, title, content_type, year, season, episode
-            ))
-            futures.append(executor.submit(
-                TorrentIndexers._get_comet_hashes,
-                imdb_id, title, content_type, year, season, episode
-            ))
-            futures.append(executor.submit(
-                TorrentIndexers._get_jackettio_hashes,
-                imdb_id, title, content_type, year, season, episode
-            ))
-            futures.append(executor.submit(
-                TorrentIndexers._get_mediafusion_hashes,
-                imdb_id, title, content_type, year, season, episode
-            ))
+            for name in names:
+                fetch = getattr(TorrentIndexers, f"_get_{name.lower()}_hashes")
+                futures.append(executor.submit(
+                    fetch,
+                    imdb_id, title, content_type, year, season, episode
+                ))
             
             # Collect results
             for future in as_completed(futures):
@@ -76,6 +156,10 @@ class TorrentIndexers:
                     logger.error(f"Indexer error: {e}")
         
         logger.info(f"Found {len(all_hashes)} unique hashes from all indexers")
+        
+        if cache_key and all_hashes and len(names) == len(TorrentIndexers.INDEXER_NAMES):
+            TorrentIndexers.cache.put(cache_key, all_hashes, warmed=warm)
+        
         return all_hashes
     
     @staticmethod
@@ -319,6 +403,10 @@ class RealDebridCacheSearch:
     """
     
     BASE_URL = "https://api.real-debrid.com/rest/1.0"
+    VIDEO_EXTENSIONS = frozenset(('.mkv', '.mp4', '.avi', '.mov', '.wmv', '.m4v'))
+    
+    # (hash, season, episode) -> file id, filled from every pack file list seen
+    episode_files = EpisodeFileCache()
     
     @staticmethod
     def search_cached_torrents(
@@ -329,7 +417,8 @@ class RealDebridCacheSearch:
         season: Optional[int] = None,
         episode: Optional[int] = None,
         imdb_id: Optional[str] = None,
-        include_uncached: bool = True
+        include_uncached: bool = True,
+        priority: int = PRIORITY_BROWSE
     ) -> List[Dict]:
         """
         Main search function - finds torrents and checks Real-Debrid cache
@@ -362,7 +451,7 @@ class RealDebridCacheSearch:
             cached_info = {}
             if token and token != 'test':
                 cached_info = RealDebridCacheSearch._check_instant_availability(
-                    list(hashes.keys()), token
+                    list(hashes.keys()), token, priority
                 )
             
             logger.info(f"Found {len(cached_info)} cached torrents on Real-Debrid")
@@ -373,7 +462,13 @@ class RealDebridCacheSearch:
                 best_file = None
                 
                 if is_cached:
-                    best_file = RealDebridCacheSearch._get_best_file(cached_info[info_hash])
+                    if content_type == "tv":
+                        RealDebridCacheSearch._remember_episodes(info_hash, cached_info[info_hash])
+                    best_file = RealDebridCacheSearch._select_variant(
+                        cached_info[info_hash],
+                        season=season if content_type == "tv" else None,
+                        episode=episode if content_type == "tv" else None
+                    )
                 
                 result = {
                     'hash': info_hash,
@@ -398,6 +493,88 @@ class RealDebridCacheSearch:
         
         return results
     
+    @staticmethod
+    def season_availability(
+        imdb_id: str,
+        token: str,
+        season: int,
+        episodes: List[int],
+        title: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Best cached stream for every episode of a season in one pass
+        
+        Flow:
+        1. Indexer fan-out per episode, concurrently (IndexerCache-backed)
+        2. One batched RD availability check over the union of all hashes
+           (season packs show up for many episodes but are checked once)
+        3. Per episode, rank cached torrents whose chosen file is that episode
+        """
+        per_episode: Dict[int, Dict[str, Dict]] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(len(episodes), 6))) as executor:
+            futures = {
+                executor.submit(
+                    TorrentIndexers.get_all_hashes,
+                    imdb_id=imdb_id,
+                    title=title,
+                    content_type="tv",
+                    season=season,
+                    episode=episode
+                ): episode
+                for episode in episodes
+            }
+            for future in as_completed(futures):
+                try:
+                    per_episode[futures[future]] = future.result()
+                except Exception as e:
+                    logger.error(f"Indexer error for S{season:02d}E{futures[future]:02d}: {e}")
+        
+        union = list(dict.fromkeys(h for hashes in per_episode.values() for h in hashes))
+        cached_info = {}
+        if union and token:
+            cached_info = RealDebridCacheSearch.check_availability_batched(union, token)
+        logger.info(f"Season {imdb_id} S{season:02d}: {len(union)} unique hashes, {len(cached_info)} cached")
+        
+        for info_hash, variants in cached_info.items():
+            RealDebridCacheSearch._remember_episodes(info_hash, variants)
+        
+        matrix = []
+        for episode in episodes:
+            hashes = per_episode.get(episode, {})
+            candidates = []
+            for info_hash, torrent_info in hashes.items():
+                if info_hash not in cached_info:
+                    continue
+                best_file = RealDebridCacheSearch._select_variant(cached_info[info_hash], season, episode)
+                if not best_file:
+                    continue
+                candidates.append({
+                    'hash': info_hash,
+                    'title': torrent_info.get('title', title or imdb_id),
+                    'quality': torrent_info.get('quality', '720p'),
+                    'size': torrent_info.get('size', 'Unknown'),
+                    'seeders': torrent_info.get('seeders', 0),
+                    'source': torrent_info.get('source', 'Unknown'),
+                    'cached': True,
+                    'file_id': best_file['id'],
+                    'filename': best_file['filename'],
+                    'filesize': best_file['filesize'],
+                    'episode_match': matches_episode(parse_episode(best_file['filename']), season, episode),
+                })
+            # Exact episode files first, then the usual quality/seeders order
+            ranked = sorted(
+                RealDebridCacheSearch._sort_results(candidates),
+                key=lambda x: not x['episode_match']
+            )
+            matrix.append({
+                'episode': episode,
+                'indexed': len(hashes),
+                'cached': len(candidates),
+                'best': ranked[0] if ranked else None,
+            })
+        
+        return matrix
+    
     @staticmethod
     def _sort_results(results: List[Dict]) -> List[Dict]:
         """Sort results: cached first, then by quality, then by seeders"""
@@ -490,10 +667,16 @@ class RealDebridCacheSearch:
         return hashes
     
     @staticmethod
-    def _check_instant_availability(hashes: List[str], token: str) -> Dict[str, Dict]:
+    def _check_instant_availability(
+        hashes: List[str],
+        token: str,
+        priority: int = PRIORITY_BROWSE,
+        raise_errors: bool = False
+    ) -> Dict[str, List[Dict]]:
         """
         Check which torrents are instantly available (cached) on Real-Debrid
-        Returns dict of hash -> cache info
+        Returns dict of hash -> every cached variant (file_id -> file info)
+        A failed check reads as "nothing cached" unless `raise_errors`
         """
         cached = {}
         
@@ -506,9 +689,10 @@ class RealDebridCacheSearch:
             hash_string = "/".join(hashes[:100])  # Limit to 100
             
             url = f"{RealDebridCacheSearch.BASE_URL}/torrents/instantAvailability/{hash_string}"
-            headers = {"Authorization": f"Bearer {token}"}
             
-            response = requests.get(url, headers=headers, timeout=15)
+            response = rd_scheduler.request("GET", url, token, priority, timeout=15)
+            if raise_errors:
+                response.raise_for_status()
             
             if response.status_code == 200:
                 data = response.json()
@@ -518,43 +702,89 @@ class RealDebridCacheSearch:
                     if availability and isinstance(availability, dict):
                         # Check if there are cached files
                         rd_data = availability.get('rd', [])
-                        if rd_data and len(rd_data) > 0:
-                            # Take the first available variant
-                            cached[info_hash.lower()] = rd_data[0]
+                        variants = [v for v in rd_data if isinstance(v, dict) and v]
+                        if variants:
+                            cached[info_hash.lower()] = variants
             
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error checking instant availability: {e}")
         
         return cached
     
     @staticmethod
-    def _get_best_file(cache_data: Dict) -> Optional[Dict]:
+    def check_availability_batched(
+        hashes: List[str],
+        token: str,
+        priority: int = PRIORITY_BROWSE,
+        batch_size: int = 100
+    ) -> Dict[str, List[Dict]]:
+        """_check_instant_availability for any number of hashes, batches in parallel"""
+        batches = [hashes[i:i + batch_size] for i in range(0, len(hashes), batch_size)]
+        if len(batches) <= 1:
+            return RealDebridCacheSearch._check_instant_availability(hashes, token, priority)
+        
+        cached = {}
+        with ThreadPoolExecutor(max_workers=min(len(batches), 4)) as executor:
+            futures = [
+                executor.submit(RealDebridCacheSearch._check_instant_availability, batch, token, priority)
+                for batch in batches
+            ]
+            for future in as_completed(futures):
+                cached.update(future.result())
+        return cached
+    
+    @staticmethod
+    def _remember_episodes(info_hash: str, variants: List[Dict]):
+        """Index a cached pack's files so any of its episodes resolves without discovery"""
+        files = [
+            (str(file_id), info.get('filename', ''), info.get('filesize', 0))
+            for variant in variants
+            for file_id, info in variant.items()
+            if RealDebridCacheSearch._is_video(info.get('filename', ''))
+        ]
+        RealDebridCacheSearch.episode_files.remember(info_hash, files)
+    
+    @staticmethod
+    def _is_video(filename: str) -> bool:
+        return os.path.splitext(filename.lower())[1] in RealDebridCacheSearch.VIDEO_EXTENSIONS
+    
+    @staticmethod
+    def _select_variant(
+        variants: List[Dict],
+        season: Optional[int] = None,
+        episode: Optional[int] = None
+    ) -> Optional[Dict]:
         """
-        Get the best video file from cached torrent data
-        Prefers largest video file (usually the main content)
+        Pick the best file over every cached variant in one pass
+        
+        With season/episode, a video file for that episode wins; otherwise
+        (or if none matches) the largest video file. Its id is returned as
+        the result's file_id, which add_and_get_stream_link selects alone
         """
+        by_episode = season is not None and episode is not None
+        best_key = None
         best_file = None
-        best_size = 0
-        
-        video_extensions = ['.mkv', '.mp4', '.avi', '.mov', '.wmv', '.m4v']
         
         try:
-            for file_id, file_info in cache_data.items():
-                filename = file_info.get('filename', '').lower()
-                filesize = file_info.get('filesize', 0)
-                
-                # Check if it's a video file
-                is_video = any(filename.endswith(ext) for ext in video_extensions)
-                
-                if is_video and filesize > best_size:
-                    best_size = filesize
-                    best_file = {
-                        'id': file_id,
-                        'filename': file_info.get('filename'),
-                        'filesize': filesize,
-                    }
+            for variant in variants:
+                for file_id, file_info in variant.items():
+                    filename = file_info.get('filename', '')
+                    if not RealDebridCacheSearch._is_video(filename):
+                        continue
+                    filesize = file_info.get('filesize', 0)
+                    matches = by_episode and matches_episode(parse_episode(filename), season, episode)
+                    key = (matches, filesize)
+                    if best_key is None or key > best_key:
+                        best_key = key
+                        best_file = {
+                            'id': str(file_id),
+                            'filename': filename,
+                            'filesize': filesize,
+                        }
         except Exception as e:
-            logger.error(f"Error getting best file: {e}")
+            logger.error(f"Error selecting cached variant: {e}")
         
         return best_file
     
@@ -631,27 +861,35 @@ class RealDebridCacheSearch:
     def add_and_get_stream_link(
         info_hash: str,
         token: str,
-        file_id: Optional[str] = None
+        file_id: Optional[str] = None,
+        season: Optional[int] = None,
+        episode: Optional[int] = None,
+        priority: int = PRIORITY_PLAY
     ) -> Optional[str]:
         """
         Add torrent to Real-Debrid and get direct stream link
         
         Flow:
         1. Add magnet to Real-Debrid
-        2. Select files (or all)
+        2. Select files: `file_id` if given (or known for season/episode),
+           else discover the requested episode or the largest video
         3. Wait for it to be ready
         4. Unrestrict the link
         5. Return direct download URL
         """
         try:
-            headers = {"Authorization": f"Bearer {token}"}
             magnet = f"magnet:?xt=urn:btih:{info_hash}"
+            by_episode = season is not None and episode is not None
+            if not file_id and by_episode:
+                file_id = RealDebridCacheSearch.episode_files.get(info_hash, season, episode)
             
             # Step 1: Add magnet
             add_url = f"{RealDebridCacheSearch.BASE_URL}/torrents/addMagnet"
-            add_response = requests.post(
+            add_response = rd_scheduler.request(
+                "POST",
                 add_url,
-                headers=headers,
+                token,
+                priority,
                 data={"magnet": magnet},
                 timeout=10
             )
@@ -661,36 +899,41 @@ class RealDebridCacheSearch:
                 return None
             
             torrent_id = add_response.json().get('id')
-            
-            # Step 2: Get torrent info to see files
             info_url = f"{RealDebridCacheSearch.BASE_URL}/torrents/info/{torrent_id}"
-            info_response = requests.get(info_url, headers=headers, timeout=10)
-            
-            if info_response.status_code != 200:
-                return None
             
-            torrent_info = info_response.json()
-            
-            # Step 3: Select files
+            # Step 2: Pick files - a file_id from the search result skips discovery
             if file_id:
                 files_to_select = file_id
             else:
-                # Select largest video file
-                files = torrent_info.get('files', [])
+                info_response = rd_scheduler.request("GET", info_url, token, priority, timeout=10)
+                if info_response.status_code != 200:
+                    return None
+                
+                files = info_response.json().get('files', [])
                 video_files = [
                     f for f in files 
-                    if f.get('path', '').lower().endswith(('.mkv', '.mp4', '.avi'))
+                    if RealDebridCacheSearch._is_video(f.get('path', ''))
                 ]
-                if video_files:
+                pack = [(str(f.get('id')), f.get('path', ''), f.get('bytes', 0)) for f in video_files]
+                RealDebridCacheSearch.episode_files.remember(info_hash, pack)
+                match = match_episode_file(pack, season, episode) if by_episode else None
+                
+                if match:
+                    files_to_select = match[0]
+                elif video_files:
+                    # Select largest video file
                     largest = max(video_files, key=lambda x: x.get('bytes', 0))
                     files_to_select = str(largest.get('id', 1))
                 else:
                     files_to_select = "all"
             
+            # Step 3: Select files
             select_url = f"{RealDebridCacheSearch.BASE_URL}/torrents/selectFiles/{torrent_id}"
-            requests.post(
+            rd_scheduler.request(
+                "POST",
                 select_url,
-                headers=headers,
+                token,
+                priority,
                 data={"files": files_to_select},
                 timeout=10
             )
@@ -698,7 +941,7 @@ class RealDebridCacheSearch:
             # Step 4: Wait for torrent to be ready (should be instant if cached)
             import time
             for _ in range(10):  # Max 10 seconds wait
-                info_response = requests.get(info_url, headers=headers, timeout=10)
+                info_response = rd_scheduler.request("GET", info_url, token, priority, timeout=10)
                 if info_response.status_code == 200:
                     info = info_response.json()
                     status = info.get('status')
@@ -708,9 +951,11 @@ class RealDebridCacheSearch:
                         if links:
                             # Step 5: Unrestrict the first link
                             unrestrict_url = f"{RealDebridCacheSearch.BASE_URL}/unrestrict/link"
-                            unrestrict_response = requests.post(
+                            unrestrict_response = rd_scheduler.request(
+                                "POST",
                                 unrestrict_url,
-                                headers=headers,
+                                token,
+                                priority,
                                 data={"link": links[0]},
                                 timeout=10
                             )
@@ -737,8 +982,8 @@ class AllDebridCacheSearch:
     BASE_URL = "https://api.alldebrid.com/v4"
     
     @staticmethod
-    def check_instant_availability(hashes: List[str], apikey: str) -> Dict[str, bool]:
-        """Check which torrents are cached on AllDebrid"""
+    def check_instant_availability(hashes: List[str], apikey: str, raise_errors: bool = False) -> Dict[str, bool]:
+        """Check which torrents are cached on AllDebrid (errors read as uncached unless `raise_errors`)"""
         cached = {}
         
         try:
@@ -756,9 +1001,13 @@ class AllDebridCacheSearch:
                 params[f"magnets[{i}]"] = magnet
             
             response = requests.get(url, params=params, timeout=15)
+            if raise_errors:
+                response.raise_for_status()
             
             if response.status_code == 200:
                 data = response.json()
+                if raise_errors and data.get('status') != 'success':
+                    raise ValueError(f"AllDebrid error: {data.get('error')}")
                 if data.get('status') == 'success':
                     magnets_data = data.get('data', {}).get('magnets', [])
                     for magnet_info in magnets_data:
@@ -768,6 +1017,8 @@ class AllDebridCacheSearch:
                                 cached[hash_value] = True
         
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error checking AllDebrid availability: {e}")
         
         return cached
@@ -779,8 +1030,8 @@ class PremiumizeCacheSearch:
     BASE_URL = "https://www.premiumize.me/api"
     
     @staticmethod
-    def check_instant_availability(hashes: List[str], apikey: str) -> Dict[str, bool]:
-        """Check which torrents are cached on Premiumize"""
+    def check_instant_availability(hashes: List[str], apikey: str, raise_errors: bool = False) -> Dict[str, bool]:
+        """Check which torrents are cached on Premiumize (errors read as uncached unless `raise_errors`)"""
         cached = {}
         
         try:
@@ -791,9 +1042,13 @@ class PremiumizeCacheSearch:
             }
             
             response = requests.get(url, params=params, timeout=15)
+            if raise_errors:
+                response.raise_for_status()
             
             if response.status_code == 200:
                 data = response.json()
+                if raise_errors and data.get('status') != 'success':
+                    raise ValueError(f"Premiumize error: {data.get('message')}")
                 if data.get('status') == 'success':
                     results = data.get('response', [])
                     for i, is_cached in enumerate(results):
@@ -801,6 +1056,136 @@ class PremiumizeCacheSearch:
                             cached[hashes[i].lower()] = True
         
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error checking Premiumize availability: {e}")
         
         return cached
+
+
+class TorBoxCacheSearch:
+    """TorBox Cache Search"""
+    
+    BASE_URL = "https://api.torbox.app/v1/api"
+    
+    @staticmethod
+    def check_instant_availability(hashes: List[str], token: str, raise_errors: bool = False) -> Dict[str, bool]:
+        """Check which torrents are cached on TorBox (errors read as uncached unless `raise_errors`)"""
+        cached = {}
+        
+        try:
+            url = f"{TorBoxCacheSearch.BASE_URL}/torrents/checkcached"
+            params = {
+                "hash": ",".join(hashes[:100]),
+                "format": "object",
+                "list_files": "false",
+            }
+            
+            response = requests.get(
+                url,
+                params=params,
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=15
+            )
+            if raise_errors:
+                response.raise_for_status()
+            
+            if response.status_code == 200:
+                data = response.json()
+                if raise_errors and not data.get('success'):
+                    raise ValueError(f"TorBox error: {data.get('detail')}")
+                if data.get('success'):
+                    # format=object keys by hash; older responses return a list
+                    results = data.get('data') or {}
+                    if isinstance(results, dict):
+                        for hash_value in results:
+                            cached[hash_value.lower()] = True
+                    else:
+                        for item in results:
+                            hash_value = (item or {}).get('hash', '').lower()
+                            if hash_value:
+                                cached[hash_value] = True
+        
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"Error checking TorBox availability: {e}")
+        
+        return cached
+
+
+class MultiDebridAvailability:
+    """
+    Checks one hash set against every configured debrid provider at once
+    Providers run concurrently; one that errors or runs past the deadline
+    is reported as such and the others' answers are still returned
+    """
+    
+    PROVIDERS = ("real-debrid", "alldebrid", "premiumize", "torbox")
+    BATCH_SIZE = 100
+    
+    @staticmethod
+    def normalize_hashes(hashes: Iterable[str]) -> List[str]:
+        """Lowercased, de-duplicated 40-char hex info hashes, order kept"""
+        seen = OrderedDict()
+        for value in hashes:
+            value = (value or "").strip().lower()
+            if re.fullmatch(r"[0-9a-f]{40}", value):
+                seen[value] = None
+        return list(seen)
+    
+    @staticmethod
+    def _check_provider(provider: str, hashes: List[str], credential: str) -> Dict[str, bool]:
+        """A provider's cached hashes; raises if the provider can't answer"""
+        checks = {
+            "real-debrid": RealDebridCacheSearch._check_instant_availability,
+            "alldebrid": AllDebridCacheSearch.check_instant_availability,
+            "premiumize": PremiumizeCacheSearch.check_instant_availability,
+            "torbox": TorBoxCacheSearch.check_instant_availability,
+        }
+        cached = {}
+        size = MultiDebridAvailability.BATCH_SIZE
+        for start in range(0, len(hashes), size):
+            cached.update(checks[provider](hashes[start:start + size], credential, raise_errors=True))
+        return {info_hash: True for info_hash in cached}
+    
+    @staticmethod
+    def check(hashes: List[str], credentials: Dict[str, str], timeout: float = 12) -> Dict:
+        """
+        `credentials` maps provider name -> token/API key (missing = skipped)
+        Returns {"providers": {name: status}, "availability": {hash: {name: bool}}}
+        """
+        configured = [p for p in MultiDebridAvailability.PROVIDERS if credentials.get(p)]
+        providers = {}
+        answers: Dict[str, Dict[str, bool]] = {}
+        
+        executor = ThreadPoolExecutor(max_workers=max(len(configured), 1))
+        started = time.monotonic()
+        futures = {
+            executor.submit(MultiDebridAvailability._check_provider, p, hashes, credentials[p]): p
+            for p in configured
+        }
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                provider = futures[future]
+                elapsed_ms = round((time.monotonic() - started) * 1000)
+                try:
+                    answers[provider] = future.result()
+                    providers[provider] = {"status": "ok", "cached": len(answers[provider]), "ms": elapsed_ms}
+                except Exception as e:
+                    logger.error(f"{provider} availability check failed: {e}")
+                    providers[provider] = {"status": "error", "ms": elapsed_ms}
+        except TimeoutError:
+            for future, provider in futures.items():
+                if provider not in providers:
+                    logger.warning(f"{provider} availability check timed out after {timeout}s")
+                    providers[provider] = {"status": "timeout", "ms": round(timeout * 1000)}
+        finally:
+            # Don't hold the response for a straggler; it finishes in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        availability = {
+            info_hash: {provider: info_hash in answers[provider] for provider in answers}
+            for info_hash in hashes
+        }
+        return {"providers": providers, "availability": availability}
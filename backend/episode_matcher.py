@@ -0,0 +1,165 @@
+"""
+Episode Matcher
+Finds the file for one episode inside a season pack from its file paths
+(S01E02, 1x02, "Season 1/Episode 2"), and caches the pack's episode ->
+file id mapping so later episodes skip discovery.
+
+Absolute-numbered files ("Show - 012") are recognised but only matched
+for season 1, where absolute and in-season numbers coincide: mapping
+later seasons would need per-season episode counts, which callers don't
+have
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# S01E02, S01.E02, S01E02E03, S01E02-E03, S01E02-03
+SXXEXX = re.compile(r"s(\d{1,2})[ ._-]?e(\d{1,4})(?:(?:-?e|-)(\d{1,4}))?(?!\d)", re.IGNORECASE)
+# 1x02 (but not 1920x1080)
+NXNN = re.compile(r"(?<![\dx])(\d{1,2})x(\d{2,3})(?!\d)", re.IGNORECASE)
+# "Season 2", "Saison 2", "Staffel 2" or a standalone "S02" path component
+SEASON_MARKER = re.compile(
+    r"(?:season|series|saison|staffel)[ ._-]*(\d{1,2})(?!\d)|(?:^|[/\\ ._\-\[(])s(\d{1,2})(?=$|[/\\ ._\-\])])",
+    re.IGNORECASE
+)
+# "E05", "Ep 05", "Episode 05"
+BARE_EPISODE = re.compile(r"(?:^|[ ._\-\[(])(?:e|ep|episode)[ ._-]?(\d{1,4})(?!\d)", re.IGNORECASE)
+# "[Group] Show - 012 [1080p]", "Show_012v2"
+ABSOLUTE = re.compile(r"(?:^|[ _\-\[(])(\d{2,4})(?:v\d)?(?=$|[ _\-\])\[.])")
+
+
+class ParsedEpisode(NamedTuple):
+    season: Optional[int]
+    episodes: Tuple[int, ...]
+    absolute: bool
+
+
+def _episode_range(first: str, last: Optional[str]) -> Tuple[int, ...]:
+    start = int(first)
+    end = int(last) if last else start
+    if end < start or end - start > 50:
+        end = start
+    return tuple(range(start, end + 1))
+
+
+@lru_cache(maxsize=8192)
+def parse_episode(path: str) -> Optional[ParsedEpisode]:
+    """Season/episode numbers encoded in a file path, None if there are none"""
+    directory, filename = os.path.split(path.replace("\\", "/"))
+    name = os.path.splitext(filename)[0]
+
+    match = SXXEXX.search(name) or NXNN.search(name)
+    if match:
+        last = match.group(3) if match.re is SXXEXX else None
+        return ParsedEpisode(int(match.group(1)), _episode_range(match.group(2), last), False)
+
+    season_match = SEASON_MARKER.search(name) or SEASON_MARKER.search(directory)
+    season = int(season_match.group(1) or season_match.group(2)) if season_match else None
+
+    match = BARE_EPISODE.search(name)
+    if not match:
+        match = next(
+            (m for m in ABSOLUTE.finditer(name) if not 1900 <= int(m.group(1)) <= 2099),
+            None
+        )
+    if match:
+        # Without a season marker the number is taken as absolute numbering
+        return ParsedEpisode(season, (int(match.group(1)),), season is None)
+    return None
+
+
+def matches_episode(parsed: Optional[ParsedEpisode], season: int, episode: int) -> bool:
+    """Whether a parsed path is the requested episode"""
+    if parsed is None:
+        return False
+    if not parsed.absolute:
+        return parsed.season == season and episode in parsed.episodes
+    # Absolute numbering only coincides with the season's own in S01
+    return season == 1 and episode in parsed.episodes
+
+
+def match_episode_file(
+    files: Iterable[Tuple[str, str, int]],
+    season: int,
+    episode: int
+) -> Optional[Tuple[str, str, int]]:
+    """Largest (file_id, path, size) for the requested episode, if any"""
+    best = None
+    for file in files:
+        if matches_episode(parse_episode(file[1]), season, episode):
+            if best is None or file[2] > best[2]:
+                best = file
+    return best
+
+
+def episode_index(files: Iterable[Tuple[str, str, int]]) -> Dict[Tuple[int, int], str]:
+    """(season, episode) -> file_id for every file with a known season"""
+    index: Dict[Tuple[int, int], Tuple[str, int]] = {}
+    for file_id, path, size in files:
+        parsed = parse_episode(path)
+        if parsed is None or parsed.absolute:
+            continue
+        for number in parsed.episodes:
+            key = (parsed.season, number)
+            if key not in index or size > index[key][1]:
+                index[key] = (file_id, size)
+    return {key: file_id for key, (file_id, _) in index.items()}
+
+
+class EpisodeFileCache:
+    """
+    TTL cache of (info_hash, season, episode) -> RD file id
+    Filled for every episode of a pack whenever its file list is seen
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 20000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, int], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, info_hash: str, season: int, episode: int) -> Optional[str]:
+        key = (info_hash.lower(), season, episode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def remember(self, info_hash: str, files: Iterable[Tuple[str, str, int]]) -> int:
+        """Index a pack's files; returns how many episodes were recognised"""
+        index = episode_index(files)
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for (season, episode), file_id in index.items():
+                key = (info_hash.lower(), season, episode)
+                self._entries[key] = (expires, file_id)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return len(index)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
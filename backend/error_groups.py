@@ -0,0 +1,297 @@
+"""
+Error Groups
+Fingerprints error/warning entries on ingestion so repeats of the same
+crash collapse into one error_groups document (count, first/last seen,
+versions, platforms and a capped list of raw samples).
+
+The fingerprint hashes the level, the message and the top stack frames
+after stripping what varies between copies of the same crash: addresses,
+ids, hashes, numbers (line/column, ports, counters) and query strings.
+Only the first `sample_cap` copies of a group seen by a worker keep their
+stack in log_entries; later copies carry just the fingerprint
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+GROUPS = "error_groups"
+
+FINGERPRINT_LEVELS = frozenset(("error", "warn", "fatal"))
+# Deep frames differ with async/call depth; the top of the stack identifies the crash
+STACK_FRAMES = 8
+
+_NOISE = (
+    (re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.I), "<id>"),
+    (re.compile(r"0x[0-9a-f]+", re.I), "<addr>"),
+    (re.compile(r"\b[0-9a-f]{8,}\b", re.I), "<hex>"),
+    (re.compile(r"\?[^\s)'\"]*"), "?<query>"),
+    (re.compile(r"\d+"), "<n>"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def normalize(text: str) -> str:
+    for pattern, replacement in _NOISE:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+# Frames repeat across occurrences far more than whole messages or
+# stacks do, and are short, so only they are worth caching
+_normalize_frame = lru_cache(maxsize=8192)(normalize)
+
+
+def fingerprint(level: str, message: str, stack: Optional[str]) -> str:
+    frames = []
+    if stack:
+        lines = [line for line in stack.splitlines() if line.strip()][:STACK_FRAMES]
+        frames = [_normalize_frame(line) for line in lines]
+    raw = "\n".join([level, normalize(message or "")] + frames)
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+class Grouped(NamedTuple):
+    """What process() decided for a batch, applied by record() once it's accepted"""
+    deltas: List[Tuple[str, Dict]]
+    # fingerprint -> stacks the batch keeps
+    stacks_kept: Dict[str, int]
+    stacks_dropped: int
+
+
+class ErrorGroups:
+    """
+    Accumulates group deltas as uploads are accepted and flushes them as
+    upserts (same cadence as the log rollups)
+    """
+
+    def __init__(
+        self,
+        db,
+        sample_cap: int = 20,
+        max_tracked: int = 50000,
+        flush_interval: float = 5.0,
+        ttl: Optional[Callable[[Optional[str]], timedelta]] = None
+    ):
+        self.groups = db[GROUPS]
+        # Retention for a level; a group expires that long after it was last seen
+        self.ttl = ttl
+        self.sample_cap = sample_cap
+        self.max_tracked = max_tracked
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        # fingerprint -> stacks kept in log_entries by this worker
+        self._stacks_kept: "OrderedDict[str, int]" = OrderedDict()
+        self.fingerprinted = 0
+        self.stacks_dropped = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, db, ttl: Optional[Callable[[Optional[str]], timedelta]] = None) -> "ErrorGroups":
+        return cls(
+            db,
+            sample_cap=int(os.environ.get("ERROR_GROUP_SAMPLES", "20")),
+            flush_interval=float(os.environ.get("LOG_ROLLUP_FLUSH_INTERVAL", "5")),
+            ttl=ttl,
+        )
+
+    async def ensure_indexes(self):
+        try:
+            await self.groups.create_index([("last_seen", DESCENDING)])
+            await self.groups.create_index([("count", DESCENDING)])
+            await self.groups.create_index([("level", 1), ("last_seen", DESCENDING)])
+        except PyMongoError as e:
+            logger.error(f"Error group index error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error group flush error: {e}")
+
+    def _commit_stacks(self, stacks_kept: Dict[str, int]):
+        for fp, kept in stacks_kept.items():
+            self._stacks_kept[fp] = self._stacks_kept.get(fp, 0) + kept
+            self._stacks_kept.move_to_end(fp)
+        while len(self._stacks_kept) > self.max_tracked:
+            self._stacks_kept.popitem(last=False)
+
+    def _merge(self, fp: str, delta: Dict):
+        group = self._pending.get(fp)
+        if group is None:
+            self._pending[fp] = delta
+            return
+        group["count"] += delta["count"]
+        group["first_seen"] = min(group["first_seen"], delta["first_seen"])
+        group["last_seen"] = max(group["last_seen"], delta["last_seen"])
+        group["app_versions"] |= delta["app_versions"]
+        group["platforms"] |= delta["platforms"]
+        group["samples"] = (group["samples"] + delta["samples"])[:self.sample_cap]
+
+    def process(self, entries: List[Dict]) -> Grouped:
+        """
+        Fingerprint log_entries documents in place (dropping repeated
+        stacks). Changes nothing else until the result is passed to
+        record(), so a batch the queue rejects neither counts towards its
+        groups nor uses up their stack quota
+        """
+        deltas = []
+        stacks_kept: Dict[str, int] = {}
+        stacks_dropped = 0
+        for entry in entries:
+            level = entry.get("level")
+            if level not in FINGERPRINT_LEVELS and not entry.get("stack"):
+                continue
+            fp = fingerprint(level or "", entry.get("message") or "", entry.get("stack"))
+            entry["fingerprint"] = fp
+
+            deltas.append((fp, {
+                "level": level,
+                "message": entry.get("message"),
+                "normalized": normalize(entry.get("message") or ""),
+                "stack": entry.get("stack"),
+                "count": 1,
+                "first_seen": entry["timestamp"],
+                "last_seen": entry["timestamp"],
+                "app_versions": {entry.get("app_version")},
+                "platforms": {entry.get("platform")},
+                "samples": [{
+                    "upload_id": entry.get("upload_id"),
+                    "device_id": entry.get("device_id"),
+                    "app_version": entry.get("app_version"),
+                    "timestamp": entry["timestamp"],
+                    "message": entry.get("message"),
+                    "context": entry.get("context"),
+                    "stack": entry.get("stack"),
+                }],
+            }))
+
+            if entry.get("stack"):
+                kept = stacks_kept.setdefault(fp, 0)
+                if self._stacks_kept.get(fp, 0) + kept < self.sample_cap:
+                    stacks_kept[fp] = kept + 1
+                else:
+                    entry["stack"] = None
+                    stacks_dropped += 1
+        return Grouped(deltas, stacks_kept, stacks_dropped)
+
+    def record(self, grouped: Grouped):
+        """Count a processed batch that was accepted for writing"""
+        for fp, delta in grouped.deltas:
+            self._merge(fp, delta)
+        self._commit_stacks(grouped.stacks_kept)
+        self.fingerprinted += len(grouped.deltas)
+        self.stacks_dropped += grouped.stacks_dropped
+
+    def _update(self, group: Dict) -> Dict:
+        last_seen = {"last_seen": group["last_seen"]}
+        if self.ttl is not None:
+            last_seen["expires_at"] = group["last_seen"] + self.ttl(group["level"])
+        return {
+            "$setOnInsert": {
+                "level": group["level"],
+                "message": group["message"],
+                "normalized": group["normalized"],
+                "stack": group["stack"],
+            },
+            "$inc": {"count": group["count"]},
+            "$min": {"first_seen": group["first_seen"]},
+            "$max": last_seen,
+            "$addToSet": {
+                "app_versions": {"$each": sorted(v for v in group["app_versions"] if v)},
+                "platforms": {"$each": sorted(p for p in group["platforms"] if p)},
+            },
+            # Keeps the oldest samples; the array never grows past the cap
+            "$push": {"samples": {"$each": group["samples"], "$slice": self.sample_cap}},
+        }
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        operations = [UpdateOne({"_id": fp}, self._update(group), upsert=True) for fp, group in pending.items()]
+        try:
+            await self.groups.bulk_write(operations, ordered=False)
+        except PyMongoError as e:
+            # Keep the deltas for the next flush rather than losing counts
+            for fp, group in pending.items():
+                self._merge(fp, group)
+            self.errors += 1
+            logger.error(f"Error group flush of {len(operations)} groups failed: {e}")
+
+    async def clear(self):
+        self._pending.clear()
+        self._stacks_kept.clear()
+        await self.groups.delete_many({})
+
+    # ----------------------------------------
+    # Reading
+    # ----------------------------------------
+
+    async def list_groups(
+        self,
+        limit: int = 50,
+        level: Optional[str] = None,
+        since: Optional[datetime] = None,
+        sort: str = "last_seen"
+    ) -> Tuple[List[Dict], int]:
+        query: Dict = {}
+        if level:
+            query["level"] = level
+        if since:
+            query["last_seen"] = {"$gte": since}
+        docs = await self.groups.find(query, {"samples": 0}).sort(sort, -1).to_list(limit)
+        total = await self.groups.count_documents(query)
+        return [self._to_api(doc) for doc in docs], total
+
+    async def get(self, fp: str) -> Optional[Dict]:
+        doc = await self.groups.find_one({"_id": fp})
+        return self._to_api(doc) if doc else None
+
+    @staticmethod
+    def _to_api(doc: Dict) -> Dict:
+        doc["fingerprint"] = doc.pop("_id")
+        for field in ("first_seen", "last_seen"):
+            if isinstance(doc.get(field), datetime):
+                doc[field] = doc[field].isoformat() + "Z"
+        for sample in doc.get("samples", []):
+            if isinstance(sample.get("timestamp"), datetime):
+                sample["timestamp"] = sample["timestamp"].isoformat() + "Z"
+        return doc
+
+    def stats(self) -> Dict:
+        return {
+            "pending_groups": len(self._pending),
+            "fingerprinted": self.fingerprinted,
+            "stacks_dropped": self.stacks_dropped,
+            "errors": self.errors,
+        }
@@ -0,0 +1,59 @@
+"""
+Fast Response Serialization
+orjson-backed JSON responses for large search payloads, with optional
+msgpack when the client asks for it via Accept: application/msgpack
+"""
+
+import logging
+from typing import Any
+
+import msgpack
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for values neither serializer knows (e.g. ObjectId)"""
+    return str(obj)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with orjson
+    Returning this from a route skips FastAPI's jsonable_encoder pass,
+    so results that are already plain dicts are serialized only once
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MsgPackResponse(Response):
+    """Binary msgpack response for clients that negotiate it"""
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True, default=_default)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Check whether the client accepts msgpack"""
+    accept = request.headers.get("accept", "").lower()
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def negotiate_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """
+    Build the cheapest response the client understands
+    msgpack if requested in Accept, otherwise orjson-encoded JSON
+    """
+    headers = {"Vary": "Accept"}
+    if wants_msgpack(request):
+        return MsgPackResponse(content, status_code=status_code, headers=headers)
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
@@ -0,0 +1,316 @@
+"""
+Log Ingestion Pipeline
+Write-behind queue for device log uploads: the request handler enqueues
+and acknowledges immediately, a background writer drains the queue into
+MongoDB with unordered insert_many batches. The queue is bounded, so a
+post-release flood is pushed back to clients (503 + Retry-After) instead
+of growing memory or Mongo latency without limit.
+
+Uploads are acknowledged before they're written, so a failed insert is
+retried with backoff and then requeued; documents are only dropped when
+the queue has no room left for them, and those drops are counted
+"""
+
+import asyncio
+import logging
+import os
+import time
+import zlib
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+# Most bytes one decompress() call may produce, so a small compressed
+# chunk can't expand into a large allocation
+INFLATE_STEP = 256 * 1024
+# A retried insert_many may find some of its documents already written
+DUPLICATE_KEY = 11000
+
+
+class PayloadTooLarge(ValueError):
+    pass
+
+
+async def ndjson_lines(
+    chunks: AsyncIterator[bytes],
+    max_line: int = 256 * 1024,
+    max_total: int = 256 * 1024 * 1024
+) -> AsyncIterator[bytes]:
+    """
+    Non-empty lines of a streamed NDJSON body, gunzipped on the fly when
+    it starts with the gzip magic. Memory is bounded by `max_line` plus one
+    inflate step; PayloadTooLarge past `max_line` or `max_total` bytes
+    """
+    decompressor = None
+    sniffed = False
+    pending = b""
+    total = 0
+
+    def inflate(chunk: bytes):
+        if decompressor is None:
+            yield chunk
+            return
+        data = decompressor.decompress(chunk, INFLATE_STEP)
+        yield data
+        while decompressor.unconsumed_tail:
+            data = decompressor.decompress(decompressor.unconsumed_tail, INFLATE_STEP)
+            yield data
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if not sniffed:
+            sniffed = True
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(47)
+        for data in inflate(chunk):
+            total += len(data)
+            if total > max_total:
+                raise PayloadTooLarge(f"Upload exceeds {max_total} bytes")
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            if len(pending) > max_line:
+                raise PayloadTooLarge(f"Line exceeds {max_line} bytes")
+            for line in lines:
+                if line.strip():
+                    yield line
+
+    if decompressor is not None:
+        if not decompressor.eof:
+            raise zlib.error("Truncated gzip body")
+        pending += decompressor.flush()
+    if pending.strip():
+        yield pending
+
+
+class LogIngestQueue:
+    """
+    Bounded in-memory queue of (collection name, document) pairs; instead
+    of a document an item may carry a pymongo write operation (UpdateOne),
+    which is applied with bulk_write
+
+    `max_documents` bounds the queue, `batch_size` bounds one insert_many,
+    and a partial batch is written at least every `flush_interval` seconds.
+    A failing insert is retried `write_retries` times (backoff doubling
+    from `retry_backoff` seconds) before its documents are requeued
+    """
+
+    def __init__(
+        self,
+        db,
+        max_documents: int = 50000,
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        write_retries: int = 3,
+        retry_backoff: float = 0.5
+    ):
+        self.db = db
+        self.max_documents = max_documents
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self._queue: Deque[Tuple[str, Any]] = deque()
+        self._has_data: Optional[asyncio.Event] = None
+        self._has_space: Optional[asyncio.Event] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.write_errors = 0
+        self.retries = 0
+        self.requeued = 0
+        self.dropped = 0
+        self.last_batch_ms: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, db) -> "LogIngestQueue":
+        return cls(
+            db,
+            max_documents=int(os.environ.get("LOG_QUEUE_MAX", "50000")),
+            batch_size=int(os.environ.get("LOG_BATCH_SIZE", "1000")),
+            flush_interval=float(os.environ.get("LOG_FLUSH_INTERVAL", "1.0")),
+            write_retries=int(os.environ.get("LOG_WRITE_RETRIES", "3")),
+        )
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._has_data = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+        self._write_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the writer and flush whatever is still queued"""
+        if self._task is None:
+            return
+        # Not cancelled: a cancel could land mid-batch (or mid-retry) and
+        # lose documents that were already acknowledged
+        self._stopping = True
+        self._has_data.set()
+        await self._task
+        self._task = None
+        await self.flush()
+        if self._queue:
+            logger.error(f"Log writer stopped with {len(self._queue)} documents unwritten")
+
+    async def put(self, documents: List[Tuple[str, Any]], timeout: float = 1.0) -> bool:
+        """
+        Queue (collection, document) pairs, all or none, waiting up to
+        `timeout` seconds for room; False means the queue stayed full and
+        the caller should shed
+        """
+        if len(documents) > self.max_documents:
+            self.rejected += 1
+            return False
+        deadline = time.monotonic() + timeout
+        while len(self._queue) + len(documents) > self.max_documents:
+            self._has_space.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.rejected += 1
+                return False
+            try:
+                await asyncio.wait_for(self._has_space.wait(), remaining)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+
+        self._queue.extend(documents)
+        self.enqueued += len(documents)
+        if len(self._queue) >= self.batch_size:
+            self._has_data.set()
+        return True
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._has_data.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._has_data.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Log writer error: {e}")
+                await asyncio.sleep(1.0)
+
+    async def flush(self):
+        """Write everything queued so far (also used before reads that must see it)"""
+        if self._write_lock is None:
+            return
+        async with self._write_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._has_space.set()
+                try:
+                    failed = await self._write(batch)
+                except asyncio.CancelledError:
+                    # e.g. a read's pre-flush whose client went away. The
+                    # batch may be partly written: its inserts are idempotent,
+                    # a summary $inc may be counted twice
+                    self._requeue(batch)
+                    raise
+                if failed:
+                    # Mongo is unavailable: keep the rest for the writer's next pass
+                    self._requeue(failed)
+                    break
+
+    def _requeue(self, documents: List[Tuple[str, Any]]):
+        """Put unwritten documents back at the front, dropping what no longer fits"""
+        room = max(0, self.max_documents - len(self._queue))
+        kept = documents[:room]
+        self._queue.extendleft(reversed(kept))
+        self.requeued += len(kept)
+        if len(documents) > room:
+            self.dropped += len(documents) - room
+            logger.error(f"Log queue full: dropped {len(documents) - room} unwritten documents")
+
+    async def _insert(self, collection: str, docs: List[Dict]) -> bool:
+        """insert_many with retries; False if Mongo kept failing"""
+        for attempt in range(self.write_retries + 1):
+            try:
+                result = await self.db[collection].insert_many(docs, ordered=False)
+                self.written += len(result.inserted_ids)
+                return True
+            except BulkWriteError as e:
+                # Unordered: everything but the failed documents went in, and
+                # duplicates were written by an earlier attempt
+                inserted = e.details.get("nInserted", 0)
+                duplicates = sum(1 for error in e.details.get("writeErrors", []) if error.get("code") == DUPLICATE_KEY)
+                failed = len(docs) - inserted - duplicates
+                self.written += inserted + duplicates
+                self.write_errors += failed
+                if failed:
+                    logger.error(f"Log batch partially written to {collection}: {failed} failed")
+                return True
+            except PyMongoError as e:
+                if attempt == self.write_retries:
+                    logger.error(f"Log batch of {len(docs)} not written ({collection}), requeueing: {e}")
+                    return False
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+        return False
+
+    async def _apply(self, collection: str, operations: List[Any]) -> bool:
+        """bulk_write with retries; False if Mongo kept failing"""
+        for attempt in range(self.write_retries + 1):
+            try:
+                await self.db[collection].bulk_write(operations, ordered=False)
+                self.written += len(operations)
+                return True
+            except BulkWriteError as e:
+                failed = len(e.details.get("writeErrors", []))
+                self.written += len(operations) - failed
+                self.write_errors += failed
+                logger.error(f"Log updates partially applied to {collection}: {failed} failed")
+                return True
+            except PyMongoError as e:
+                if attempt == self.write_retries:
+                    logger.error(f"Log updates of {len(operations)} not applied ({collection}), requeueing: {e}")
+                    return False
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+        return False
+
+    async def _write(self, batch: List[Tuple[str, Any]]) -> List[Tuple[str, Any]]:
+        """Write a batch; returns the items that couldn't be written"""
+        by_target: Dict[Tuple[str, bool], List[Any]] = {}
+        for collection, item in batch:
+            by_target.setdefault((collection, isinstance(item, dict)), []).append(item)
+
+        started = time.monotonic()
+        failed: List[Tuple[str, Any]] = []
+        for (collection, is_document), items in by_target.items():
+            write = self._insert if is_document else self._apply
+            if not await write(collection, items):
+                self.write_errors += len(items)
+                failed.extend((collection, item) for item in items)
+        self.batches += 1
+        self.last_batch_ms = round((time.monotonic() - started) * 1000, 1)
+        return failed
+
+    def stats(self) -> Dict:
+        return {
+            "queued": len(self._queue),
+            "max_documents": self.max_documents,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "write_errors": self.write_errors,
+            "retries": self.retries,
+            "requeued": self.requeued,
+            "dropped": self.dropped,
+            "last_batch_ms": self.last_batch_ms,
+        }
@@ -0,0 +1,346 @@
+"""
+Log Retention
+Per-level retention enforced by TTL indexes, plus a cold tier:
+
+- every log entry, upload summary, error group, hourly rollup and debug
+  bundle carries an `expires_at` date (from LOG_RETENTION_DAYS, e.g. debug=3,error=90) and
+  MongoDB's TTL monitor deletes it once that passes
+- uploads received more than LOG_ARCHIVE_AFTER_DAYS ago are compacted:
+  their entries move out of log_entries into log_archives (one
+  gzip-compressed NDJSON document per (day, level, chunk), which keeps its
+  entries' expiry) and their summaries are removed from log_uploads, so
+  /logs never lists an upload whose entries have gone cold
+
+so the hot collections (and their indexes) hold days of data, not months.
+
+Search, export and error group occurrences only read log_entries, so
+archived entries are only reachable as whole archive downloads. Levels in
+LOG_ARCHIVE_KEEP_LEVELS (error and fatal by default) are therefore never
+compacted: they stay searchable for their full retention, and uploads
+containing them keep their summaries, at the cost of those entries
+staying in the hot collection (and being re-scanned by each compaction
+run). An upload that is kept this way still reports its original
+log_count although only its kept-level entries remain listed
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import orjson
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from starlette.concurrency import run_in_threadpool
+
+from error_groups import GROUPS
+from log_rollups import ROLLUPS
+from log_store import ENTRIES, UPLOADS, located_entry
+
+logger = logging.getLogger(__name__)
+
+ARCHIVES = "log_archives"
+DEBUG_BUNDLES = "debug_bundles"
+
+DEFAULT_LEVEL_DAYS = {"debug": 3, "info": 14, "warn": 30, "error": 90, "fatal": 90}
+# Levels that stay in log_entries (searchable) until they expire
+DEFAULT_KEEP_LEVELS = ("error", "fatal")
+
+
+def day_of(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RetentionPolicy:
+    """How long stored logs live, per level"""
+
+    def __init__(
+        self,
+        level_days: Optional[Dict[str, float]] = None,
+        default_days: float = 30,
+        bundle_days: float = 30
+    ):
+        self.level_days = dict(DEFAULT_LEVEL_DAYS if level_days is None else level_days)
+        self.default_days = default_days
+        self.bundle_days = bundle_days
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        # LOG_RETENTION_DAYS="debug=3,info=14,warn=30,error=90"
+        level_days = dict(DEFAULT_LEVEL_DAYS)
+        for item in os.environ.get("LOG_RETENTION_DAYS", "").split(","):
+            if "=" in item:
+                level, days = item.split("=", 1)
+                level_days[level.strip()] = float(days)
+        return cls(
+            level_days=level_days,
+            default_days=float(os.environ.get("LOG_RETENTION_DEFAULT_DAYS", "30")),
+            bundle_days=float(os.environ.get("DEBUG_BUNDLE_RETENTION_DAYS", "30")),
+        )
+
+    def ttl(self, level: Optional[str]) -> timedelta:
+        return timedelta(days=self.level_days.get(level, self.default_days))
+
+    def longest(self) -> timedelta:
+        return max([self.ttl(level) for level in self.level_days] + [self.ttl(None)])
+
+    def stamp(self, entries: List[Dict], summary: Optional[Dict] = None):
+        """Set expires_at on entry documents (and their upload summary) from ingestion time"""
+        for entry in entries:
+            entry["expires_at"] = entry["uploaded_at"] + self.ttl(entry.get("level"))
+        if summary is not None:
+            # The summary lives as long as its longest-kept entry
+            longest = max((self.ttl(level) for level in summary.get("levels") or []), default=self.ttl(None))
+            summary["expires_at"] = summary["uploaded_at"] + longest
+
+    def bundle_expiry(self, uploaded_at: datetime) -> datetime:
+        return uploaded_at + timedelta(days=self.bundle_days)
+
+    def _ms(self, level: Optional[str]) -> int:
+        return int(self.ttl(level).total_seconds() * 1000)
+
+    def level_ttl_expression(self) -> Dict:
+        """Aggregation expression: retention in ms for the document's $level"""
+        return {"$switch": {
+            "branches": [
+                {"case": {"$eq": ["$level", level]}, "then": self._ms(level)}
+                for level in self.level_days
+            ],
+            "default": self._ms(None),
+        }}
+
+
+class LogRetention:
+    """
+    Startup index/backfill task and the periodic compaction into archives
+
+    Compaction is idempotent (archive ids derive from their first entry and
+    entries are deleted only after their archive is written), so an
+    interrupted or concurrent run at worst rewrites an archive
+    """
+
+    def __init__(
+        self,
+        db,
+        policy: RetentionPolicy,
+        archive_after_days: float = 7,
+        interval: float = 6 * 3600,
+        initial_delay: float = 60,
+        chunk_size: int = 2000,
+        keep_levels=DEFAULT_KEEP_LEVELS,
+        enabled: bool = True
+    ):
+        self.db = db
+        self.policy = policy
+        self.keep_levels = list(keep_levels)
+        self.archives = db[ARCHIVES]
+        self.archive_after_days = archive_after_days
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.chunk_size = chunk_size
+        self.enabled = enabled
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.archived_entries = 0
+        self.archived_uploads = 0
+        self.archives_written = 0
+        self.backfilled = 0
+        self.errors = 0
+        self.last_run_ms: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, db, policy: RetentionPolicy) -> "LogRetention":
+        return cls(
+            db,
+            policy,
+            archive_after_days=float(os.environ.get("LOG_ARCHIVE_AFTER_DAYS", "7")),
+            interval=float(os.environ.get("LOG_COMPACTION_INTERVAL", str(6 * 3600))),
+            keep_levels=[
+                level.strip()
+                for level in os.environ.get("LOG_ARCHIVE_KEEP_LEVELS", ",".join(DEFAULT_KEEP_LEVELS)).split(",")
+                if level.strip()
+            ],
+            enabled=os.environ.get("LOG_COMPACTION_ENABLED", "true").lower() == "true",
+        )
+
+    async def ensure_indexes(self):
+        try:
+            # expires_at holds the deletion time itself, so changed retention
+            # settings apply to new documents without rebuilding indexes
+            for collection in (ENTRIES, UPLOADS, ARCHIVES, GROUPS, ROLLUPS, DEBUG_BUNDLES):
+                await self.db[collection].create_index("expires_at", expireAfterSeconds=0)
+            await self.archives.create_index([("day", DESCENDING), ("level", ASCENDING)])
+            # Compaction walks entries in the order their uploads arrived
+            await self.db[ENTRIES].create_index([("uploaded_at", ASCENDING), ("_id", ASCENDING)])
+        except PyMongoError as e:
+            logger.error(f"Log retention index error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        try:
+            await self.backfill()
+        except PyMongoError as e:
+            self.errors += 1
+            logger.error(f"Log retention backfill error: {e}")
+        if not self.enabled:
+            return
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Log compaction error: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def backfill(self):
+        """Give documents stored before retention existed an expires_at"""
+        missing = {"expires_at": {"$exists": False}}
+        results = [
+            await self.db[ENTRIES].update_many(missing, [{"$set": {
+                "expires_at": {"$add": ["$uploaded_at", self.policy.level_ttl_expression()]},
+            }}]),
+            await self.db[UPLOADS].update_many(missing, [{"$set": {
+                "expires_at": {"$add": ["$uploaded_at", int(self.policy.longest().total_seconds() * 1000)]},
+            }}]),
+            await self.db[GROUPS].update_many(missing, [{"$set": {
+                "expires_at": {"$add": ["$last_seen", self.policy.level_ttl_expression()]},
+            }}]),
+            # All-time totals (hour: null) are kept
+            await self.db[ROLLUPS].update_many({**missing, "hour": {"$ne": None}}, [{"$set": {
+                "expires_at": {"$add": ["$hour", int(self.policy.longest().total_seconds() * 1000)]},
+            }}]),
+            await self.db[DEBUG_BUNDLES].update_many(missing, [{"$set": {
+                "expires_at": {"$add": [
+                    {"$dateFromString": {"dateString": "$uploaded_at", "onError": "$$NOW", "onNull": "$$NOW"}},
+                    int(self.policy.bundle_days * 86400 * 1000),
+                ]},
+            }}]),
+        ]
+        backfilled = sum(result.modified_count for result in results)
+        self.backfilled += backfilled
+        if backfilled:
+            logger.info(f"Log retention: set expires_at on {backfilled} existing documents")
+
+    # ----------------------------------------
+    # Compaction into daily archives
+    # ----------------------------------------
+
+    @staticmethod
+    def _pack(docs: List[Dict]) -> bytes:
+        return gzip.compress(b"\n".join(orjson.dumps(located_entry(doc)) for doc in docs) + b"\n")
+
+    async def _archive(self, day: datetime, level: str, docs: List[Dict]):
+        data = await run_in_threadpool(self._pack, docs)
+        archive = {
+            "day": day,
+            "level": level,
+            "count": len(docs),
+            "first": min(doc["timestamp"] for doc in docs),
+            "last": max(doc["timestamp"] for doc in docs),
+            "devices": len({doc.get("device_id") for doc in docs}),
+            "compressed_bytes": len(data),
+            "data": data,
+            "archived_at": datetime.utcnow(),
+            "expires_at": max(doc.get("expires_at") or day + self.policy.ttl(level) for doc in docs),
+        }
+        archive_id = f"{day:%Y-%m-%d}:{level}:{docs[0]['_id']}"
+        await self.archives.replace_one({"_id": archive_id}, archive, upsert=True)
+        await self.db[ENTRIES].delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        self.archives_written += 1
+        self.archived_entries += len(docs)
+
+    async def compact(self):
+        """
+        Move the entries of uploads older than `archive_after_days` into
+        log_archives (by day received), except those at `keep_levels`, then
+        drop the summaries of uploads with nothing left to list. Keyed on
+        uploaded_at rather than the device's entry timestamps
+        """
+        started = time.monotonic()
+        cutoff = day_of(datetime.utcnow() - timedelta(days=self.archive_after_days))
+        cursor = self.db[ENTRIES].find({"uploaded_at": {"$lt": cutoff}, "level": {"$nin": self.keep_levels}}) \
+            .sort([("uploaded_at", 1), ("_id", 1)]).batch_size(self.chunk_size)
+
+        current_day: Optional[datetime] = None
+        buffers: Dict[str, List[Dict]] = {}
+        async for doc in cursor:
+            day = day_of(doc["uploaded_at"])
+            if day != current_day:
+                for level, docs in buffers.items():
+                    if docs:
+                        await self._archive(current_day, level, docs)
+                buffers = {}
+                current_day = day
+            level = doc.get("level") or "unknown"
+            buffer = buffers.setdefault(level, [])
+            buffer.append(doc)
+            if len(buffer) >= self.chunk_size:
+                await self._archive(day, level, buffer)
+                buffers[level] = []
+        for level, docs in buffers.items():
+            if docs:
+                await self._archive(current_day, level, docs)
+
+        # Only once every entry before the cutoff is archived
+        result = await self.db[UPLOADS].delete_many({"uploaded_at": {"$lt": cutoff}, "levels": {"$nin": self.keep_levels}})
+        self.archived_uploads += result.deleted_count
+
+        self.runs += 1
+        self.last_run_ms = round((time.monotonic() - started) * 1000, 1)
+
+    # ----------------------------------------
+    # Reading archives
+    # ----------------------------------------
+
+    async def list_archives(self, day: Optional[datetime] = None, level: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        query: Dict = {}
+        if day:
+            query["day"] = day_of(day)
+        if level:
+            query["level"] = level
+        docs = await self.archives.find(query, {"data": 0}).sort([("day", -1), ("level", 1)]).to_list(limit)
+        for doc in docs:
+            doc["archive_id"] = doc.pop("_id")
+            for field in ("day", "first", "last", "archived_at", "expires_at"):
+                if isinstance(doc.get(field), datetime):
+                    doc[field] = doc[field].isoformat() + "Z"
+        return docs
+
+    async def archive_data(self, archive_id: str) -> Optional[bytes]:
+        doc = await self.archives.find_one({"_id": archive_id}, {"data": 1})
+        return bytes(doc["data"]) if doc else None
+
+    async def clear(self):
+        await self.archives.delete_many({})
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "level_days": self.policy.level_days,
+            "archive_after_days": self.archive_after_days,
+            "keep_levels": self.keep_levels,
+            "runs": self.runs,
+            "archives_written": self.archives_written,
+            "archived_entries": self.archived_entries,
+            "archived_uploads": self.archived_uploads,
+            "backfilled": self.backfilled,
+            "errors": self.errors,
+            "last_run_ms": self.last_run_ms,
+        }
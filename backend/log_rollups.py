@@ -0,0 +1,391 @@
+"""
+Log Rollups
+Per-hour upload/entry counters by level, app version, platform and device,
+kept in log_rollups so dashboard statistics are read from a few hundred
+small documents instead of by scanning every stored log.
+
+Counters are accumulated in memory as uploads are accepted and flushed as
+upserted $inc batches; rebuild() recomputes them from log_uploads (used
+after a migration, or whenever the rollups are missing).
+
+Hourly documents expire with the logs they count (`retention`); all-time
+upload/entry/level totals are kept in a handful of `hour: null` documents
+so a total never needs a scan of the hourly ones.
+
+Distinct devices are counted from one "devices" document per hour holding
+the hour's device ids (capped at `device_cap`; past it the count is a
+lower bound), so a window's device count reads one document per hour
+rather than one per device and hour
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+
+from log_store import UPLOADS
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS = "log_rollups"
+
+# Rollup dimension -> log_uploads field; "all" counts every upload
+DIMENSIONS = {
+    "all": None,
+    "app_version": "app_version",
+    "platform": "platform",
+    "device": "device_id",
+}
+# Dimensions that also keep all-time totals (bounded: one per level)
+TOTAL_DIMENSIONS = ("all", "level")
+# Stand-in hour of the all-time total documents
+TOTAL = None
+# Dimension of the per-hour distinct device id sets
+DEVICE_SET = "devices"
+
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_counts(summary: Dict) -> List[Tuple[str, str, int]]:
+    """(dimension, value, entries) triples one upload summary adds to its hour"""
+    counts = [
+        (dimension, "" if field is None else str(summary.get(field)), summary.get("log_count", 0))
+        for dimension, field in DIMENSIONS.items()
+    ]
+    counts.extend(("level", level, n) for level, n in summary.get("level_counts", {}).items())
+    return counts
+
+
+class LogRollups:
+    """
+    Hourly counters: one document per (hour, dimension, value) holding the
+    number of uploads and entries. Deltas are written every `flush_interval`
+    seconds, so counters trail ingestion by at most that long
+    """
+
+    def __init__(
+        self,
+        db,
+        flush_interval: float = 5.0,
+        retention: timedelta = timedelta(days=90),
+        device_cap: int = 5000,
+        max_device_docs: int = 2000
+    ):
+        self.db = db
+        self.rollups = db[ROLLUPS]
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.device_cap = device_cap
+        # Most per-device hourly documents summary() ranks top devices from
+        self.max_device_docs = max_device_docs
+        # Widest window summary() answers: the hours rollups are kept for
+        self.max_hours = max(1, int(retention.total_seconds() // 3600))
+        self._pending: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0])
+        self._devices: Dict[datetime, set] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.rebuilds = 0
+        self.errors = 0
+        self.last_rebuild_ms: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, db, retention: timedelta = timedelta(days=90)) -> "LogRollups":
+        return cls(
+            db,
+            flush_interval=float(os.environ.get("LOG_ROLLUP_FLUSH_INTERVAL", "5")),
+            retention=retention,
+            device_cap=int(os.environ.get("LOG_ROLLUP_DEVICE_CAP", "5000")),
+        )
+
+    async def ensure_indexes(self):
+        try:
+            await self.rollups.create_index(
+                [("hour", ASCENDING), ("dimension", ASCENDING), ("value", ASCENDING)],
+                unique=True
+            )
+            # Top devices are read heaviest first
+            await self.rollups.create_index([("dimension", ASCENDING), ("entries", DESCENDING)])
+        except PyMongoError as e:
+            logger.error(f"Log rollup index error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    async def _run(self):
+        try:
+            # Uploads stored before rollups existed (or migrated) aren't counted yet
+            if not await self.rollups.estimated_document_count() and await self.db[UPLOADS].estimated_document_count():
+                await self.rebuild()
+        except PyMongoError as e:
+            logger.error(f"Log rollup rebuild error: {e}")
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Log rollup flush error: {e}")
+
+    # ----------------------------------------
+    # Incremental counting
+    # ----------------------------------------
+
+    def record(self, summary: Dict, previous: Optional[Dict] = None):
+        """
+        Count an accepted upload (a log_uploads summary). For a later batch
+        of a streamed upload `previous` is the summary before that batch,
+        and only the difference is counted
+        """
+        hour = hour_of(summary["uploaded_at"])
+        if previous is None:
+            self._devices[hour].add(str(summary.get("device_id")))
+        before = {(dimension, value): entries for dimension, value, entries in rollup_counts(previous)} if previous else {}
+        for dimension, value, entries in rollup_counts(summary):
+            counted = before.get((dimension, value))
+            uploads = 0 if counted is not None else 1
+            entries -= counted or 0
+            if not uploads and not entries:
+                continue
+            for key in (hour, TOTAL) if dimension in TOTAL_DIMENSIONS else (hour,):
+                counters = self._pending[(key, dimension, value)]
+                counters[0] += uploads
+                counters[1] += entries
+
+    def _update(self, hour: Optional[datetime], uploads: int, entries: int) -> Dict:
+        update: Dict = {"$inc": {"uploads": uploads, "entries": entries}}
+        if hour is not TOTAL:
+            update["$setOnInsert"] = {"expires_at": hour + self.retention}
+        return update
+
+    def _add_devices(self, hour: datetime, device_ids: List[str]) -> UpdateOne:
+        """Pipeline upsert adding ids to the hour's device set while it's under the cap"""
+        ids = {"$ifNull": ["$ids", []]}
+        return UpdateOne(
+            {"hour": hour, "dimension": DEVICE_SET, "value": ""},
+            [{"$set": {
+                "ids": {"$cond": [
+                    {"$lt": [{"$size": ids}, self.device_cap]},
+                    {"$slice": [{"$setUnion": [ids, {"$literal": device_ids}]}, self.device_cap]},
+                    ids,
+                ]},
+                "expires_at": {"$ifNull": ["$expires_at", hour + self.retention]},
+            }}],
+            upsert=True
+        )
+
+    async def flush(self):
+        if not self._pending and not self._devices:
+            return
+        pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+        devices, self._devices = self._devices, defaultdict(set)
+        operations = [
+            UpdateOne(
+                {"hour": hour, "dimension": dimension, "value": value},
+                self._update(hour, uploads, entries),
+                upsert=True
+            )
+            for (hour, dimension, value), (uploads, entries) in pending.items()
+        ]
+        operations.extend(self._add_devices(hour, sorted(ids)) for hour, ids in devices.items())
+        try:
+            await self.rollups.bulk_write(operations, ordered=False)
+            self.flushes += 1
+        except PyMongoError as e:
+            # Keep the deltas for the next flush rather than losing counts
+            for key, (uploads, entries) in pending.items():
+                counters = self._pending[key]
+                counters[0] += uploads
+                counters[1] += entries
+            for hour, ids in devices.items():
+                self._devices[hour] |= ids
+            self.errors += 1
+            logger.error(f"Log rollup flush of {len(operations)} counters failed: {e}")
+
+    # ----------------------------------------
+    # Full recomputation
+    # ----------------------------------------
+
+    async def rebuild(self):
+        """Recompute every rollup (and the totals) from log_uploads, replacing log_rollups"""
+        started = time.monotonic()
+        pairs = [
+            {"dimension": dimension, "value": "" if field is None else {"$toString": f"${field}"}, "entries": "$log_count"}
+            for dimension, field in DIMENSIONS.items()
+        ]
+        pipeline = [
+            {"$project": {
+                "hour": {"$dateTrunc": {"date": "$uploaded_at", "unit": "hour"}},
+                "counts": {"$concatArrays": [
+                    pairs,
+                    {"$map": {
+                        "input": {"$objectToArray": {"$ifNull": ["$level_counts", {}]}},
+                        "in": {"dimension": "level", "value": "$$this.k", "entries": "$$this.v"},
+                    }},
+                ]},
+            }},
+            {"$unwind": "$counts"},
+            {"$group": {
+                "_id": {"hour": "$hour", "dimension": "$counts.dimension", "value": "$counts.value"},
+                "uploads": {"$sum": 1},
+                "entries": {"$sum": "$counts.entries"},
+            }},
+            {"$project": {
+                "_id": 0,
+                "hour": "$_id.hour",
+                "dimension": "$_id.dimension",
+                "value": "$_id.value",
+                "uploads": 1,
+                "entries": 1,
+                "expires_at": {"$add": ["$_id.hour", int(self.retention.total_seconds() * 1000)]},
+            }},
+            {"$out": ROLLUPS},
+        ]
+        async for _ in self.db[UPLOADS].aggregate(pipeline):
+            pass
+        await self.ensure_indexes()
+
+        device_sets = [
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$uploaded_at", "unit": "hour"}},
+                "ids": {"$addToSet": {"$toString": "$device_id"}},
+            }},
+            {"$project": {
+                "_id": 0,
+                "hour": "$_id",
+                "dimension": DEVICE_SET,
+                "value": "",
+                "ids": {"$slice": ["$ids", self.device_cap]},
+                "expires_at": {"$add": ["$_id", int(self.retention.total_seconds() * 1000)]},
+            }},
+            {"$merge": {"into": ROLLUPS, "on": ["hour", "dimension", "value"], "whenMatched": "replace"}},
+        ]
+        async for _ in self.db[UPLOADS].aggregate(device_sets):
+            pass
+
+        totals = [
+            UpdateOne(
+                {"hour": TOTAL, "dimension": doc["_id"]["dimension"], "value": doc["_id"]["value"]},
+                {"$set": {"uploads": doc["uploads"], "entries": doc["entries"]}},
+                upsert=True
+            )
+            async for doc in self.rollups.aggregate([
+                {"$match": {"dimension": {"$in": list(TOTAL_DIMENSIONS)}}},
+                {"$group": {
+                    "_id": {"dimension": "$dimension", "value": "$value"},
+                    "uploads": {"$sum": "$uploads"},
+                    "entries": {"$sum": "$entries"},
+                }},
+            ])
+        ]
+        if totals:
+            await self.rollups.bulk_write(totals, ordered=False)
+        self.rebuilds += 1
+        self.last_rebuild_ms = round((time.monotonic() - started) * 1000, 1)
+
+    async def clear(self):
+        self._pending.clear()
+        self._devices.clear()
+        await self.rollups.delete_many({})
+
+    # ----------------------------------------
+    # Reading
+    # ----------------------------------------
+
+    async def summary(self, hours: int = 24, top: int = 10) -> Dict:
+        """
+        Counts over the last `hours` hours (at most `max_hours`), plus the
+        all-time upload/entry/level totals. `devices` is a lower bound when
+        `devices_capped`; `top_devices` ranks the `max_device_docs` heaviest
+        device-hours, so a device spread thinly over many hours may be missed
+        """
+        hours = max(1, min(hours, self.max_hours))
+        since = {"$gte": hour_of(datetime.utcnow() - timedelta(hours=hours - 1))}
+        pipeline = [
+            {"$match": {"hour": since, "dimension": {"$nin": ["device", DEVICE_SET]}}},
+            {"$group": {
+                "_id": {"dimension": "$dimension", "value": "$value"},
+                "uploads": {"$sum": "$uploads"},
+                "entries": {"$sum": "$entries"},
+            }},
+        ]
+
+        result = {
+            "uploads": 0,
+            "entries": 0,
+            "devices": 0,
+            "devices_capped": False,
+            "levels": {},
+            "app_versions": {},
+            "platforms": {},
+            "top_devices": [],
+            "totals": {"uploads": 0, "entries": 0, "levels": {}},
+        }
+        async for doc in self.rollups.find({"hour": TOTAL}):
+            if doc["dimension"] == "all":
+                result["totals"]["uploads"] = doc["uploads"]
+                result["totals"]["entries"] = doc["entries"]
+            elif doc["dimension"] == "level":
+                result["totals"]["levels"][doc["value"]] = doc["entries"]
+
+        async for doc in self.rollups.aggregate(pipeline):
+            dimension, value = doc["_id"]["dimension"], doc["_id"]["value"]
+            if dimension == "all":
+                result["uploads"] = doc["uploads"]
+                result["entries"] = doc["entries"]
+            elif dimension == "level":
+                result["levels"][value] = doc["entries"]
+            elif dimension == "app_version":
+                result["app_versions"][value] = doc["uploads"]
+            elif dimension == "platform":
+                result["platforms"][value] = doc["uploads"]
+
+        device_sets = {"hour": since, "dimension": DEVICE_SET}
+        async for doc in self.rollups.aggregate([
+            {"$match": device_sets},
+            {"$unwind": "$ids"},
+            {"$group": {"_id": "$ids"}},
+            {"$count": "devices"},
+        ]):
+            result["devices"] = doc["devices"]
+        capped = await self.rollups.find_one({**device_sets, f"ids.{self.device_cap - 1}": {"$exists": True}}, {"_id": 1})
+        result["devices_capped"] = capped is not None
+
+        async for doc in self.rollups.aggregate([
+            {"$match": {"dimension": "device", "hour": since}},
+            {"$sort": {"entries": -1}},
+            {"$limit": self.max_device_docs},
+            {"$group": {"_id": "$value", "uploads": {"$sum": "$uploads"}, "entries": {"$sum": "$entries"}}},
+            {"$sort": {"entries": -1}},
+            {"$limit": top},
+        ]):
+            result["top_devices"].append({"device_id": doc["_id"], "uploads": doc["uploads"], "entries": doc["entries"]})
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            "pending_counters": len(self._pending),
+            "pending_device_hours": len(self._devices),
+            "flushes": self.flushes,
+            "rebuilds": self.rebuilds,
+            "errors": self.errors,
+            "last_rebuild_ms": self.last_rebuild_ms,
+        }
@@ -0,0 +1,402 @@
+"""
+Log Store
+Device logs are stored one entry per document (log_entries) next to a
+small summary per upload (log_uploads), so level/device/version filters
+run in MongoDB on indexes instead of in Python over whole uploads
+"""
+
+import asyncio
+import base64
+import logging
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import orjson
+from pymongo import ASCENDING, DESCENDING, TEXT, UpdateOne
+from pymongo.errors import PyMongoError
+
+from compression import StreamCompressor
+
+logger = logging.getLogger(__name__)
+
+UPLOADS = "log_uploads"
+ENTRIES = "log_entries"
+
+# Fields of one log entry as clients upload it
+CLIENT_FIELDS = ("id", "timestamp", "level", "message", "context", "stack", "deviceInfo")
+# ...and as returned, with the error group fingerprint added on ingestion
+ENTRY_FIELDS = CLIENT_FIELDS + ("fingerprint",)
+
+# Upload fields copied onto every entry so entry queries need no join
+UPLOAD_FIELDS = ("device_id", "device_name", "platform", "app_version")
+
+# How GET /logs reports `total`
+COUNT_MODES = ("exact", "estimated", "none")
+# Filtered "estimated" counts stop here instead of scanning every match
+ESTIMATE_CAP = 10000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(moment: datetime, doc_id: str) -> str:
+    """Opaque keyset position after (moment, doc_id) in descending order"""
+    raw = f"{moment.isoformat()}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        uploaded_at, upload_id = raw.split("|", 1)
+        return datetime.fromisoformat(uploaded_at), upload_id
+    except ValueError as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def parse_timestamp(value, default: datetime) -> datetime:
+    """Client ISO-8601 timestamp as naive UTC (what Mongo hands back), else `default`"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return default
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def new_summary(upload: Dict, upload_id: Optional[str] = None, uploaded_at: Optional[datetime] = None) -> Dict:
+    """An empty log_uploads summary for an upload's device fields; add_entry() fills it"""
+    return {
+        "_id": upload_id or uuid.uuid4().hex,
+        "device_id": upload.get("device_id"),
+        "device_name": upload.get("device_name") or "Unknown",
+        "platform": upload.get("platform") or "unknown",
+        "app_version": upload.get("app_version") or "unknown",
+        "uploaded_at": uploaded_at or datetime.utcnow(),
+        "log_count": 0,
+        "level_counts": {},
+        # Multikey-indexed, so a level filter is answered from log_uploads alone
+        "levels": [],
+    }
+
+
+def add_entry(summary: Dict, log: Dict) -> Dict:
+    """
+    The log_entries document for the next entry of `summary`'s upload,
+    counted into the summary. Entry ids derive from the upload id and
+    position, so re-inserting the same upload is idempotent
+    """
+    seq = summary["log_count"]
+    entry = {field: log.get(field) for field in CLIENT_FIELDS}
+    entry.update({field: summary[field] for field in UPLOAD_FIELDS})
+    entry["_id"] = f"{summary['_id']}:{seq}"
+    entry["upload_id"] = summary["_id"]
+    entry["seq"] = seq
+    entry["timestamp"] = parse_timestamp(log.get("timestamp"), summary["uploaded_at"])
+    entry["uploaded_at"] = summary["uploaded_at"]
+
+    level = log.get("level") or "unknown"
+    summary["log_count"] = seq + 1
+    summary["level_counts"][level] = summary["level_counts"].get(level, 0) + 1
+    if level not in summary["levels"]:
+        summary["levels"] = sorted(summary["levels"] + [level])
+    return entry
+
+
+def split_upload(upload: Dict, upload_id: Optional[str] = None, uploaded_at: Optional[datetime] = None) -> Tuple[Dict, List[Dict]]:
+    """Turn an upload ({device_id, ..., logs: [...]}) into its summary and entry documents"""
+    summary = new_summary(upload, upload_id, uploaded_at)
+    entries = [add_entry(summary, log) for log in upload.get("logs") or []]
+    return summary, entries
+
+
+# Summary fields a streamed upload accumulates batch by batch
+_COUNTED_FIELDS = ("log_count", "level_counts", "levels", "expires_at")
+
+
+def summary_upsert(summary: Dict, entries: List[Dict]) -> UpdateOne:
+    """
+    Upsert counting one batch of a streamed upload into its summary, so a
+    stream cut short still has a summary for the entries already queued.
+    Batches commute: whichever is written first creates the summary
+    """
+    level_counts = Counter(entry.get("level") or "unknown" for entry in entries)
+    update = {
+        "$setOnInsert": {k: v for k, v in summary.items() if k != "_id" and k not in _COUNTED_FIELDS},
+        "$inc": {"log_count": len(entries), **{f"level_counts.{level}": n for level, n in level_counts.items()}},
+        "$addToSet": {"levels": {"$each": sorted(level_counts)}},
+    }
+    if not level_counts:
+        update["$setOnInsert"]["level_counts"] = {}
+    if "expires_at" in summary:
+        update["$max"] = {"expires_at": summary["expires_at"]}
+    return UpdateOne({"_id": summary["_id"]}, update, upsert=True)
+
+
+_OPTIONAL_TEXT = ("context", "stack")
+
+
+def validate_entry(log) -> Optional[str]:
+    """
+    Cheap structural check of one decoded NDJSON entry (what LogEntryModel
+    enforces for /logs/upload); returns the problem, or None if valid
+    """
+    if not isinstance(log, dict):
+        return "entry is not an object"
+    for field in ("id", "timestamp", "level", "message"):
+        if not isinstance(log.get(field), str):
+            return f"{field} must be a string"
+    for field in _OPTIONAL_TEXT:
+        if log.get(field) is not None and not isinstance(log[field], str):
+            return f"{field} must be a string or null"
+    if log.get("deviceInfo") is not None and not isinstance(log["deviceInfo"], dict):
+        return "deviceInfo must be an object or null"
+    return None
+
+
+def entry_to_api(doc: Dict, fields: Tuple[str, ...] = ENTRY_FIELDS) -> Dict:
+    """A stored entry in the shape clients uploaded it in, limited to `fields`"""
+    entry = {field: doc.get(field) for field in fields}
+    if isinstance(entry.get("timestamp"), datetime):
+        entry["timestamp"] = entry["timestamp"].isoformat() + "Z"
+    return entry
+
+
+def located_entry(doc: Dict) -> Dict:
+    """An entry plus the upload (device, version, time) it came from"""
+    uploaded_at = doc.get("uploaded_at")
+    return {
+        **entry_to_api(doc),
+        **{field: doc.get(field) for field in UPLOAD_FIELDS},
+        "upload_id": doc.get("upload_id"),
+        "uploaded_at": uploaded_at.isoformat() if isinstance(uploaded_at, datetime) else uploaded_at,
+    }
+
+
+def upload_to_api(summary: Dict, logs: List[Dict], log_count: int) -> Dict:
+    """
+    An upload summary plus (some of) its entries, in the /logs response
+    shape; `log_count` is the number of matching entries, which may be
+    more than were returned
+    """
+    uploaded_at = summary.get("uploaded_at")
+    return {
+        "upload_id": summary.get("_id"),
+        "device_id": summary.get("device_id"),
+        "device_name": summary.get("device_name"),
+        "platform": summary.get("platform"),
+        "app_version": summary.get("app_version"),
+        "uploaded_at": uploaded_at.isoformat() if isinstance(uploaded_at, datetime) else uploaded_at,
+        "log_count": log_count,
+        "logs": logs,
+        "truncated": len(logs) < log_count,
+    }
+
+
+async def gzip_ndjson(rows: AsyncIterator[Dict], chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Rows as one gzip stream of NDJSON, compressed `chunk_size` bytes of lines at a time"""
+    compressor = StreamCompressor("gzip")
+    buffer = bytearray()
+    async for row in rows:
+        buffer += orjson.dumps(row)
+        buffer += b"\n"
+        if len(buffer) >= chunk_size:
+            chunk = compressor.compress(bytes(buffer))
+            buffer.clear()
+            if chunk:
+                yield chunk
+    yield compressor.compress(bytes(buffer)) + compressor.finish()
+
+
+class LogStore:
+    """Queries over log_uploads/log_entries"""
+
+    def __init__(self, db):
+        self.uploads = db[UPLOADS]
+        self.entries = db[ENTRIES]
+
+    async def ensure_indexes(self):
+        try:
+            await self.entries.create_index([("device_id", ASCENDING), ("timestamp", DESCENDING)])
+            await self.entries.create_index([("level", ASCENDING), ("timestamp", DESCENDING)])
+            await self.entries.create_index([("app_version", ASCENDING)])
+            await self.entries.create_index([("timestamp", ASCENDING)])
+            await self.entries.create_index([("upload_id", ASCENDING), ("seq", ASCENDING)])
+            await self.entries.create_index([("fingerprint", ASCENDING), ("timestamp", DESCENDING)], sparse=True)
+            await self.entries.create_index(
+                [("message", TEXT), ("context", TEXT), ("stack", TEXT)],
+                weights={"message": 10, "context": 5, "stack": 1},
+                default_language="none",
+                name="log_entries_text"
+            )
+            # Keyset pages walk these in (uploaded_at, _id) descending order
+            await self.uploads.create_index([("uploaded_at", DESCENDING), ("_id", DESCENDING)])
+            await self.uploads.create_index([("device_id", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)])
+            await self.uploads.create_index([("levels", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)])
+        except PyMongoError as e:
+            logger.error(f"Log store index error: {e}")
+
+    async def _entries_for(self, upload_id: str, level: Optional[str], limit: int, fields: Tuple[str, ...]) -> List[Dict]:
+        query = {"upload_id": upload_id}
+        if level:
+            query["level"] = level
+        projection = {field: 1 for field in fields}
+        projection["_id"] = 0
+        docs = await self.entries.find(query, projection).sort("seq", 1).to_list(limit)
+        return [entry_to_api(doc, fields) for doc in docs]
+
+    async def _count(self, query: Dict, mode: str) -> Tuple[Optional[int], bool]:
+        """(total, capped) for a page query; "estimated" uses collection metadata or a capped count"""
+        if mode == "none":
+            return None, False
+        if mode == "exact":
+            return await self.uploads.count_documents(query), False
+        if not query:
+            return await self.uploads.estimated_document_count(), False
+        total = await self.uploads.count_documents(query, limit=ESTIMATE_CAP)
+        return total, total >= ESTIMATE_CAP
+
+    async def page_uploads(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        device_id: Optional[str] = None,
+        level: Optional[str] = None,
+        entries_per_upload: int = 100,
+        fields: Tuple[str, ...] = ENTRY_FIELDS,
+        count: str = "exact"
+    ) -> Dict:
+        """
+        One keyset page of uploads, newest first. With `level`, only uploads
+        containing that level and only those entries. Each upload carries
+        at most `entries_per_upload` entries, projected to `fields`
+        """
+        query: Dict = {}
+        if device_id:
+            query["device_id"] = device_id
+        if level:
+            query["levels"] = level
+
+        page_query = dict(query)
+        if cursor:
+            uploaded_at, upload_id = decode_cursor(cursor)
+            page_query["$or"] = [
+                {"uploaded_at": {"$lt": uploaded_at}},
+                {"uploaded_at": uploaded_at, "_id": {"$lt": upload_id}},
+            ]
+
+        summaries = await self.uploads.find(page_query).sort(
+            [("uploaded_at", -1), ("_id", -1)]
+        ).to_list(limit + 1)
+        has_more = len(summaries) > limit
+        summaries = summaries[:limit]
+
+        if entries_per_upload > 0 and fields:
+            entry_lists = await asyncio.gather(*(
+                self._entries_for(summary["_id"], level, entries_per_upload, fields)
+                for summary in summaries
+            ))
+        else:
+            entry_lists = [[] for _ in summaries]
+
+        uploads = []
+        for summary, logs in zip(summaries, entry_lists):
+            if level:
+                log_count = summary.get("level_counts", {}).get(level, len(logs))
+            else:
+                log_count = summary.get("log_count", len(logs))
+            uploads.append(upload_to_api(summary, logs, log_count))
+
+        total, capped = await self._count(query, count)
+        return {
+            "total": total,
+            "total_capped": capped,
+            "uploads": uploads,
+            "next_cursor": encode_cursor(summaries[-1]["uploaded_at"], summaries[-1]["_id"]) if has_more else None,
+        }
+
+    @staticmethod
+    def _entry_filter(
+        level: Optional[str],
+        device_id: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime]
+    ) -> Dict:
+        query: Dict = {}
+        if level:
+            query["level"] = level
+        if device_id:
+            query["device_id"] = device_id
+        if since or until:
+            query["timestamp"] = {}
+            if since:
+                query["timestamp"]["$gte"] = since
+            if until:
+                query["timestamp"]["$lt"] = until
+        return query
+
+    async def export(
+        self,
+        level: Optional[str] = None,
+        device_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Dict]:
+        """Every matching entry, oldest first, read from the cursor batch by batch"""
+        query = self._entry_filter(level, device_id, since, until)
+        cursor = self.entries.find(query).sort("timestamp", 1).batch_size(batch_size)
+        async for doc in cursor:
+            yield located_entry(doc)
+
+    async def search(
+        self,
+        text: str,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        level: Optional[str] = None,
+        device_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Entries matching `text` (MongoDB text search over message, context
+        and stack), newest first, keyset-paged on (timestamp, _id)
+        """
+        query = self._entry_filter(level, device_id, since, until)
+        query["$text"] = {"$search": text}
+        if cursor:
+            timestamp, entry_id = decode_cursor(cursor)
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": entry_id}},
+            ]
+
+        docs = await self.entries.find(query, {"score": {"$meta": "textScore"}}).sort(
+            [("timestamp", -1), ("_id", -1)]
+        ).to_list(limit + 1)
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+
+        return {
+            "results": [{**located_entry(doc), "score": round(doc.get("score", 0.0), 3)} for doc in docs],
+            "next_cursor": encode_cursor(docs[-1]["timestamp"], docs[-1]["_id"]) if has_more else None,
+        }
+
+    async def occurrences(self, fingerprint: str, limit: int = 20) -> List[Dict]:
+        """Most recent entries of an error group, with the device/version they came from"""
+        docs = await self.entries.find({"fingerprint": fingerprint}).sort("timestamp", -1).to_list(limit)
+        return [located_entry(doc) for doc in docs]
+
+    async def clear(self) -> int:
+        """Delete every upload and entry; returns the number of uploads removed"""
+        result = await self.uploads.delete_many({})
+        await self.entries.delete_many({})
+        return result.deleted_count
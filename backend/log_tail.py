@@ -0,0 +1,162 @@
+"""
+Live Log Tail
+Fans newly ingested log entries out to Server-Sent Events subscribers,
+filtered by level/device on the server, so a dashboard watching for new
+errors doesn't re-run the full /logs query.
+
+Entries are published by the ingestion path of this worker. With several
+workers, LOG_TAIL_CHANGE_STREAM=true feeds every worker from a MongoDB
+change stream on log_entries instead (needs a replica set); entries then
+appear once written, i.e. up to one flush interval later
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import orjson
+from pymongo.errors import PyMongoError
+
+from log_store import ENTRIES, located_entry
+
+logger = logging.getLogger(__name__)
+
+
+class _Subscriber:
+    def __init__(self, level: Optional[str], device_id: Optional[str], queue_size: int):
+        self.level = level
+        self.device_id = device_id
+        self.queue: "asyncio.Queue[Dict]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def matches(self, entry: Dict) -> bool:
+        return (self.level is None or entry.get("level") == self.level) and \
+            (self.device_id is None or entry.get("device_id") == self.device_id)
+
+
+class LogTailBroker:
+    """
+    In-memory pub/sub of log entries. Each subscriber has a bounded queue;
+    a subscriber that can't keep up loses its oldest pending entries (and
+    is told how many) rather than slowing ingestion down
+    """
+
+    def __init__(
+        self,
+        db,
+        queue_size: int = 500,
+        max_subscribers: int = 100,
+        heartbeat: float = 15.0,
+        use_change_stream: bool = False
+    ):
+        self.entries = db[ENTRIES]
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.use_change_stream = use_change_stream
+        self._subscribers: Set[_Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls, db) -> "LogTailBroker":
+        return cls(
+            db,
+            max_subscribers=int(os.environ.get("LOG_TAIL_MAX_SUBSCRIBERS", "100")),
+            use_change_stream=os.environ.get("LOG_TAIL_CHANGE_STREAM", "false").lower() == "true",
+        )
+
+    def start(self):
+        if self.use_change_stream and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _watch(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.entries.watch(pipeline) as stream:
+                    async for change in stream:
+                        self._fan_out([change["fullDocument"]])
+            except PyMongoError as e:
+                logger.error(f"Log tail change stream error: {e}")
+                await asyncio.sleep(5)
+
+    # ----------------------------------------
+    # Publishing
+    # ----------------------------------------
+
+    def publish(self, entries: List[Dict]):
+        """Entries accepted by this worker's ingestion path"""
+        if not self.use_change_stream:
+            self._fan_out(entries)
+
+    def _fan_out(self, entries: List[Dict]):
+        if not self._subscribers:
+            return
+        for entry in entries:
+            self.published += 1
+            event = None
+            for subscriber in self._subscribers:
+                if not subscriber.matches(entry):
+                    continue
+                if event is None:
+                    event = located_entry(entry)
+                if subscriber.queue.full():
+                    subscriber.queue.get_nowait()
+                    subscriber.dropped += 1
+                    self.dropped += 1
+                subscriber.queue.put_nowait(event)
+
+    # ----------------------------------------
+    # Subscribing
+    # ----------------------------------------
+
+    def subscribe(self, level: Optional[str] = None, device_id: Optional[str] = None) -> Optional[_Subscriber]:
+        """A new subscriber, or None when the subscriber limit is reached"""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        subscriber = _Subscriber(level, device_id, self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    async def events(self, subscriber: _Subscriber) -> AsyncIterator[bytes]:
+        """SSE stream for `subscriber`: `log` events, `dropped` notices and heartbeats"""
+        try:
+            yield b"retry: 5000\n\n"
+            reported_drops = 0
+            while True:
+                try:
+                    entry = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield b": ping\n\n"
+                    continue
+                if subscriber.dropped > reported_drops:
+                    yield b"event: dropped\ndata: " + orjson.dumps({"count": subscriber.dropped - reported_drops}) + b"\n\n"
+                    reported_drops = subscriber.dropped
+                self.delivered += 1
+                yield b"event: log\ndata: " + orjson.dumps(entry) + b"\n\n"
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "change_stream": self.use_change_stream,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,335 @@
+"""
+Speculative Prefetch
+Background work done on a user's behalf before they ask for it:
+- once an episode's stream resolves, search the next episode and keep its
+  best cached candidate so the next play press skips search
+- right after a cache search, resolve the direct link of the top cached
+  result(s) so pressing play on the likely choice is instant
+Everything runs at background RD priority, within a per-token budget, and
+is opt-in
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from debrid_cache_search import RealDebridCacheSearch
+from rate_limit import BucketRegistry
+from realdebrid_scheduler import PRIORITY_BACKGROUND, token_label
+
+logger = logging.getLogger(__name__)
+
+
+class _TTLCache:
+    """Small thread-safe LRU with per-entry expiry"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class NextEpisodePrefetcher:
+    """
+    After episode N of a show plays, finds the best cached stream for N+1
+
+    Each RD token gets `per_token_per_hour` prefetches (burst `per_token_burst`);
+    at most `concurrency` prefetches run at once on this worker. Results are
+    kept per (token, imdb_id, season, episode) for `ttl` seconds
+    """
+
+    def __init__(
+        self,
+        per_token_per_hour: float = 20,
+        per_token_burst: float = 3,
+        concurrency: int = 2,
+        ttl: float = 3600,
+        enabled: bool = True
+    ):
+        self.enabled = enabled
+        self.budgets = BucketRegistry(capacity=per_token_burst, rate=per_token_per_hour / 3600.0)
+        self.candidates = _TTLCache(ttl=ttl, max_entries=5000)
+        self._concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Set[tuple] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.scheduled = 0
+        self.completed = 0
+        self.no_candidate = 0
+        self.skipped_budget = 0
+        self.skipped_duplicate = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "NextEpisodePrefetcher":
+        return cls(
+            per_token_per_hour=float(os.environ.get("PREFETCH_PER_TOKEN_PER_HOUR", "20")),
+            concurrency=int(os.environ.get("PREFETCH_CONCURRENCY", "2")),
+            enabled=os.environ.get("PREFETCH_ENABLED", "true").lower() == "true",
+        )
+
+    @staticmethod
+    def _key(token: str, imdb_id: str, season: int, episode: int) -> tuple:
+        return (token_label(token), imdb_id, season, episode)
+
+    def schedule(self, token: str, imdb_id: str, season: int, episode: int, title: Optional[str] = None) -> bool:
+        """Queue a background prefetch of S{season}E{episode + 1}; False if skipped"""
+        if not self.enabled:
+            return False
+        key = self._key(token, imdb_id, season, episode + 1)
+        if key in self._inflight or self.candidates.get(key) is not None:
+            self.skipped_duplicate += 1
+            return False
+        if not self.budgets.get(key[0]).try_acquire():
+            self.skipped_budget += 1
+            return False
+
+        self._inflight.add(key)
+        self.scheduled += 1
+        task = asyncio.create_task(self._prefetch(key, token, imdb_id, season, episode + 1, title))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _prefetch(self, key: tuple, token: str, imdb_id: str, season: int, episode: int, title: Optional[str]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        try:
+            async with self._semaphore:
+                results = await run_in_threadpool(
+                    RealDebridCacheSearch.search_cached_torrents,
+                    query=title or imdb_id,
+                    token=token,
+                    content_type="tv",
+                    season=season,
+                    episode=episode,
+                    imdb_id=imdb_id,
+                    priority=PRIORITY_BACKGROUND
+                )
+            best = next((r for r in results if r.get('cached')), None)
+            if best:
+                self.candidates.put(key, best)
+                self.completed += 1
+                logger.info(f"Prefetched {imdb_id} S{season:02d}E{episode:02d}: {best.get('quality')}")
+            else:
+                self.no_candidate += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Next-episode prefetch error for {imdb_id} S{season:02d}E{episode:02d}: {e}")
+        finally:
+            self._inflight.discard(key)
+
+    def lookup(self, token: str, imdb_id: str, season: int, episode: int) -> Optional[Dict]:
+        """The prefetched best cached candidate for this episode, if any"""
+        candidate = self.candidates.get(self._key(token, imdb_id, season, episode))
+        if candidate is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return candidate
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "scheduled": self.scheduled,
+            "running": len(self._inflight),
+            "completed": self.completed,
+            "no_candidate": self.no_candidate,
+            "skipped_budget": self.skipped_budget,
+            "skipped_duplicate": self.skipped_duplicate,
+            "errors": self.errors,
+            "cached_candidates": len(self.candidates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class StreamLinkPreresolver:
+    """
+    Per-token cache of resolved RD stream links, filled ahead of play
+
+    Pre-resolving adds the torrent to the user's RD account and spends RD
+    requests, so each token gets `per_token_per_hour` pre-resolutions
+    (burst `per_token_burst`) and at most `max_top` results per search.
+    Links resolved on demand are cached too, so a replay is instant
+    """
+
+    def __init__(
+        self,
+        per_token_per_hour: float = 30,
+        per_token_burst: float = 3,
+        max_top: int = 3,
+        concurrency: int = 2,
+        ttl: float = 1800,
+        enabled: bool = True
+    ):
+        self.enabled = enabled
+        self.max_top = max_top
+        self.budgets = BucketRegistry(capacity=per_token_burst, rate=per_token_per_hour / 3600.0)
+        self.links = _TTLCache(ttl=ttl, max_entries=10000)
+        self._concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Set[tuple] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.scheduled = 0
+        self.resolved = 0
+        self.failed = 0
+        self.skipped_budget = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "StreamLinkPreresolver":
+        return cls(
+            per_token_per_hour=float(os.environ.get("PRERESOLVE_PER_TOKEN_PER_HOUR", "30")),
+            max_top=int(os.environ.get("PRERESOLVE_MAX_TOP", "3")),
+            enabled=os.environ.get("PRERESOLVE_ENABLED", "true").lower() == "true",
+        )
+
+    @staticmethod
+    def _key(
+        token: str,
+        info_hash: str,
+        file_id: Optional[str],
+        season: Optional[int] = None,
+        episode: Optional[int] = None
+    ) -> tuple:
+        # A file id pins the file; without one the episode decides it
+        if file_id:
+            return (token_label(token), info_hash.lower(), str(file_id))
+        return (token_label(token), info_hash.lower(), None, season, episode)
+
+    def schedule(
+        self,
+        token: str,
+        results: List[Dict],
+        top: int = 1,
+        season: Optional[int] = None,
+        episode: Optional[int] = None
+    ) -> int:
+        """Resolve the first `top` cached results in the background; returns how many were queued"""
+        if not self.enabled or not token:
+            return 0
+        queued = 0
+        for result in [r for r in results if r.get('cached')][:min(top, self.max_top)]:
+            key = self._key(token, result['hash'], result.get('file_id'), season, episode)
+            if key in self._inflight or self.links.get(key) is not None:
+                continue
+            if not self.budgets.get(key[0]).try_acquire():
+                self.skipped_budget += 1
+                break
+            self._inflight.add(key)
+            self.scheduled += 1
+            queued += 1
+            task = asyncio.create_task(self._resolve(key, token, result, season, episode))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return queued
+
+    async def _resolve(self, key: tuple, token: str, result: Dict, season: Optional[int], episode: Optional[int]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        try:
+            async with self._semaphore:
+                url = await run_in_threadpool(
+                    RealDebridCacheSearch.add_and_get_stream_link,
+                    info_hash=result['hash'],
+                    token=token,
+                    file_id=result.get('file_id'),
+                    season=season,
+                    episode=episode,
+                    priority=PRIORITY_BACKGROUND
+                )
+            if url:
+                self.links.put(key, url)
+                self.resolved += 1
+            else:
+                self.failed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Stream link pre-resolve error for {result.get('hash')}: {e}")
+        finally:
+            self._inflight.discard(key)
+
+    def lookup(
+        self,
+        token: str,
+        info_hash: str,
+        file_id: Optional[str],
+        season: Optional[int] = None,
+        episode: Optional[int] = None
+    ) -> Optional[str]:
+        url = self.links.get(self._key(token, info_hash, file_id, season, episode))
+        if url is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return url
+
+    def store(
+        self,
+        token: str,
+        info_hash: str,
+        file_id: Optional[str],
+        url: str,
+        season: Optional[int] = None,
+        episode: Optional[int] = None
+    ):
+        self.links.put(self._key(token, info_hash, file_id, season, episode), url)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "scheduled": self.scheduled,
+            "running": len(self._inflight),
+            "resolved": self.resolved,
+            "failed": self.failed,
+            "skipped_budget": self.skipped_budget,
+            "cached_links": len(self.links),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
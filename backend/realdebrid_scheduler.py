@@ -0,0 +1,238 @@
+"""
+Real-Debrid Request Scheduler
+Real-Debrid rate-limits per API token. Every RD call goes through one
+scheduler that keeps a token bucket per RD token, serves waiting calls in
+priority order (play before browse before background) and backs the
+token off for Retry-After seconds when RD answers 429
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_PLAY = 0
+PRIORITY_BROWSE = 1
+PRIORITY_BACKGROUND = 2
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call couldn't get a slot within its max wait"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After in seconds (delta-seconds form; HTTP dates fall back to None)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def token_label(token: str) -> str:
+    """Stable non-reversible label for a token, safe to expose in metrics"""
+    return hashlib.sha256(token.encode()).hexdigest()[:10]
+
+
+class _TokenState:
+    def __init__(self, capacity: float, rate: float):
+        self.bucket = TokenBucket(capacity, rate)
+        self.blocked_until = 0.0
+        self.waiters: List[Tuple[int, int]] = []
+        self.granted = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.last_used = time.monotonic()
+
+
+class RealDebridScheduler:
+    """
+    Per-token token buckets with a priority queue of waiters
+
+    Only the highest-priority (then oldest) waiter for a token may take
+    that token's next slot, so a burst of browse calls can't starve a
+    play request queued behind them
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 200,
+        burst: float = 10,
+        max_wait: float = 30,
+        max_retries: int = 2
+    ):
+        self.capacity = burst
+        self.rate = requests_per_minute / 60.0
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self._states: Dict[str, _TokenState] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def configure_from_env(self):
+        """Apply RD_* settings (call once .env has been loaded)"""
+        self.capacity = float(os.environ.get("RD_BURST", self.capacity))
+        self.rate = float(os.environ.get("RD_REQUESTS_PER_MINUTE", self.rate * 60.0)) / 60.0
+        self.max_wait = float(os.environ.get("RD_MAX_WAIT", self.max_wait))
+
+    def _state(self, token: str) -> _TokenState:
+        state = self._states.get(token)
+        if state is None:
+            state = _TokenState(self.capacity, self.rate)
+            self._states[token] = state
+        state.last_used = time.monotonic()
+        return state
+
+    def _enqueue(self, token: str, priority: int) -> Tuple[_TokenState, Tuple[int, int]]:
+        with self._cond:
+            state = self._state(token)
+            ticket = (priority, next(self._seq))
+            heapq.heappush(state.waiters, ticket)
+            return state, ticket
+
+    def _try_take(self, state: _TokenState, ticket: Tuple[int, int]) -> Tuple[bool, float]:
+        """Attempt to grant `ticket`; returns (granted, seconds to wait otherwise)"""
+        with self._cond:
+            if state.waiters[0] != ticket:
+                return False, 0.05
+            now = time.monotonic()
+            if now < state.blocked_until:
+                return False, state.blocked_until - now
+            if state.bucket.try_acquire():
+                heapq.heappop(state.waiters)
+                state.granted += 1
+                self._cond.notify_all()
+                return True, 0.0
+            return False, state.bucket.wait_time()
+
+    def _abandon(self, state: _TokenState, ticket: Tuple[int, int], timed_out: bool = True):
+        """Drop a waiting ticket, so it can't hold the head of the queue"""
+        with self._cond:
+            if ticket not in state.waiters:
+                return
+            state.waiters.remove(ticket)
+            heapq.heapify(state.waiters)
+            if timed_out:
+                state.timeouts += 1
+            self._cond.notify_all()
+
+    def acquire(self, token: str, priority: int = PRIORITY_BROWSE, timeout: Optional[float] = None) -> bool:
+        """Block the calling thread until this token may make one RD call"""
+        timeout = self.max_wait if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        state, ticket = self._enqueue(token, priority)
+        try:
+            while True:
+                granted, wait = self._try_take(state, ticket)
+                if granted:
+                    state.wait_seconds += time.monotonic() - started
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._abandon(state, ticket)
+                    return False
+                with self._cond:
+                    self._cond.wait(timeout=min(wait, remaining, 1.0))
+        except BaseException:
+            self._abandon(state, ticket, timed_out=False)
+            raise
+
+    async def acquire_async(self, token: str, priority: int = PRIORITY_BROWSE, timeout: Optional[float] = None) -> bool:
+        """Event-loop friendly variant of acquire() for the httpx routes"""
+        timeout = self.max_wait if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        state, ticket = self._enqueue(token, priority)
+        try:
+            while True:
+                granted, wait = self._try_take(state, ticket)
+                if granted:
+                    state.wait_seconds += time.monotonic() - started
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._abandon(state, ticket)
+                    return False
+                await asyncio.sleep(min(wait, remaining, 0.25))
+        except BaseException:
+            # Cancelled (client went away) while queued: a ticket left at the
+            # head would block every later caller on this token
+            self._abandon(state, ticket, timed_out=False)
+            raise
+
+    def note_retry_after(self, token: str, retry_after: Optional[float], attempt: int = 0):
+        """Pause a token after a 429, for Retry-After or an exponential fallback"""
+        delay = retry_after if retry_after is not None else min(2 ** attempt, 30)
+        with self._cond:
+            state = self._state(token)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+            state.throttled += 1
+            self._cond.notify_all()
+        logger.warning(f"Real-Debrid 429 for token {token_label(token)}, backing off {delay:.1f}s")
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        token: str,
+        priority: int = PRIORITY_BROWSE,
+        **kwargs
+    ) -> requests.Response:
+        """
+        Scheduled requests.request() with the token's Authorization header
+        429 responses are retried after Retry-After, up to max_retries
+        """
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["Authorization"] = f"Bearer {token}"
+
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if not self.acquire(token, priority):
+                raise RateLimitTimeout(f"No Real-Debrid slot within {self.max_wait}s")
+            response = requests.request(method, url, headers=headers, **kwargs)
+            if response.status_code != 429:
+                return response
+            self.note_retry_after(token, parse_retry_after(response.headers.get("Retry-After")), attempt)
+        return response
+
+    def prune(self, idle_seconds: float = 3600):
+        """Forget tokens that have been idle for a while"""
+        cutoff = time.monotonic() - idle_seconds
+        with self._cond:
+            for token in [t for t, s in self._states.items() if s.last_used < cutoff and not s.waiters]:
+                del self._states[token]
+
+    def stats(self) -> Dict:
+        self.prune()
+        with self._cond:
+            return {
+                token_label(token): {
+                    "queued": len(state.waiters),
+                    "granted": state.granted,
+                    "throttled_429": state.throttled,
+                    "timeouts": state.timeouts,
+                    "avg_wait_ms": round(state.wait_seconds / state.granted * 1000, 1) if state.granted else 0.0,
+                    "available": round(state.bucket.available, 2),
+                    "backoff_seconds": round(max(0.0, state.blocked_until - time.monotonic()), 1),
+                }
+                for token, state in self._states.items()
+            }
+
+
+# Shared by RealDebridIntegration, RealDebridCacheSearch and the RD routes
+rd_scheduler = RealDebridScheduler()
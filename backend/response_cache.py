@@ -0,0 +1,204 @@
+"""
+Response Cache
+In-process TTL cache for rendered API responses. Each entry keeps the raw
+body plus every encoding it has been served in, so a hot entry is
+compressed at most once per encoding no matter how often it's hit.
+Entries carry an ETag/Last-Modified pair, so conditional GETs are
+answered with 304 straight from the cache
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from compression import MINIMUM_SIZE, compress_bytes, decompress_bytes, negotiate_encoding
+from fast_response import wants_msgpack
+
+logger = logging.getLogger(__name__)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class CachedResponse:
+    """A rendered response body with its precompressed variants"""
+
+    def __init__(self, body: bytes, media_type: str, ttl: float, payload: Any = None):
+        self.body = body
+        self.media_type = media_type
+        # What the body was rendered from, for work a hit still triggers
+        self.payload = payload
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
+        # Weak: the same entity is served under several content-codings
+        self.etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.last_modified = formatdate(self.created_at, usegmt=True)
+        self._encoded: Dict[str, bytes] = {}
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def encoded(self, encoding: str) -> bytes:
+        """Body in the given coding, compressed on first use only"""
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = compress_bytes(self.body, encoding)
+            self._encoded[encoding] = data
+        return data
+
+    def seed_encoded(self, encoding: str, data: bytes):
+        """Register a variant that arrived already compressed"""
+        self._encoded[encoding] = data
+
+    def not_modified(self, request: Request) -> bool:
+        """Evaluate If-None-Match, falling back to If-Modified-Since"""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, self.etag)
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.created_at) <= since
+        return False
+
+    def to_response(self, request: Request) -> Response:
+        """Serve the entry in the best coding the client accepts, or a 304"""
+        headers = {
+            "Vary": "Accept, Accept-Encoding",
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+        }
+
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+
+        body = self.body
+        encoding = None
+        if len(self.body) >= MINIMUM_SIZE:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding:
+            body = self.encoded(encoding)
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of rendered responses keyed by request
+    Keys include the path, sorted query string and the negotiated
+    representation (JSON or msgpack), since those produce different bodies
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def key_for(request: Request) -> str:
+        representation = "msgpack" if wants_msgpack(request) else "json"
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        return f"{representation}:{request.url.path}?{query}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expired:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, body: bytes, media_type: str, ttl: float, payload: Any = None) -> CachedResponse:
+        entry = CachedResponse(body, media_type, ttl, payload)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def lookup(self, request: Request, on_hit: Optional[Callable[[Any], None]] = None) -> Optional[Response]:
+        """
+        Return a ready response (200 or 304) for this request if one is
+        cached; `on_hit` is called with the entry's stored payload, if any
+        """
+        entry = self.get(self.key_for(request))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if on_hit is not None and entry.payload is not None:
+            on_hit(entry.payload)
+        response = entry.to_response(request)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def store(self, request: Request, response: Response, ttl: float, payload: Any = None) -> Response:
+        """Cache a freshly rendered response (and what it was rendered from) and serve it from the new entry"""
+        if response.status_code != 200:
+            return response
+        entry = self.put(self.key_for(request), response.body, response.media_type, ttl, payload)
+        return entry.to_response(request)
+
+    def store_body(self, request: Request, body: bytes, media_type: str, ttl: float) -> Response:
+        """Cache raw upstream bytes as-is (no parse/re-encode) and serve them"""
+        entry = self.put(self.key_for(request), body, media_type, ttl)
+        return entry.to_response(request)
+
+    def capture(self, request: Request, ttl: float) -> Callable[[bytes, str, str], None]:
+        """
+        Sink for a streamed passthrough body
+        Called once the stream completes with the bytes as sent upstream,
+        their content-coding and media type
+        """
+        key = self.key_for(request)
+
+        def sink(data: bytes, encoding: str, media_type: str):
+            try:
+                if encoding == "identity":
+                    self.put(key, data, media_type, ttl)
+                else:
+                    entry = self.put(key, decompress_bytes(data, encoding), media_type, ttl)
+                    entry.seed_encoded(encoding, data)
+            except Exception as e:
+                logger.error(f"Response cache capture error: {e}")
+
+        return sink
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,105 @@
+"""
+Migrate device logs from error_logs (one document per upload, entries in
+an embedded array) to log_uploads + log_entries (one document per entry)
+
+Each legacy upload keeps its ObjectId (as a string) as its upload id and
+entry ids derive from it, so the migration can be re-run or resumed
+safely; already-migrated documents are skipped as duplicates.
+
+Run from backend/:  python scripts/migrate_logs.py [--batch-size 500] [--drop-source]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from log_rollups import ROLLUPS  # noqa: E402
+from log_store import ENTRIES, UPLOADS, parse_timestamp, split_upload  # noqa: E402
+
+SOURCE = "error_logs"
+
+
+def insert_ignoring_duplicates(collection, docs) -> int:
+    """Unordered insert; documents that already exist don't count as errors"""
+    if not docs:
+        return 0
+    try:
+        return len(collection.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        other = [err for err in errors if err.get("code") != 11000]
+        if other:
+            raise
+        return e.details.get("nInserted", 0)
+
+
+def legacy_uploaded_at(legacy) -> datetime:
+    """uploaded_at was stored as an ISO string; fall back to the ObjectId time"""
+    fallback = getattr(legacy["_id"], "generation_time", None)
+    fallback = fallback.replace(tzinfo=None) if fallback else datetime.utcnow()
+    return parse_timestamp(legacy.get("uploaded_at"), fallback)
+
+
+def migrate(db, batch_size: int) -> dict:
+    counts = {"uploads_seen": 0, "uploads_inserted": 0, "entries_inserted": 0}
+    uploads, entries = [], []
+
+    def write():
+        counts["uploads_inserted"] += insert_ignoring_duplicates(db[UPLOADS], uploads)
+        counts["entries_inserted"] += insert_ignoring_duplicates(db[ENTRIES], entries)
+        uploads.clear()
+        entries.clear()
+
+    for legacy in db[SOURCE].find({}, batch_size=batch_size):
+        summary, upload_entries = split_upload(legacy, upload_id=str(legacy["_id"]), uploaded_at=legacy_uploaded_at(legacy))
+        uploads.append(summary)
+        entries.extend(upload_entries)
+        counts["uploads_seen"] += 1
+        if len(uploads) >= batch_size:
+            write()
+            print(f"  {counts['uploads_seen']} uploads processed", flush=True)
+    write()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500, help="legacy uploads per insert batch")
+    parser.add_argument("--drop-source", action="store_true", help=f"drop {SOURCE} once every upload is migrated")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+    client = MongoClient(os.environ["MONGO_URL"])
+    db = client[os.environ["DB_NAME"]]
+    try:
+        counts = migrate(db, args.batch_size)
+        print(
+            f"Migrated {counts['uploads_seen']} uploads "
+            f"({counts['uploads_inserted']} new uploads, {counts['entries_inserted']} new entries)"
+        )
+        if counts["uploads_inserted"]:
+            # The server rebuilds missing rollups from log_uploads on startup
+            db[ROLLUPS].drop()
+            print(f"Dropped {ROLLUPS}; restart the server to rebuild log statistics")
+        if args.drop_source:
+            # Uploads that arrived in the old collection mid-run would be lost
+            remaining = db[SOURCE].count_documents({})
+            if remaining != counts["uploads_seen"]:
+                print(f"Not dropping {SOURCE}: it changed during migration, re-run first")
+            else:
+                db[SOURCE].drop()
+                print(f"Dropped {SOURCE}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
@@ -8,32 +10,130 @@ from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 from torrent_scraper import TorrentScraper
 from torrentio_indexer import TorrentioIndexer, RealDebridIntegration
 from smart_scraper import SmartScraper
 import httpx
+import orjson
+import zlib
 
 # Constants for Debrid services
 REAL_DEBRID_CLIENT_ID = 'X245A4XAIBGVM'
 ALLDEBRID_AGENT = 'zeus-glass'
-from debrid_cache_search import RealDebridCacheSearch, AllDebridCacheSearch, PremiumizeCacheSearch
+from debrid_cache_search import RealDebridCacheSearch, AllDebridCacheSearch, PremiumizeCacheSearch, TorrentIndexers, MultiDebridAvailability
+from fast_response import negotiate_response, wants_msgpack
+from upstream_proxy import stream_upstream
+from response_cache import ResponseCache
+from compression import CompressionMiddleware
+from cache_warmer import CacheWarmer
+from realdebrid_scheduler import rd_scheduler, parse_retry_after, token_label, PRIORITY_BROWSE
+from cluster_coordination import ClusterCoordinator, flight_key
+from admission import AdmissionController, AdmissionMiddleware
+from bulk_availability import BulkAvailabilityService
+from prefetch import NextEpisodePrefetcher, StreamLinkPreresolver
+from log_ingest import LogIngestQueue, PayloadTooLarge, ndjson_lines
+from log_rollups import LogRollups
+from error_groups import ErrorGroups
+from log_retention import LogRetention, RetentionPolicy
+from log_tail import LogTailBroker
+from log_store import LogStore, UPLOADS, ENTRIES, ENTRY_FIELDS, COUNT_MODES, InvalidCursor, add_entry, gzip_ndjson, new_summary, parse_timestamp, split_upload, summary_upsert, validate_entry
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
+rd_scheduler.configure_from_env()
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Background indexer-cache warming for trending titles
+cache_warmer = CacheWarmer.from_env()
+
+# Rate limits and request coalescing shared by every worker on this database
+coordinator = ClusterCoordinator.from_env(db)
+CLUSTER_BURST = float(os.environ.get("CLUSTER_BURST", "10"))
+CLUSTER_INDEXER_PER_MINUTE = float(os.environ.get("CLUSTER_INDEXER_PER_MINUTE", "60"))
+CLUSTER_RD_PER_MINUTE = float(os.environ.get("CLUSTER_RD_PER_MINUTE", "120"))
+
+
+# Watchlist-sized availability jobs, results streamed as NDJSON
+bulk_availability = BulkAvailabilityService.from_env(db)
+
+# Opt-in background search for the episode after the one being played
+prefetcher = NextEpisodePrefetcher.from_env()
+# Opt-in background resolution of the top cached search results' links
+preresolver = StreamLinkPreresolver.from_env()
+
+# Write-behind batching for device log uploads
+log_ingest = LogIngestQueue.from_env(db)
+# One document per log entry, queried with indexes
+log_store = LogStore(db)
+# Per-level TTLs, and compaction of old entries into daily archives
+retention_policy = RetentionPolicy.from_env()
+log_retention = LogRetention.from_env(db, retention_policy)
+# Hourly counters behind /logs/stats, kept as long as the longest-lived logs
+log_rollups = LogRollups.from_env(db, retention=retention_policy.longest())
+# Repeated errors deduplicated into fingerprinted groups
+error_groups = ErrorGroups.from_env(db, ttl=retention_policy.ttl)
+# Server-Sent Events feed of new entries for the dashboard
+log_tail = LogTailBroker.from_env(db)
+
+# Outbound concurrency caps per upstream host, with load shedding
+admission = AdmissionController.from_env()
+
+
+async def cluster_throttle(key: str, per_minute: float):
+    """Take a token from a cluster-wide bucket, or answer 503 with Retry-After"""
+    if not await coordinator.acquire(key, CLUSTER_BURST, per_minute / 60.0):
+        raise HTTPException(status_code=503, detail="Upstream quota reached, try again shortly", headers={"Retry-After": "5"})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await coordinator.ensure_indexes()
+    await bulk_availability.ensure_indexes()
+    await log_store.ensure_indexes()
+    await log_rollups.ensure_indexes()
+    await error_groups.ensure_indexes()
+    await log_retention.ensure_indexes()
+    cache_warmer.start()
+    bulk_availability.start()
+    log_ingest.start()
+    log_rollups.start()
+    error_groups.start()
+    log_retention.start()
+    log_tail.start()
+    yield
+    await log_tail.stop()
+    await log_retention.stop()
+    await log_ingest.stop()
+    await log_rollups.stop()
+    await error_groups.stop()
+    await preresolver.stop()
+    await prefetcher.stop()
+    await bulk_availability.stop()
+    await cache_warmer.stop()
+    client.close()
+
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Rendered responses, stored with their compressed variants and ETags
+SEARCH_CACHE_TTL = 300
+CATALOG_CACHE_TTL = 600
+CLOUD_CACHE_TTL = 30
+search_cache = ResponseCache(max_entries=1024)
+catalog_cache = ResponseCache(max_entries=256)
+cloud_cache = ResponseCache(max_entries=512)
+
 
 # Define Models
 class StatusCheck(BaseModel):
@@ -101,21 +201,41 @@ async def search_tv_torrents(
 
 # Torrentio endpoints (better indexer, no VPN needed)
 @api_router.get("/torrents/torrentio/movie")
-async def torrentio_movie(imdb_id: str = None, title: str = None, year: int = None):
+async def torrentio_movie(request: Request, imdb_id: str = None, title: str = None, year: int = None):
     """Search for movie via Torrentio indexer"""
+    cached = search_cache.lookup(request)
+    if cached is not None:
+        return cached
     try:
-        results = TorrentioIndexer.search_movie(imdb_id=imdb_id, title=title, year=year)
-        return {"success": True, "count": len(results), "results": results, "source": "Torrentio"}
+        async def search():
+            await cluster_throttle("indexer:torrentio", CLUSTER_INDEXER_PER_MINUTE)
+            return await run_in_threadpool(TorrentioIndexer.search_movie, imdb_id=imdb_id, title=title, year=year)
+
+        results = await coordinator.singleflight(flight_key("torrentio-movie", imdb_id, title, year), search)
+        response = negotiate_response(request, {"success": True, "count": len(results), "results": results, "source": "Torrentio"})
+        return search_cache.store(request, response, SEARCH_CACHE_TTL) if results else response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching Torrentio movie: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/torrents/torrentio/tv")
-async def torrentio_tv(imdb_id: str = None, title: str = None, season: int = 1, episode: int = 1):
+async def torrentio_tv(request: Request, imdb_id: str = None, title: str = None, season: int = 1, episode: int = 1):
     """Search for TV show via Torrentio indexer"""
+    cached = search_cache.lookup(request)
+    if cached is not None:
+        return cached
     try:
-        results = TorrentioIndexer.search_tv(imdb_id=imdb_id, title=title, season=season, episode=episode)
-        return {"success": True, "count": len(results), "results": results, "source": "Torrentio"}
+        async def search():
+            await cluster_throttle("indexer:torrentio", CLUSTER_INDEXER_PER_MINUTE)
+            return await run_in_threadpool(TorrentioIndexer.search_tv, imdb_id=imdb_id, title=title, season=season, episode=episode)
+
+        results = await coordinator.singleflight(flight_key("torrentio-tv", imdb_id, title, season, episode), search)
+        response = negotiate_response(request, {"success": True, "count": len(results), "results": results, "source": "Torrentio"})
+        return search_cache.store(request, response, SEARCH_CACHE_TTL) if results else response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching Torrentio TV: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -125,7 +245,7 @@ async def torrentio_tv(imdb_id: str = None, title: str = None, season: int = 1,
 async def rd_add_magnet(magnet: str, token: str):
     """Add magnet to Real-Debrid"""
     try:
-        result = RealDebridIntegration.add_magnet(magnet, token)
+        result = await run_in_threadpool(RealDebridIntegration.add_magnet, magnet, token)
         if result:
             return {"success": True, "data": result}
         else:
@@ -138,7 +258,7 @@ async def rd_add_magnet(magnet: str, token: str):
 async def rd_select_files(torrent_id: str, file_ids: str, token: str):
     """Select files from Real-Debrid torrent"""
     try:
-        success = RealDebridIntegration.select_files(torrent_id, file_ids, token)
+        success = await run_in_threadpool(RealDebridIntegration.select_files, torrent_id, file_ids, token)
         return {"success": success}
     except Exception as e:
         logger.error(f"Error selecting files: {e}")
@@ -148,7 +268,7 @@ async def rd_select_files(torrent_id: str, file_ids: str, token: str):
 async def rd_torrent_info(torrent_id: str, token: str):
     """Get torrent info from Real-Debrid"""
     try:
-        info = RealDebridIntegration.get_torrent_info(torrent_id, token)
+        info = await run_in_threadpool(RealDebridIntegration.get_torrent_info, torrent_id, token)
         if info:
             return {"success": True, "data": info}
         else:
@@ -161,7 +281,7 @@ async def rd_torrent_info(torrent_id: str, token: str):
 async def rd_unrestrict(link: str, token: str):
     """Unrestrict a link via Real-Debrid"""
     try:
-        result = RealDebridIntegration.unrestrict_link(link, token)
+        result = await run_in_threadpool(RealDebridIntegration.unrestrict_link, link, token)
         if result:
             return {"success": True, "data": result}
         else:
@@ -174,7 +294,7 @@ async def rd_unrestrict(link: str, token: str):
 async def rd_get_torrents(token: str):
     """Get all user torrents from Real-Debrid"""
     try:
-        torrents = RealDebridIntegration.get_all_torrents(token)
+        torrents = await run_in_threadpool(RealDebridIntegration.get_all_torrents, token)
         return {"success": True, "count": len(torrents), "torrents": torrents}
     except Exception as e:
         logger.error(f"Error getting torrents: {e}")
@@ -187,31 +307,56 @@ async def rd_get_torrents(token: str):
 
 @api_router.get("/debrid/cache/search/movie")
 async def search_cached_movie(
+    request: Request,
     title: str,
     token: str,
     year: Optional[int] = None,
-    imdb_id: Optional[str] = None
+    imdb_id: Optional[str] = None,
+    preresolve: int = 0
 ):
     """
     Search for cached movie torrents on Real-Debrid
     This is the main endpoint for finding instant-play movies
+    preresolve=N resolves the top N cached results' stream links in the
+    background so /debrid/cache/stream answers instantly for them (cache
+    hits included; the pre-resolver budgets per token)
     """
+    cached = search_cache.lookup(
+        request,
+        on_hit=(lambda results: preresolver.schedule(token, results, preresolve)) if preresolve else None
+    )
+    if cached is not None:
+        return cached
     try:
         logger.info(f"Searching cached movie: title={title}, year={year}, imdb_id={imdb_id}")
-        results = RealDebridCacheSearch.search_cached_torrents(
-            query=title,
-            token=token,
-            content_type="movie",
-            year=year,
-            imdb_id=imdb_id  # Pass IMDB ID for better indexer results
+
+        async def search():
+            await cluster_throttle("indexers", CLUSTER_INDEXER_PER_MINUTE)
+            await cluster_throttle(f"rd:{token_label(token)}", CLUSTER_RD_PER_MINUTE)
+            return await run_in_threadpool(
+                RealDebridCacheSearch.search_cached_torrents,
+                query=title,
+                token=token,
+                content_type="movie",
+                year=year,
+                imdb_id=imdb_id  # Pass IMDB ID for better indexer results
+            )
+
+        results = await coordinator.singleflight(
+            flight_key("cached-movie", token_label(token), title, year, imdb_id), search
         )
         logger.info(f"Found {len(results)} cached results")
-        return {
+        if preresolve:
+            preresolver.schedule(token, results, preresolve)
+        response = negotiate_response(request, {
             "success": True,
             "count": len(results),
             "results": results,
             "source": "Real-Debrid Cache"
-        }
+        })
+        return search_cache.store(request, response, SEARCH_CACHE_TTL, payload=results) if results else response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching cached movie: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -219,63 +364,189 @@ async def search_cached_movie(
 
 @api_router.get("/debrid/cache/search/tv")
 async def search_cached_tv(
+    request: Request,
     title: str,
     token: str,
     season: int = 1,
     episode: int = 1,
-    imdb_id: Optional[str] = None
+    imdb_id: Optional[str] = None,
+    preresolve: int = 0
 ):
     """
     Search for cached TV show torrents on Real-Debrid
+    preresolve=N works as for movies
     """
+    cached = search_cache.lookup(
+        request,
+        on_hit=(lambda results: preresolver.schedule(token, results, preresolve, season, episode)) if preresolve else None
+    )
+    if cached is not None:
+        return cached
     try:
-        results = RealDebridCacheSearch.search_cached_torrents(
-            query=title,
-            token=token,
-            content_type="tv",
-            season=season,
-            episode=episode
+        async def search():
+            await cluster_throttle("indexers", CLUSTER_INDEXER_PER_MINUTE)
+            await cluster_throttle(f"rd:{token_label(token)}", CLUSTER_RD_PER_MINUTE)
+            return await run_in_threadpool(
+                RealDebridCacheSearch.search_cached_torrents,
+                query=title,
+                token=token,
+                content_type="tv",
+                season=season,
+                episode=episode,
+                imdb_id=imdb_id
+            )
+
+        results = await coordinator.singleflight(
+            flight_key("cached-tv", token_label(token), title, season, episode, imdb_id), search
         )
-        return {
+        if preresolve:
+            preresolver.schedule(token, results, preresolve, season, episode)
+        response = negotiate_response(request, {
             "success": True,
             "count": len(results),
             "results": results,
             "source": "Real-Debrid Cache"
-        }
+        })
+        return search_cache.store(request, response, SEARCH_CACHE_TTL, payload=results) if results else response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching cached TV: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+SEASON_MAX_EPISODES = 50
+
+
+@api_router.get("/debrid/cache/season")
+async def search_cached_season(
+    request: Request,
+    imdb_id: str,
+    season: int,
+    token: str,
+    start: int = 1,
+    end: int = 10,
+    title: Optional[str] = None
+):
+    """
+    Episode x best-cached-stream matrix for episodes start..end of a season
+    One request for the whole season screen instead of one search per episode
+    """
+    if start < 1 or end < start or end - start >= SEASON_MAX_EPISODES:
+        raise HTTPException(status_code=400, detail=f"Episode range must be 1-{SEASON_MAX_EPISODES} episodes")
+    cached = search_cache.lookup(request)
+    if cached is not None:
+        return cached
+    try:
+        async def build():
+            await cluster_throttle("indexers", CLUSTER_INDEXER_PER_MINUTE)
+            await cluster_throttle(f"rd:{token_label(token)}", CLUSTER_RD_PER_MINUTE)
+            return await run_in_threadpool(
+                RealDebridCacheSearch.season_availability,
+                imdb_id=imdb_id,
+                token=token,
+                season=season,
+                episodes=list(range(start, end + 1)),
+                title=title
+            )
+
+        episodes = await coordinator.singleflight(
+            flight_key("season", token_label(token), imdb_id, season, start, end, title), build
+        )
+        cached_episodes = sum(1 for entry in episodes if entry["best"])
+        response = negotiate_response(request, {
+            "success": True,
+            "imdb_id": imdb_id,
+            "season": season,
+            "cached_episodes": cached_episodes,
+            "episodes": episodes,
+            "source": "Real-Debrid Cache"
+        })
+        return search_cache.store(request, response, SEARCH_CACHE_TTL) if cached_episodes else response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error building season availability: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @api_router.get("/debrid/cache/stream")
 async def get_stream_link(
     hash: str,
     token: str,
-    file_id: Optional[str] = None
+    file_id: Optional[str] = None,
+    season: Optional[int] = None,
+    episode: Optional[int] = None,
+    imdb_id: Optional[str] = None,
+    title: Optional[str] = None,
+    prefetch: bool = False
 ):
     """
     Get direct stream link for a cached torrent
     This adds the torrent to RD and returns the streaming URL
+    For season packs pass season/episode to get that episode's file;
+    with prefetch=true (and imdb_id) the next episode is searched in the
+    background, see /debrid/cache/prefetched
     """
     try:
-        stream_url = RealDebridCacheSearch.add_and_get_stream_link(
-            info_hash=hash,
-            token=token,
-            file_id=file_id
+        stream_url = preresolver.lookup(token, hash, file_id, season, episode)
+        if stream_url:
+            if prefetch and imdb_id and season is not None and episode is not None:
+                prefetcher.schedule(token, imdb_id, season, episode, title)
+            return {"success": True, "stream_url": stream_url, "preresolved": True}
+
+        async def resolve():
+            # A request we waited on may have resolved it on this worker
+            resolved = preresolver.lookup(token, hash, file_id, season, episode)
+            if resolved:
+                return resolved
+            await cluster_throttle(f"rd:{token_label(token)}", CLUSTER_RD_PER_MINUTE)
+            url = await run_in_threadpool(
+                RealDebridCacheSearch.add_and_get_stream_link,
+                info_hash=hash,
+                token=token,
+                file_id=file_id,
+                season=season,
+                episode=episode
+            )
+            if url:
+                # Before the lease is released, so the next waiter here finds it
+                preresolver.store(token, hash, file_id, url, season, episode)
+            return url
+
+        # Double-taps and retries from several workers resolve one at a time;
+        # stream links are per-user, so they're never shared through Mongo
+        stream_url = await coordinator.singleflight(
+            flight_key("stream", token_label(token), hash.lower(), file_id, season, episode), resolve, share=False
         )
         
         if stream_url:
+            if prefetch and imdb_id and season is not None and episode is not None:
+                prefetcher.schedule(token, imdb_id, season, episode, title)
             return {
                 "success": True,
                 "stream_url": stream_url
             }
         else:
             raise HTTPException(status_code=404, detail="Could not get stream link")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting stream link: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.get("/debrid/cache/prefetched")
+async def get_prefetched_episode(token: str, imdb_id: str, season: int, episode: int):
+    """
+    Best cached result prefetched for this episode, if the previous one was
+    played with prefetch=true; on a hit the client can go straight to
+    /debrid/cache/stream with its hash and file_id
+    """
+    result = prefetcher.lookup(token, imdb_id, season, episode)
+    return {"success": True, "hit": result is not None, "result": result}
+
+
 @api_router.get("/debrid/alldebrid/cache/check")
 async def check_alldebrid_cache(hashes: str, apikey: str):
     """Check which torrents are cached on AllDebrid"""
@@ -299,16 +570,131 @@ async def check_premiumize_cache(hashes: str, apikey: str):
         logger.error(f"Error checking Premiumize cache: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+class CacheCheckRequest(BaseModel):
+    hashes: List[str]
+    real_debrid_token: Optional[str] = None
+    alldebrid_apikey: Optional[str] = None
+    premiumize_apikey: Optional[str] = None
+    torbox_token: Optional[str] = None
+    timeout: float = Field(default=12, gt=0, le=30)
+
+
+@api_router.post("/debrid/cache/check")
+async def check_all_debrid_cache(request: CacheCheckRequest):
+    """
+    Check one hash set against every configured debrid provider concurrently
+    Returns a merged hash -> {provider: cached} map; providers that time out
+    or fail are reported in `providers` and left out of the map
+    """
+    hashes = MultiDebridAvailability.normalize_hashes(request.hashes)
+    if not hashes:
+        raise HTTPException(status_code=400, detail="No valid info hashes")
+    credentials = {
+        "real-debrid": request.real_debrid_token,
+        "alldebrid": request.alldebrid_apikey,
+        "premiumize": request.premiumize_apikey,
+        "torbox": request.torbox_token,
+    }
+    if not any(credentials.values()):
+        raise HTTPException(status_code=400, detail="No debrid provider credentials")
+    if request.real_debrid_token:
+        await cluster_throttle(f"rd:{token_label(request.real_debrid_token)}", CLUSTER_RD_PER_MINUTE)
+    try:
+        result = await run_in_threadpool(
+            MultiDebridAvailability.check, hashes, credentials, request.timeout
+        )
+        cached_anywhere = sum(1 for providers in result["availability"].values() if any(providers.values()))
+        return {"success": True, "count": len(hashes), "cached_anywhere": cached_anywhere, **result}
+    except Exception as e:
+        logger.error(f"Error checking debrid caches: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class WatchlistItem(BaseModel):
+    imdb_id: str
+    type: str = "movie"
+    season: Optional[int] = None
+    episode: Optional[int] = None
+
+
+class BulkAvailabilityRequest(BaseModel):
+    imdb_ids: List[str] = []
+    items: List[WatchlistItem] = []
+    real_debrid_token: Optional[str] = None
+    alldebrid_apikey: Optional[str] = None
+    premiumize_apikey: Optional[str] = None
+    torbox_token: Optional[str] = None
+
+
+@api_router.post("/debrid/availability/jobs")
+async def submit_availability_job(request: BulkAvailabilityRequest):
+    """
+    Start a bulk "instantly playable" check for a watchlist (up to 100 titles)
+    Plain imdb_ids are treated as movies; use items for series
+    """
+    items = [{"imdb_id": imdb_id, "type": "movie"} for imdb_id in request.imdb_ids]
+    items += [item.dict() for item in request.items]
+    items = [item for item in items if item["imdb_id"].startswith("tt")]
+    if not items:
+        raise HTTPException(status_code=400, detail="No valid IMDB IDs")
+    credentials = {
+        "real-debrid": request.real_debrid_token,
+        "alldebrid": request.alldebrid_apikey,
+        "premiumize": request.premiumize_apikey,
+        "torbox": request.torbox_token,
+    }
+    if not any(credentials.values()):
+        raise HTTPException(status_code=400, detail="No debrid provider credentials")
+    try:
+        job = await bulk_availability.submit(items, credentials)
+        return {
+            "success": True,
+            "job_id": job["_id"],
+            "total": job["total"],
+            "stream_url": f"/api/debrid/availability/jobs/{job['_id']}/stream",
+        }
+    except Exception as e:
+        logger.error(f"Error submitting availability job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/debrid/availability/jobs/{job_id}")
+async def get_availability_job(job_id: str):
+    """Progress and results so far of a bulk availability job"""
+    job = await bulk_availability.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job["job_id"] = job.pop("_id")
+    return job
+
+
+@api_router.get("/debrid/availability/jobs/{job_id}/stream")
+async def stream_availability_job(job_id: str):
+    """Per-title results as NDJSON lines, as soon as each batch is checked"""
+    if await bulk_availability.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        bulk_availability.stream(job_id),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
 # ============================================
 # DEBRID CLOUD - List user's cached/cloud torrents
 # ============================================
 
 @api_router.get("/debrid/real-debrid/cloud")
-async def get_rd_cloud(token: str, page: int = 1, limit: int = 50):
+async def get_rd_cloud(request: Request, token: str, page: int = 1, limit: int = 50):
     """Get Real-Debrid user's cloud torrents"""
     try:
         if not token:
             raise HTTPException(status_code=400, detail="Token required")
+        cached = cloud_cache.lookup(request)
+        if cached is not None:
+            return cached
+        if not await rd_scheduler.acquire_async(token, PRIORITY_BROWSE):
+            raise HTTPException(status_code=503, detail="Real-Debrid rate limit, try again shortly", headers={"Retry-After": "5"})
         async with httpx.AsyncClient() as client:
             response = await client.get(
                 "https://api.real-debrid.com/rest/1.0/torrents",
@@ -316,10 +702,16 @@ async def get_rd_cloud(token: str, page: int = 1, limit: int = 50):
                 params={"offset": (page - 1) * limit, "limit": limit},
                 timeout=15.0
             )
+            if response.status_code == 429:
+                rd_scheduler.note_retry_after(token, parse_retry_after(response.headers.get("Retry-After")))
             response.raise_for_status()
-            return response.json()
+            if not response.content:
+                return []
+            return cloud_cache.store_body(request, response.content, "application/json", CLOUD_CACHE_TTL)
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"RD Cloud error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -558,28 +950,32 @@ async def torbox_account_info(token: str):
 # ============================================
 
 @api_router.get("/torrentio/stream/{content_type}/{content_id:path}")
-async def proxy_torrentio_stream(content_type: str, content_id: str):
-    """Proxy Torrentio stream requests to bypass CORS"""
+async def proxy_torrentio_stream(request: Request, content_type: str, content_id: str, compress: bool = True):
+    """
+    Proxy Torrentio stream requests to bypass CORS
+    The upstream body is streamed through untouched; only msgpack clients
+    get the parsed and re-encoded {"streams": [...]} form
+    """
     try:
         url = f"https://torrentio.strem.fun/stream/{content_type}/{content_id}"
         if not url.endswith('.json'):
             url += '.json'
         
         logger.info(f"Proxying Torrentio request: {url}")
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36',
+        }
+        
+        if not wants_msgpack(request):
+            return await stream_upstream(request, url, headers=headers, timeout=20.0, compress=compress)
         
         async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(
-                url,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Linux; Android 10) AppleWebKit/537.36',
-                },
-                timeout=20.0
-            )
+            response = await http_client.get(url, headers=headers, timeout=20.0)
             response.raise_for_status()
             data = response.json()
             streams = data.get('streams', [])
             logger.info(f"Torrentio returned {len(streams)} streams")
-            return {"streams": streams}
+            return negotiate_response(request, {"streams": streams})
     except httpx.HTTPStatusError as e:
         logger.error(f"Torrentio proxy HTTP error: {e.response.status_code}")
         raise HTTPException(status_code=e.response.status_code, detail=str(e))
@@ -589,16 +985,23 @@ async def proxy_torrentio_stream(content_type: str, content_id: str):
 
 
 @api_router.get("/torrentio/catalog/{catalog_type}/{catalog_id}")
-async def proxy_torrentio_catalog(catalog_type: str, catalog_id: str):
-    """Proxy Torrentio catalog requests"""
+async def proxy_torrentio_catalog(request: Request, catalog_type: str, catalog_id: str, compress: bool = True):
+    """
+    Proxy Torrentio catalog requests (streamed passthrough)
+    Completed bodies are cached, so repeat and conditional requests are
+    answered without touching upstream
+    """
+    cached = catalog_cache.lookup(request)
+    if cached is not None:
+        return cached
     try:
-        url = f"https://torrentio.strem.fun/catalog/{catalog_type}/{catalog_id}.json"
+        url = TorrentioIndexer.catalog_url(catalog_type, catalog_id)
         logger.info(f"Proxying Torrentio catalog: {url}")
         
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(url, timeout=15.0)
-            response.raise_for_status()
-            return response.json()
+        return await stream_upstream(
+            request, url, timeout=15.0, compress=compress,
+            on_complete=catalog_cache.capture(request, CATALOG_CACHE_TTL)
+        )
     except Exception as e:
         logger.error(f"Torrentio catalog proxy error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -710,6 +1113,35 @@ async def proxy_test(proxy_url: str):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# ============================================
+# METRICS - Cache and background job statistics
+# ============================================
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Cache hit rates and background job statistics"""
+    return {
+        "admission": admission.stats(),
+        "bulk_availability": bulk_availability.stats(),
+        "cache_warmer": cache_warmer.stats(),
+        "cluster": coordinator.stats(),
+        "indexer_cache": TorrentIndexers.cache.stats(),
+        "log_ingest": log_ingest.stats(),
+        "log_rollups": log_rollups.stats(),
+        "error_groups": error_groups.stats(),
+        "log_retention": log_retention.stats(),
+        "log_tail": log_tail.stats(),
+        "episode_file_cache": RealDebridCacheSearch.episode_files.stats(),
+        "realdebrid_scheduler": rd_scheduler.stats(),
+        "prefetch": prefetcher.stats(),
+        "preresolve": preresolver.stats(),
+        "response_cache": {
+            "search": search_cache.stats(),
+            "catalog": catalog_cache.stats(),
+            "cloud": cloud_cache.stats(),
+        },
+    }
+
 # ============================================
 # ERROR LOG UPLOAD & DASHBOARD
 # Stores device logs in MongoDB for remote debugging
@@ -730,43 +1162,164 @@ class LogUploadRequest(BaseModel):
     app_version: Optional[str] = None
     logs: List[LogEntryModel]
 
+async def enqueue_logs(
+    entries: List[dict],
+    summary: Optional[dict] = None,
+    timeout: float = 1.0,
+    streamed: bool = False,
+    previous: Optional[dict] = None
+) -> bool:
+    """
+    Fingerprint entries and queue them with their upload summary for the
+    batched writer; counted into groups/rollups only once accepted. A
+    `streamed` upload's summary is upserted batch by batch (`previous`: the
+    summary before this batch) rather than inserted once. False when the
+    queue stayed full
+    """
+    grouped = error_groups.process(entries)
+    retention_policy.stamp(entries, summary)
+    documents = [(ENTRIES, entry) for entry in entries]
+    if summary:
+        documents.insert(0, (UPLOADS, summary_upsert(summary, entries) if streamed else summary))
+    if not await log_ingest.put(documents, timeout=timeout):
+        return False
+    error_groups.record(grouped)
+    if summary:
+        log_rollups.record(summary, previous)
+    log_tail.publish(entries)
+    return True
+
 @api_router.post("/logs/upload")
 async def upload_logs(request: LogUploadRequest):
-    """Upload device logs to the cloud for remote debugging"""
+    """
+    Upload device logs to the cloud for remote debugging
+    Queued and acknowledged immediately; written to MongoDB in batches
+    """
     try:
-        doc = {
-            "device_id": request.device_id,
-            "device_name": request.device_name or "Unknown",
-            "platform": request.platform or "unknown",
-            "app_version": request.app_version or "unknown",
-            "uploaded_at": datetime.utcnow().isoformat(),
-            "log_count": len(request.logs),
-            "logs": [l.dict() for l in request.logs],
-        }
-        await db.error_logs.insert_one(doc)
+        summary, entries = split_upload(request.dict())
+        if not await enqueue_logs(entries, summary):
+            raise HTTPException(status_code=503, detail="Log ingestion busy, retry later", headers={"Retry-After": "5"})
         return {"success": True, "message": f"Uploaded {len(request.logs)} logs", "log_count": len(request.logs)}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Log upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+NDJSON_BATCH = 500
+NDJSON_MAX_ERRORS = 10
+# Streamed uploads wait this long for queue space (backpressure on the
+# device's upload) before giving up with 503
+NDJSON_QUEUE_WAIT = 10.0
+
+@api_router.post("/logs/ingest")
+async def ingest_logs(request: Request):
+    """
+    Streaming alternative to /logs/upload for large uploads: NDJSON, gzip
+    compressed or not. The first line is the upload header (device_id,
+    device_name, platform, app_version), every further line one log entry.
+    Entries are validated and queued in batches as the body arrives, so
+    memory per upload stays bounded by one batch. Invalid entries are
+    skipped and reported. Each batch carries its share of the upload
+    summary, so a stream that fails midway leaves a summary for exactly
+    the entries already accepted
+    """
+    summary = None
+    previous = None
+    batch: List[dict] = []
+    rejected = 0
+    errors = []
+    line_number = 0
+    try:
+        async for line in ndjson_lines(request.stream()):
+            line_number += 1
+            try:
+                item = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                item, problem = None, "invalid JSON"
+            else:
+                problem = None
+
+            if summary is None:
+                if not isinstance(item, dict) or not isinstance(item.get("device_id"), str):
+                    raise HTTPException(status_code=422, detail="First line must be the upload header with a device_id")
+                summary = new_summary(item)
+                continue
+
+            problem = problem or validate_entry(item)
+            if problem:
+                rejected += 1
+                if len(errors) < NDJSON_MAX_ERRORS:
+                    errors.append({"line": line_number, "error": problem})
+                continue
+            batch.append(add_entry(summary, item))
+            if len(batch) >= NDJSON_BATCH:
+                if not await enqueue_logs(batch, summary, NDJSON_QUEUE_WAIT, streamed=True, previous=previous):
+                    raise HTTPException(status_code=503, detail="Log ingestion busy, retry later", headers={"Retry-After": "5"})
+                previous = dict(summary, level_counts=dict(summary["level_counts"]))
+                batch = []
+
+        if summary is None:
+            raise HTTPException(status_code=422, detail="Empty upload")
+        if (batch or previous is None) and not await enqueue_logs(batch, summary, NDJSON_QUEUE_WAIT, streamed=True, previous=previous):
+            raise HTTPException(status_code=503, detail="Log ingestion busy, retry later", headers={"Retry-After": "5"})
+        return {
+            "success": True,
+            "upload_id": summary["_id"],
+            "log_count": summary["log_count"],
+            "rejected": rejected,
+            "errors": errors,
+        }
+    except HTTPException:
+        raise
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    except Exception as e:
+        logger.error(f"Log ingest error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+LOG_PAGE_MAX = 100
+
 @api_router.get("/logs")
-async def get_logs(limit: int = 20, device_id: Optional[str] = None, level: Optional[str] = None):
-    """Retrieve uploaded logs from all devices"""
+async def get_logs(
+    limit: int = 20,
+    device_id: Optional[str] = None,
+    level: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    entries: int = 100,
+    count: str = "exact"
+):
+    """
+    Retrieve uploaded logs from all devices, newest first
+
+    Paged by keyset: pass the previous page's `next_cursor` as `cursor`.
+    `fields` (comma-separated) projects each entry, `entries` caps entries
+    per upload (0 = summaries only), `count` is exact, estimated or none
+    """
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of: {', '.join(COUNT_MODES)}")
+    entry_fields = ENTRY_FIELDS
+    if fields is not None:
+        entry_fields = tuple(f for f in (f.strip() for f in fields.split(",")) if f)
+        unknown = set(entry_fields) - set(ENTRY_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
     try:
-        query = {}
-        if device_id:
-            query["device_id"] = device_id
-        
-        uploads = await db.error_logs.find(query, {"_id": 0}).sort("uploaded_at", -1).to_list(limit)
-        
-        # If filtering by level, filter the individual log entries
-        if level:
-            for upload in uploads:
-                upload["logs"] = [l for l in upload["logs"] if l["level"] == level]
-                upload["log_count"] = len(upload["logs"])
-        
-        total = await db.error_logs.count_documents(query)
-        return {"success": True, "total": total, "showing": len(uploads), "uploads": uploads}
+        page = await log_store.page_uploads(
+            limit=max(1, min(limit, LOG_PAGE_MAX)),
+            cursor=cursor,
+            device_id=device_id,
+            level=level,
+            entries_per_upload=max(0, entries),
+            fields=entry_fields,
+            count=count
+        )
+        return {"success": True, "showing": len(page["uploads"]), **page}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Log retrieval error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -775,9 +1328,159 @@ async def get_logs(limit: int = 20, device_id: Optional[str] = None, level: Opti
 async def clear_logs():
     """Clear all stored logs"""
     try:
-        result = await db.error_logs.delete_many({})
-        return {"success": True, "deleted": result.deleted_count}
+        # Uploads still queued would otherwise reappear right after clearing
+        await log_ingest.flush()
+        deleted = await log_store.clear()
+        await log_rollups.clear()
+        await error_groups.clear()
+        await log_retention.clear()
+        return {"success": True, "deleted": deleted}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/logs/stats")
+async def get_log_stats(hours: int = 24):
+    """
+    Upload, entry, device and per-level/version/platform counts over the
+    last `hours` hours, plus all-time totals, answered from hourly rollups
+    """
+    if not 1 <= hours <= log_rollups.max_hours:
+        raise HTTPException(status_code=400, detail=f"hours must be between 1 and {log_rollups.max_hours}")
+    try:
+        return {"success": True, "hours": hours, **await log_rollups.summary(hours)}
+    except Exception as e:
+        logger.error(f"Log stats error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/logs/search")
+async def search_logs(
+    q: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    level: Optional[str] = None,
+    device_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Full-text search over every stored entry's message, context and stack,
+    newest first; page with the previous response's `next_cursor`
+    """
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    try:
+        page = await log_store.search(
+            q[:200],
+            limit=max(1, min(limit, LOG_PAGE_MAX)),
+            cursor=cursor,
+            level=level,
+            device_id=device_id,
+            since=parse_timestamp(since, since) if since else None,
+            until=parse_timestamp(until, until) if until else None
+        )
+        return {"success": True, "query": q, "showing": len(page["results"]), **page}
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Log search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/logs/export")
+async def export_logs(
+    level: Optional[str] = None,
+    device_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Every matching entry as gzip-compressed NDJSON, oldest first, streamed
+    straight from the Mongo cursor (memory use doesn't grow with the export)
+    """
+    rows = log_store.export(
+        level=level,
+        device_id=device_id,
+        since=parse_timestamp(since, since) if since else None,
+        until=parse_timestamp(until, until) if until else None
+    )
+    filename = f"zeus-glass-logs-{datetime.utcnow():%Y-%m-%d}.ndjson.gz"
+    return StreamingResponse(
+        gzip_ndjson(rows),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-cache"}
+    )
+
+@api_router.get("/logs/tail")
+async def tail_logs(level: Optional[str] = None, device_id: Optional[str] = None):
+    """
+    Server-Sent Events stream of new log entries matching level/device as
+    they're ingested (`log` events; `dropped` if the client falls behind)
+    """
+    subscriber = log_tail.subscribe(level=level, device_id=device_id)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many live tail subscribers", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        log_tail.events(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/logs/archives")
+async def list_log_archives(day: Optional[datetime] = None, level: Optional[str] = None, limit: int = 100):
+    """Compacted daily archives of older entries (metadata only)"""
+    try:
+        archives = await log_retention.list_archives(day=day, level=level, limit=max(1, min(limit, 1000)))
+        return {"success": True, "showing": len(archives), "archives": archives}
+    except Exception as e:
+        logger.error(f"Log archive listing error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/logs/archives/{archive_id}/download")
+async def download_log_archive(archive_id: str):
+    """One archive's entries, as the gzip-compressed NDJSON it is stored as"""
+    data = await log_retention.archive_data(archive_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Archive not found")
+    filename = archive_id.replace(":", "_") + ".ndjson.gz"
+    return Response(
+        content=data,
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+ERROR_GROUP_SORTS = ("last_seen", "count")
+
+@api_router.get("/logs/groups")
+async def get_error_groups(
+    limit: int = 50,
+    level: Optional[str] = None,
+    hours: Optional[int] = None,
+    sort: str = "last_seen"
+):
+    """Deduplicated error groups (without samples), most recent or most frequent first"""
+    if sort not in ERROR_GROUP_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(ERROR_GROUP_SORTS)}")
+    since = datetime.utcnow() - timedelta(hours=hours) if hours else None
+    try:
+        groups, total = await error_groups.list_groups(limit=max(1, min(limit, LOG_PAGE_MAX)), level=level, since=since, sort=sort)
+        return {"success": True, "total": total, "showing": len(groups), "groups": groups}
+    except Exception as e:
+        logger.error(f"Error group listing error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/logs/groups/{fingerprint}")
+async def get_error_group(fingerprint: str, occurrences: int = 20):
+    """One error group with its raw samples and most recent occurrences"""
+    try:
+        group = await error_groups.get(fingerprint)
+        if group is None:
+            raise HTTPException(status_code=404, detail="Error group not found")
+        group["occurrences"] = await log_store.occurrences(fingerprint, max(1, min(occurrences, LOG_PAGE_MAX)))
+        return {"success": True, "group": group}
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.error(f"Error group lookup error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 from fastapi.responses import HTMLResponse
@@ -832,14 +1535,15 @@ select,input{padding:8px 12px;border-radius:8px;border:1px solid #1a2235;backgro
 <div class="header">
   <h1>Zeus Glass Log Dashboard</h1>
   <div class="controls">
+    <label class="upload-meta"><input type="checkbox" id="liveTail" checked onchange="startTail()"> Live</label>
     <button class="btn" onclick="loadLogs()">Refresh</button>
-    <button class="btn" onclick="exportLogs()">Export JSON</button>
+    <button class="btn" onclick="exportLogs()">Export</button>
     <button class="btn danger" onclick="clearAll()">Clear All</button>
   </div>
 </div>
 <div class="stats" id="stats"></div>
 <div class="filters">
-  <select id="levelFilter" onchange="loadLogs()">
+  <select id="levelFilter" onchange="loadLogs(); startTail()">
     <option value="">All Levels</option>
     <option value="error">Errors Only</option>
     <option value="warn">Warnings</option>
@@ -851,48 +1555,55 @@ select,input{padding:8px 12px;border-radius:8px;border:1px solid #1a2235;backgro
     <option value="50">Last 50</option>
     <option value="100">Last 100</option>
   </select>
-  <input type="text" id="searchFilter" placeholder="Search messages..." oninput="filterLocally()">
+  <input type="text" id="searchFilter" placeholder="Search all logs..." oninput="searchLogs()">
 </div>
 <div id="content"><div class="loading">Loading logs...</div></div>
+<div class="controls" style="justify-content:center;margin-top:16px"><button class="btn" id="loadMore" style="display:none" onclick="loadLogs(true)">Load more</button></div>
 
 <script>
 document.addEventListener('DOMContentLoaded', function() {
 let allData = [];
+let nextCursor = null;
 const API = window.location.origin + '/api';
 
-window.loadLogs = async function() {
+window.loadLogs = async function(more) {
   const level = document.getElementById('levelFilter').value;
   const limit = document.getElementById('limitFilter').value;
-  let url = API + '/logs?limit=' + limit;
+  let url = API + '/logs?count=none&entries=50&limit=' + limit;
   if (level) url += '&level=' + level;
+  if (more && nextCursor) url += '&cursor=' + encodeURIComponent(nextCursor);
   
   try {
     const res = await fetch(url);
     const data = await res.json();
-    allData = data.uploads || [];
-    renderStats(data);
+    allData = more ? allData.concat(data.uploads || []) : (data.uploads || []);
+    nextCursor = data.next_cursor;
+    document.getElementById('loadMore').style.display = nextCursor ? '' : 'none';
     renderLogs(allData);
+    loadStats();
   } catch(e) {
     document.getElementById('content').innerHTML = '<div class="empty">Failed to load logs: ' + e.message + '</div>';
   }
 }
 
-window.renderStats = function(data) {
-  let totalErrors = 0, totalWarns = 0, totalLogs = 0, devices = new Set();
-  allData.forEach(u => {
-    devices.add(u.device_id);
-    u.logs.forEach(l => {
-      totalLogs++;
-      if(l.level === 'error') totalErrors++;
-      if(l.level === 'warn') totalWarns++;
-    });
-  });
+window.loadStats = async function() {
+  try {
+    const res = await fetch(API + '/logs/stats?hours=24');
+    renderStats(await res.json());
+  } catch(e) {
+    document.getElementById('stats').innerHTML = '';
+  }
+}
+
+window.renderStats = function(stats) {
+  const levels = stats.levels || {};
+  const totals = stats.totals || {};
   document.getElementById('stats').innerHTML =
-    '<div class="stat"><div class="stat-value">' + data.total + '</div><div class="stat-label">Total Uploads</div></div>' +
-    '<div class="stat"><div class="stat-value">' + devices.size + '</div><div class="stat-label">Devices</div></div>' +
-    '<div class="stat errors"><div class="stat-value">' + totalErrors + '</div><div class="stat-label">Errors</div></div>' +
-    '<div class="stat"><div class="stat-value">' + totalWarns + '</div><div class="stat-label">Warnings</div></div>' +
-    '<div class="stat"><div class="stat-value">' + totalLogs + '</div><div class="stat-label">Total Entries</div></div>';
+    '<div class="stat"><div class="stat-value">' + totals.uploads + '</div><div class="stat-label">Total Uploads</div></div>' +
+    '<div class="stat"><div class="stat-value">' + stats.devices + '</div><div class="stat-label">Devices (24h)</div></div>' +
+    '<div class="stat errors"><div class="stat-value">' + (levels.error || 0) + '</div><div class="stat-label">Errors (24h)</div></div>' +
+    '<div class="stat"><div class="stat-value">' + (levels.warn || 0) + '</div><div class="stat-label">Warnings (24h)</div></div>' +
+    '<div class="stat"><div class="stat-value">' + totals.entries + '</div><div class="stat-label">Total Entries</div></div>';
 }
 
 window.renderLogs = function(uploads) {
@@ -905,7 +1616,7 @@ window.renderLogs = function(uploads) {
     const time = new Date(u.uploaded_at).toLocaleString();
     html += '<div class="upload-card">';
     html += '<div class="upload-header"><div><span class="device-name">' + (u.device_name || u.device_id) + '</span></div>';
-    html += '<div class="upload-meta"><span>' + time + '</span><span>' + u.platform + '</span><span>v' + u.app_version + '</span><span>' + u.log_count + ' entries</span></div></div>';
+    html += '<div class="upload-meta"><span>' + time + '</span><span>' + u.platform + '</span><span>v' + u.app_version + '</span><span>' + u.log_count + ' entries' + (u.truncated ? ' (first ' + u.logs.length + ' shown)' : '') + '</span></div></div>';
     u.logs.forEach((l, i) => {
       const t = new Date(l.timestamp).toLocaleTimeString();
       html += '<div class="log-entry"><span class="badge ' + l.level + '">' + l.level.toUpperCase() + '</span>';
@@ -919,15 +1630,52 @@ window.renderLogs = function(uploads) {
   document.getElementById('content').innerHTML = html;
 }
 
-window.filterLocally = function() {
-  const q = document.getElementById('searchFilter').value.toLowerCase();
-  if(!q) { renderLogs(allData); return; }
-  const filtered = allData.map(u => ({
-    ...u,
-    logs: u.logs.filter(l => l.message.toLowerCase().includes(q) || (l.context||'').toLowerCase().includes(q)),
-    log_count: undefined
-  })).map(u => ({...u, log_count: u.logs.length})).filter(u => u.logs.length > 0);
-  renderLogs(filtered);
+let searchTimer = null;
+window.searchLogs = function() {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(async function() {
+    const q = document.getElementById('searchFilter').value.trim();
+    if(!q) { renderLogs(allData); return; }
+    const level = document.getElementById('levelFilter').value;
+    let url = API + '/logs/search?limit=100&q=' + encodeURIComponent(q);
+    if (level) url += '&level=' + level;
+    try {
+      const data = await (await fetch(url)).json();
+      // Regroup matching entries under their uploads for rendering
+      const byUpload = new Map();
+      (data.results || []).forEach(r => {
+        if(!byUpload.has(r.upload_id)) byUpload.set(r.upload_id, {...r, logs: []});
+        byUpload.get(r.upload_id).logs.push(r);
+      });
+      renderLogs([...byUpload.values()].map(u => ({...u, log_count: u.logs.length})));
+    } catch(e) {
+      document.getElementById('content').innerHTML = '<div class="empty">Search failed: ' + e.message + '</div>';
+    }
+  }, 300);
+}
+
+// Live tail: new entries arrive over SSE instead of re-running the /logs query
+let tail = null;
+let renderPending = false;
+window.startTail = function() {
+  if (tail) { tail.close(); tail = null; }
+  if (!document.getElementById('liveTail').checked || !window.EventSource) return;
+  const level = document.getElementById('levelFilter').value;
+  tail = new EventSource(API + '/logs/tail' + (level ? '?level=' + level : ''));
+  tail.addEventListener('log', function(e) {
+    const entry = JSON.parse(e.data);
+    let upload = allData.find(u => u.upload_id === entry.upload_id);
+    if (!upload) {
+      upload = {...entry, logs: [], log_count: 0};
+      allData.unshift(upload);
+    }
+    upload.logs.push(entry);
+    upload.log_count = Math.max(upload.log_count, upload.logs.length);
+    if (!renderPending && !document.getElementById('searchFilter').value.trim()) {
+      renderPending = true;
+      requestAnimationFrame(function() { renderPending = false; renderLogs(allData); });
+    }
+  });
 }
 
 function escapeHtml(s) { const d=document.createElement('div');d.textContent=s;return d.innerHTML; }
@@ -939,14 +1687,15 @@ window.clearAll = async function() {
 }
 
 window.exportLogs = function() {
-  const blob = new Blob([JSON.stringify(allData, null, 2)], {type:'application/json'});
+  // Streamed by the server as .ndjson.gz; the browser saves it as it arrives
+  const level = document.getElementById('levelFilter').value;
   const a = document.createElement('a');
-  a.href = URL.createObjectURL(blob);
-  a.download = 'zeus-glass-logs-' + new Date().toISOString().slice(0,10) + '.json';
+  a.href = API + '/logs/export' + (level ? '?level=' + level : '');
   a.click();
 }
 
 loadLogs();
+startTail();
 });
 </script>
 </body>
@@ -1009,6 +1758,7 @@ async def upload_debug_to_gofile(request: DebugBundleRequest):
             "interaction_count": len(request.interaction_logs),
             "error_count": len(request.error_logs),
             "nav_count": len(request.navigation_history),
+            "expires_at": retention_policy.bundle_expiry(datetime.utcnow()),
         }
         await db.debug_bundles.insert_one(doc)
 
@@ -1057,6 +1807,10 @@ async def upload_debug_to_gofile(request: DebugBundleRequest):
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1071,7 +1825,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
@@ -1,8 +1,12 @@
 """
 Backend API Tests for Zeus Glass Debrid Features
 Tests debrid cache search endpoints and related APIs
+
+Run the server under test with PRERESOLVE_ENABLED=false so searches never
+pre-resolve stream links in the background
 """
 
+import json
 import pytest
 import requests
 import os
@@ -43,6 +47,24 @@ class TestHealthAndBasicEndpoints:
         print(f"✓ Status POST endpoint working: {data['id']}")
 
 
+class TestMetricsEndpoint:
+    """Test the cache/background job metrics endpoint"""
+    
+    def test_metrics_endpoint(self):
+        """GET /api/metrics - should expose cache warmer and cache statistics"""
+        response = requests.get(f"{BASE_URL}/api/metrics", timeout=10)
+        assert response.status_code == 200
+        data = response.json()
+        assert "cache_warmer" in data
+        assert "warm_hits" in data["cache_warmer"]
+        assert "indexer_cache" in data
+        assert "flights_shared" in data["cluster"]
+        assert "hosts" in data["admission"]
+        assert "hit_rate" in data["prefetch"]
+        assert "hit_rate" in data["preresolve"]
+        print(f"✓ Metrics endpoint working: warmer runs={data['cache_warmer'].get('runs')}")
+
+
 class TestDebridCacheSearchMovie:
     """Test debrid cache search for movies - critical feature"""
     
@@ -171,6 +193,64 @@ class TestDebridCacheSearchTV:
         print(f"✓ TV cache search (GoT S01E01) returned {data['count']} results")
 
 
+class TestDebridSeasonMatrix:
+    """Test the season availability matrix endpoint"""
+    
+    def test_season_matrix(self):
+        """GET /api/debrid/cache/season - one entry per requested episode"""
+        params = {"imdb_id": "tt0903747", "season": 1, "start": 1, "end": 3, "token": "invalid-token"}
+        response = requests.get(f"{BASE_URL}/api/debrid/cache/season", params=params, timeout=60)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is True
+        assert [entry["episode"] for entry in data["episodes"]] == [1, 2, 3]
+        print(f"✓ Season matrix: {data['cached_episodes']} cached episodes")
+    
+    def test_season_matrix_rejects_bad_range(self):
+        """GET /api/debrid/cache/season - end before start is a 400"""
+        params = {"imdb_id": "tt0903747", "season": 1, "start": 5, "end": 2, "token": "invalid-token"}
+        response = requests.get(f"{BASE_URL}/api/debrid/cache/season", params=params, timeout=10)
+        assert response.status_code == 400
+
+
+class TestBulkAvailabilityJobs:
+    """Test bulk watchlist availability jobs"""
+    
+    def test_submit_and_stream_job(self):
+        """POST /api/debrid/availability/jobs then stream NDJSON results"""
+        payload = {"imdb_ids": ["tt1375666", "tt0816692"], "alldebrid_apikey": "test_key"}
+        response = requests.post(f"{BASE_URL}/api/debrid/availability/jobs", json=payload, timeout=15)
+        assert response.status_code == 200
+        job = response.json()
+        assert job["total"] == 2
+        
+        stream = requests.get(f"{BASE_URL}{job['stream_url']}", timeout=120)
+        assert stream.status_code == 200
+        assert "application/x-ndjson" in stream.headers.get("content-type", "")
+        lines = [json.loads(line) for line in stream.text.splitlines() if line]
+        assert [line["type"] for line in lines].count("result") == 2
+        assert lines[-1]["type"] == "done"
+        print(f"✓ Bulk availability job streamed {len(lines) - 1} results")
+    
+    def test_unknown_job_is_404(self):
+        """GET /api/debrid/availability/jobs/{id} - unknown job"""
+        response = requests.get(f"{BASE_URL}/api/debrid/availability/jobs/does-not-exist", timeout=10)
+        assert response.status_code == 404
+
+
+class TestNextEpisodePrefetch:
+    """Test the prefetched next-episode lookup"""
+    
+    def test_prefetched_miss(self):
+        """GET /api/debrid/cache/prefetched - nothing prefetched is a miss, not an error"""
+        params = {"token": "test", "imdb_id": "tt0903747", "season": 1, "episode": 2}
+        response = requests.get(f"{BASE_URL}/api/debrid/cache/prefetched", params=params, timeout=10)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["hit"] is False
+        assert data["result"] is None
+
+
 class TestDebridStreamEndpoint:
     """Test the stream link generation endpoint"""
     
@@ -219,6 +299,44 @@ class TestDebridPremiumizeCacheCheck:
         print(f"✓ Premiumize cache check endpoint exists: status {response.status_code}")
 
 
+class TestUnifiedDebridCacheCheck:
+    """Test the multi-provider cache check endpoint"""
+    
+    def test_unified_cache_check(self):
+        """POST /api/debrid/cache/check - one merged availability map for all providers"""
+        info_hash = "0000000000000000000000000000000000000000"
+        payload = {
+            "hashes": [info_hash, info_hash.upper(), "not-a-hash"],
+            "alldebrid_apikey": "test_key",
+            "premiumize_apikey": "test_key",
+            "torbox_token": "test_token",
+        }
+        response = requests.post(f"{BASE_URL}/api/debrid/cache/check", json=payload, timeout=30)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 1, "Hashes should be normalized and de-duplicated"
+        assert set(data["providers"]) == {"alldebrid", "premiumize", "torbox"}
+        assert info_hash in data["availability"]
+        print(f"✓ Unified cache check: {data['providers']}")
+
+    def test_unified_cache_check_reports_provider_error(self):
+        """POST /api/debrid/cache/check - a rejected token is an error, not "nothing cached" """
+        info_hash = "0000000000000000000000000000000000000000"
+        payload = {"hashes": [info_hash], "real_debrid_token": "invalid-token"}
+        response = requests.post(f"{BASE_URL}/api/debrid/cache/check", json=payload, timeout=30)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["providers"]["real-debrid"]["status"] == "error"
+        assert "real-debrid" not in data["availability"][info_hash]
+        print("✓ Failed provider reported as error")
+
+    def test_unified_cache_check_requires_credentials(self):
+        """POST /api/debrid/cache/check - 400 without any provider configured"""
+        payload = {"hashes": ["0000000000000000000000000000000000000000"]}
+        response = requests.post(f"{BASE_URL}/api/debrid/cache/check", json=payload, timeout=10)
+        assert response.status_code == 400
+
+
 class TestTorrentioEndpoints:
     """Test Torrentio indexer endpoints"""
     
@@ -258,6 +376,64 @@ class TestTorrentioEndpoints:
         print(f"✓ Torrentio TV endpoint: {data['count']} results")
 
 
+class TestSearchResponseSerialization:
+    """Test content negotiation on the search endpoints"""
+
+    def test_search_returns_json_by_default(self):
+        """Search responses should stay JSON when msgpack isn't requested"""
+        params = {"imdb_id": "tt1375666", "title": "Inception", "year": 2010}
+        response = requests.get(f"{BASE_URL}/api/torrents/torrentio/movie", params=params, timeout=30)
+
+        assert response.status_code == 200
+        assert "application/json" in response.headers.get("content-type", "")
+        assert "Accept" in response.headers.get("vary", "")
+        print("✓ Search endpoint returns JSON by default")
+
+    def test_search_returns_msgpack_when_accepted(self):
+        """Search responses should switch to msgpack with Accept: application/msgpack"""
+        params = {"imdb_id": "tt1375666", "title": "Inception", "year": 2010}
+        response = requests.get(
+            f"{BASE_URL}/api/torrents/torrentio/movie",
+            params=params,
+            headers={"Accept": "application/msgpack"},
+            timeout=30
+        )
+
+        assert response.status_code == 200
+        assert "application/msgpack" in response.headers.get("content-type", "")
+        assert len(response.content) > 0
+        print(f"✓ msgpack response: {len(response.content)} bytes")
+
+
+class TestConditionalGet:
+    """Test ETag / If-None-Match handling on cached search results"""
+
+    def test_search_etag_revalidation(self):
+        """A repeated search with If-None-Match should get 304 from the cache"""
+        params = {"imdb_id": "tt0903747", "title": "Breaking Bad", "season": 1, "episode": 1}
+        first = requests.get(f"{BASE_URL}/api/torrents/torrentio/tv", params=params, timeout=30)
+        assert first.status_code == 200
+
+        if first.json().get("count", 0) == 0:
+            pytest.skip("No results - empty searches are not cached")
+
+        # The first response may come straight from upstream; the second is served from cache
+        second = requests.get(f"{BASE_URL}/api/torrents/torrentio/tv", params=params, timeout=30)
+        etag = second.headers.get("etag")
+        assert etag, "Cached search response should carry an ETag"
+        assert second.headers.get("last-modified"), "Cached search response should carry Last-Modified"
+
+        revalidated = requests.get(
+            f"{BASE_URL}/api/torrents/torrentio/tv",
+            params=params,
+            headers={"If-None-Match": etag},
+            timeout=30
+        )
+        assert revalidated.status_code == 304, f"Expected 304, got {revalidated.status_code}"
+        assert len(revalidated.content) == 0
+        print(f"✓ Conditional GET returned 304 for ETag {etag}")
+
+
 class TestRealDebridAuthProxyEndpoints:
     """Test Real-Debrid OAuth proxy endpoints"""
     
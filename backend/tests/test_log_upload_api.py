@@ -2,15 +2,48 @@
 Test suite for Zeus Glass Log Upload API endpoints
 Tests: POST /api/logs/upload, GET /api/logs, GET /api/logs/dashboard, DELETE /api/logs/clear
 """
+import gzip
+import json
 import pytest
 import requests
 import os
+import threading
+import time
 import uuid
 from datetime import datetime
 
 BASE_URL = os.environ.get('EXPO_PUBLIC_BACKEND_URL', 'https://zeus-glass.preview.emergentagent.com').rstrip('/')
 
 
+def sample_logs():
+    """An error (with stack), a warning and an info entry"""
+    return [
+        {
+            "id": f"log_{uuid.uuid4().hex[:8]}",
+            "timestamp": datetime.utcnow().isoformat(),
+            "level": "error",
+            "message": "Test error message from pytest",
+            "context": "TestContext",
+            "stack": "Error: Test stack trace\n  at test.py:1",
+            "deviceInfo": {"platform": "test", "version": "1.0"}
+        },
+        {
+            "id": f"log_{uuid.uuid4().hex[:8]}",
+            "timestamp": datetime.utcnow().isoformat(),
+            "level": "warn",
+            "message": "Test warning message",
+            "context": "TestWarning"
+        },
+        {
+            "id": f"log_{uuid.uuid4().hex[:8]}",
+            "timestamp": datetime.utcnow().isoformat(),
+            "level": "info",
+            "message": "Test info message",
+            "context": "TestInfo"
+        }
+    ]
+
+
 class TestLogUploadAPI:
     """Tests for the log upload and retrieval endpoints"""
     
@@ -190,6 +223,211 @@ class TestLogRetrievalAPI:
             assert "_id" not in upload, f"MongoDB _id should be excluded from response, found: {upload.keys()}"
         print("✓ MongoDB _id correctly excluded from responses")
 
+    def test_get_logs_keyset_pagination(self):
+        """GET /api/logs?cursor= - pages don't overlap and entries honour fields/entries"""
+        device_id = f"TEST_pages_{uuid.uuid4().hex[:8]}"
+        for _ in range(3):
+            requests.post(f"{BASE_URL}/api/logs/upload", json={"device_id": device_id, "logs": sample_logs()})
+        time.sleep(2)  # uploads are written behind
+
+        params = {"device_id": device_id, "limit": 2, "fields": "level,message", "entries": 1}
+        first = requests.get(f"{BASE_URL}/api/logs", params=params).json()
+        assert len(first["uploads"]) == 2
+        assert first["next_cursor"], "Expected a cursor for the next page"
+        for upload in first["uploads"]:
+            assert len(upload["logs"]) == 1
+            assert set(upload["logs"][0]) == {"level", "message"}
+            assert upload["log_count"] == 3 and upload["truncated"]
+
+        second = requests.get(f"{BASE_URL}/api/logs", params={**params, "cursor": first["next_cursor"]}).json()
+        assert len(second["uploads"]) == 1
+        assert second["next_cursor"] is None
+        first_ids = {u["upload_id"] for u in first["uploads"]}
+        assert second["uploads"][0]["upload_id"] not in first_ids
+        print("✓ Keyset pagination and projection work")
+
+    def test_get_logs_invalid_parameters(self):
+        """GET /api/logs - bad cursor, field or count mode is a 400"""
+        for params in ({"cursor": "not-a-cursor"}, {"fields": "password"}, {"count": "maybe"}):
+            response = requests.get(f"{BASE_URL}/api/logs", params=params)
+            assert response.status_code == 400, f"Expected 400 for {params}, got {response.status_code}"
+        print("✓ Invalid log query parameters rejected")
+
+    def test_log_stats_from_rollups(self):
+        """GET /api/logs/stats - counters include a fresh upload once rollups flush"""
+        before = requests.get(f"{BASE_URL}/api/logs/stats", params={"hours": 1}).json()
+        device_id = f"TEST_stats_{uuid.uuid4().hex[:8]}"
+        requests.post(f"{BASE_URL}/api/logs/upload", json={"device_id": device_id, "logs": sample_logs()})
+        time.sleep(7)  # rollup deltas are flushed every few seconds
+
+        response = requests.get(f"{BASE_URL}/api/logs/stats", params={"hours": 1})
+        assert response.status_code == 200
+        after = response.json()
+        for key in ("uploads", "entries", "devices", "levels", "app_versions", "platforms", "totals"):
+            assert key in after, f"Missing {key} in stats"
+        assert after["uploads"] >= before["uploads"] + 1
+        assert after["totals"]["uploads"] >= before["totals"]["uploads"] + 1
+        assert after["levels"].get("error", 0) >= before["levels"].get("error", 0) + 1
+        if not after["devices_capped"]:
+            assert after["devices"] >= before["devices"] + 1, "The new device should be counted"
+        assert requests.get(f"{BASE_URL}/api/logs/stats", params={"hours": 100000}).status_code == 400
+        print(f"✓ Log stats: {after['uploads']} uploads, {after['entries']} entries")
+
+    def test_error_groups_deduplicate_repeats(self):
+        """GET /api/logs/groups - repeated errors collapse into one fingerprinted group"""
+        device_id = f"TEST_groups_{uuid.uuid4().hex[:8]}"
+        for _ in range(2):
+            requests.post(f"{BASE_URL}/api/logs/upload", json={"device_id": device_id, "logs": sample_logs()})
+        time.sleep(7)  # group deltas are flushed every few seconds
+
+        response = requests.get(f"{BASE_URL}/api/logs/groups", params={"level": "error", "limit": 100})
+        assert response.status_code == 200
+        groups = [g for g in response.json()["groups"] if g["message"] == "Test error message from pytest"]
+        assert len(groups) == 1, f"Expected one group for the repeated error, got {len(groups)}"
+        assert groups[0]["count"] >= 2
+        assert "samples" not in groups[0]
+
+        detail = requests.get(f"{BASE_URL}/api/logs/groups/{groups[0]['fingerprint']}").json()["group"]
+        assert 1 <= len(detail["samples"]) <= 20
+        assert all(o["fingerprint"] == groups[0]["fingerprint"] for o in detail["occurrences"])
+        assert requests.get(f"{BASE_URL}/api/logs/groups/0000000000000000").status_code == 404
+        print(f"✓ Error group {groups[0]['fingerprint']}: {groups[0]['count']} occurrences")
+
+    def test_search_logs_full_text(self):
+        """GET /api/logs/search - finds stored entries by a word in their message"""
+        token = f"zgsearch{uuid.uuid4().hex[:10]}"
+        device_id = f"TEST_search_{uuid.uuid4().hex[:8]}"
+        logs = [dict(sample_logs()[0], message=f"Playback failed {token} on stream")]
+        requests.post(f"{BASE_URL}/api/logs/upload", json={"device_id": device_id, "logs": logs})
+        time.sleep(2)  # uploads are written behind
+
+        response = requests.get(f"{BASE_URL}/api/logs/search", params={"q": token, "level": "error"})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert len(results) == 1
+        assert token in results[0]["message"]
+        assert results[0]["device_id"] == device_id
+
+        assert requests.get(f"{BASE_URL}/api/logs/search", params={"q": " "}).status_code == 400
+        print("✓ Full-text log search works")
+
+    def test_export_logs_gzip_ndjson(self):
+        """GET /api/logs/export - streams matching entries as gzip NDJSON"""
+        device_id = f"TEST_export_{uuid.uuid4().hex[:8]}"
+        requests.post(f"{BASE_URL}/api/logs/upload", json={"device_id": device_id, "logs": sample_logs()})
+        time.sleep(2)  # uploads are written behind
+
+        response = requests.get(f"{BASE_URL}/api/logs/export", params={"device_id": device_id, "level": "error"})
+        assert response.status_code == 200
+        assert response.headers.get("content-type", "").startswith("application/gzip")
+        assert ".ndjson.gz" in response.headers.get("content-disposition", "")
+
+        lines = gzip.decompress(response.content).splitlines()
+        entries = [json.loads(line) for line in lines]
+        assert len(entries) == 1, f"Expected the one error entry, got {len(entries)}"
+        assert entries[0]["level"] == "error" and entries[0]["device_id"] == device_id
+        print(f"✓ Exported {len(entries)} entries as gzip NDJSON")
+
+    def test_ingest_gzip_ndjson(self):
+        """POST /api/logs/ingest - gzip NDJSON stream, invalid lines skipped and reported"""
+        logs = sample_logs()
+        lines = [{"device_id": f"TEST_ingest_{uuid.uuid4().hex[:8]}", "platform": "android-tv 10", "app_version": "1.5.0"}]
+        lines += logs[:2]
+        lines.append({"id": "bad", "level": "error"})  # no timestamp/message
+        body = gzip.compress("\n".join(json.dumps(line) for line in lines).encode())
+
+        response = requests.post(
+            f"{BASE_URL}/api/logs/ingest",
+            data=body,
+            headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+        )
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        data = response.json()
+        assert data["log_count"] == 2
+        assert data["rejected"] == 1
+        assert data["errors"][0]["line"] == 4
+
+        response = requests.post(f"{BASE_URL}/api/logs/ingest", data=json.dumps(logs[0]))
+        assert response.status_code == 422, "An entry without the header line should be rejected"
+        print("✓ Gzip NDJSON ingest works")
+
+    def test_ingest_aborted_stream_keeps_summary(self):
+        """POST /api/logs/ingest - entries queued before a failure still have their summary"""
+        device_id = f"TEST_aborted_{uuid.uuid4().hex[:8]}"
+        log = sample_logs()[1]
+        lines = [json.dumps({"device_id": device_id})] + [json.dumps(log)] * 600
+        body = gzip.compress("\n".join(lines).encode())[:-8]  # no gzip trailer: one full batch, then 400
+
+        response = requests.post(f"{BASE_URL}/api/logs/ingest", data=body)
+        assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+        time.sleep(2)  # uploads are written behind
+
+        data = requests.get(f"{BASE_URL}/api/logs", params={"device_id": device_id, "entries": 1}).json()
+        assert len(data["uploads"]) == 1, "The accepted batch should have an upload summary"
+        assert data["uploads"][0]["log_count"] == 500
+        print("✓ Aborted ingest stream leaves no orphan entries")
+
+    def test_log_archives_listing(self):
+        """GET /api/logs/archives - lists compacted archives; unknown archive is 404"""
+        response = requests.get(f"{BASE_URL}/api/logs/archives", params={"limit": 5})
+        assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data["archives"], list)
+        for archive in data["archives"]:
+            assert "data" not in archive
+            assert {"archive_id", "day", "level", "count"} <= set(archive)
+
+        response = requests.get(f"{BASE_URL}/api/logs/archives/1970-01-01:error:none/download")
+        assert response.status_code == 404
+        print(f"✓ Log archives listed: {len(data['archives'])}")
+
+    def test_live_tail_pushes_new_entries(self):
+        """GET /api/logs/tail - SSE stream delivers a matching entry uploaded after subscribing"""
+        device_id = f"TEST_tail_{uuid.uuid4().hex[:8]}"
+        stream = requests.get(
+            f"{BASE_URL}/api/logs/tail",
+            params={"device_id": device_id, "level": "error"},
+            stream=True,
+            timeout=(10, 30)
+        )
+        assert stream.status_code == 200
+        assert stream.headers.get("content-type", "").startswith("text/event-stream")
+
+        # Without a change stream only the worker that took the upload
+        # publishes it, so keep uploading until one lands on ours
+        received = threading.Event()
+
+        def upload_until_received():
+            deadline = time.monotonic() + 20
+            while not received.is_set() and time.monotonic() < deadline:
+                requests.post(f"{BASE_URL}/api/logs/upload", json={"device_id": device_id, "logs": sample_logs()})
+                received.wait(1)
+
+        uploader = threading.Thread(target=upload_until_received, daemon=True)
+        uploader.start()
+        event, entry = None, None
+        deadline = time.monotonic() + 25  # heartbeats keep an idle stream open
+        try:
+            for line in stream.iter_lines(decode_unicode=True):
+                if time.monotonic() > deadline:
+                    break
+                if line and line.startswith("data: ") and event == "log":
+                    entry = json.loads(line[len("data: "):])
+                    break
+                if line and line.startswith("event: "):
+                    event = line[len("event: "):]
+        except requests.exceptions.ConnectionError:
+            pass  # read timeout: nothing arrived
+        finally:
+            received.set()
+            stream.close()
+            uploader.join()
+
+        assert entry is not None, "Stream ended without a log event"
+        assert entry["device_id"] == device_id
+        assert entry["level"] == "error"
+        print("✓ Live tail delivered the new error entry")
+
 
 class TestLogDashboardAPI:
     """Tests for GET /api/logs/dashboard endpoint"""
@@ -223,6 +461,16 @@ class TestLogDashboardAPI:
         assert "levelFilter" in html, "Dashboard should have level filter"
         print("✓ Dashboard has all required UI features")
 
+    def test_dashboard_is_compressed(self):
+        """GET /api/logs/dashboard - large HTML should be served compressed when accepted"""
+        response = requests.get(f"{BASE_URL}/api/logs/dashboard", headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == 200
+        assert response.headers.get("content-encoding") == "gzip", \
+            f"Expected gzip encoding, got {response.headers.get('content-encoding')}"
+        assert "Log Dashboard" in response.text
+        print("✓ Dashboard served gzip-compressed")
+
 
 class TestLogClearAPI:
     """Tests for DELETE /api/logs/clear endpoint"""
@@ -4,6 +4,8 @@ from typing import List, Dict, Optional
 import logging
 import re
 
+from realdebrid_scheduler import rd_scheduler, PRIORITY_PLAY, PRIORITY_BROWSE
+
 logger = logging.getLogger(__name__)
 
 class TorrentioIndexer:
@@ -15,6 +17,11 @@ class TorrentioIndexer:
     
     BASE_URL = "https://torrentio.strem.fun"
     
+    @staticmethod
+    def catalog_url(catalog_type: str, catalog_id: str) -> str:
+        """Torrentio catalog endpoint (used by the catalog proxy and cache warmer)"""
+        return f"{TorrentioIndexer.BASE_URL}/catalog/{catalog_type}/{catalog_id}.json"
+    
     @staticmethod
     def search_movie(imdb_id: str = None, title: str = None, year: int = None) -> List[Dict]:
         """
@@ -204,17 +211,16 @@ class RealDebridIntegration:
     BASE_URL = "https://api.real-debrid.com/rest/1.0"
     
     @staticmethod
-    def add_magnet(magnet: str, token: str) -> Optional[Dict]:
+    def add_magnet(magnet: str, token: str, priority: int = PRIORITY_PLAY) -> Optional[Dict]:
         """
         Add a magnet link to Real-Debrid
         Returns torrent ID if successful
         """
         try:
             url = f"{RealDebridIntegration.BASE_URL}/torrents/addMagnet"
-            headers = {"Authorization": f"Bearer {token}"}
             data = {"magnet": magnet}
             
-            response = requests.post(url, headers=headers, data=data, timeout=10)
+            response = rd_scheduler.request("POST", url, token, priority, data=data, timeout=10)
             
             if response.status_code == 201:
                 return response.json()
@@ -227,17 +233,16 @@ class RealDebridIntegration:
             return None
     
     @staticmethod
-    def select_files(torrent_id: str, file_ids: str, token: str) -> bool:
+    def select_files(torrent_id: str, file_ids: str, token: str, priority: int = PRIORITY_PLAY) -> bool:
         """
         Select which files to download from torrent
         file_ids: comma-separated string like "1,2,3" or "all"
         """
         try:
             url = f"{RealDebridIntegration.BASE_URL}/torrents/selectFiles/{torrent_id}"
-            headers = {"Authorization": f"Bearer {token}"}
             data = {"files": file_ids}
             
-            response = requests.post(url, headers=headers, data=data, timeout=10)
+            response = rd_scheduler.request("POST", url, token, priority, data=data, timeout=10)
             return response.status_code == 204
             
         except Exception as e:
@@ -245,13 +250,12 @@ class RealDebridIntegration:
             return False
     
     @staticmethod
-    def get_torrent_info(torrent_id: str, token: str) -> Optional[Dict]:
+    def get_torrent_info(torrent_id: str, token: str, priority: int = PRIORITY_PLAY) -> Optional[Dict]:
         """Get info about a torrent"""
         try:
             url = f"{RealDebridIntegration.BASE_URL}/torrents/info/{torrent_id}"
-            headers = {"Authorization": f"Bearer {token}"}
             
-            response = requests.get(url, headers=headers, timeout=10)
+            response = rd_scheduler.request("GET", url, token, priority, timeout=10)
             
             if response.status_code == 200:
                 return response.json()
@@ -263,16 +267,15 @@ class RealDebridIntegration:
             return None
     
     @staticmethod
-    def unrestrict_link(link: str, token: str) -> Optional[Dict]:
+    def unrestrict_link(link: str, token: str, priority: int = PRIORITY_PLAY) -> Optional[Dict]:
         """
         Unrestrict a hoster link to get direct download URL
         """
         try:
             url = f"{RealDebridIntegration.BASE_URL}/unrestrict/link"
-            headers = {"Authorization": f"Bearer {token}"}
             data = {"link": link}
             
-            response = requests.post(url, headers=headers, data=data, timeout=10)
+            response = rd_scheduler.request("POST", url, token, priority, data=data, timeout=10)
             
             if response.status_code == 200:
                 return response.json()
@@ -285,13 +288,12 @@ class RealDebridIntegration:
             return None
     
     @staticmethod
-    def get_all_torrents(token: str) -> List[Dict]:
+    def get_all_torrents(token: str, priority: int = PRIORITY_BROWSE) -> List[Dict]:
         """Get all user's torrents"""
         try:
             url = f"{RealDebridIntegration.BASE_URL}/torrents"
-            headers = {"Authorization": f"Bearer {token}"}
             
-            response = requests.get(url, headers=headers, timeout=10)
+            response = rd_scheduler.request("GET", url, token, priority, timeout=10)
             
             if response.status_code == 200:
                 return response.json()
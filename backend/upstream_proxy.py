@@ -0,0 +1,136 @@
+"""
+Upstream Passthrough Proxy
+Streams an upstream response body straight to the client without parsing
+it, so CPU and memory per request don't grow with the payload size
+"""
+
+import logging
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import httpx
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from compression import StreamCompressor, accepts_encoding, negotiate_encoding, skip_compression, SUPPORTED_ENCODINGS
+
+logger = logging.getLogger(__name__)
+
+# Upstream headers worth forwarding to the client
+FORWARDED_HEADERS = ("content-type", "cache-control", "etag", "last-modified", "expires")
+
+# Bodies larger than this are streamed but not handed to on_complete
+CAPTURE_LIMIT = 2 * 1024 * 1024
+
+
+async def _captured(
+    chunks: AsyncIterator[bytes],
+    on_complete: Callable[[bytes, str, str], None],
+    encoding: str,
+    media_type: str,
+) -> AsyncIterator[bytes]:
+    """Tee a byte stream into a bounded buffer, reporting it once fully sent"""
+    buffer = bytearray()
+    overflow = False
+    async for chunk in chunks:
+        if not overflow:
+            buffer.extend(chunk)
+            if len(buffer) > CAPTURE_LIMIT:
+                overflow = True
+                buffer = bytearray()
+        yield chunk
+    if not overflow:
+        on_complete(bytes(buffer), encoding, media_type)
+
+
+async def _compressed(chunks: AsyncIterator[bytes], compressor: StreamCompressor) -> AsyncIterator[bytes]:
+    """Compress a byte stream chunk by chunk"""
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def stream_upstream(
+    request: Request,
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 20.0,
+    compress: bool = True,
+    on_complete: Optional[Callable[[bytes, str, str], None]] = None,
+) -> StreamingResponse:
+    """
+    Proxy a GET to `url`, streaming the body through untouched
+
+    - If upstream already compressed the body in a coding the client accepts,
+      the raw bytes and Content-Encoding are passed through as-is
+    - If upstream sent identity and `compress` is set, the body is gzip/brotli
+      compressed on the fly according to the client's Accept-Encoding;
+      without `compress` it goes out uncompressed (CompressionMiddleware
+      is told to skip it too)
+    - Upstream 4xx/5xx raise httpx.HTTPStatusError like raise_for_status()
+    - `on_complete(body, content_encoding, media_type)` receives the body
+      once it has been fully streamed (bodies over CAPTURE_LIMIT are skipped)
+    """
+    client_accept = request.headers.get("accept-encoding", "")
+    upstream_headers = dict(headers or {})
+    upstream_headers["Accept-Encoding"] = ", ".join(SUPPORTED_ENCODINGS)
+
+    http_client = httpx.AsyncClient(timeout=timeout)
+    try:
+        upstream = await http_client.send(
+            http_client.build_request("GET", url, headers=upstream_headers),
+            stream=True,
+        )
+    except Exception:
+        await http_client.aclose()
+        raise
+
+    async def close():
+        await upstream.aclose()
+        await http_client.aclose()
+
+    if upstream.is_error:
+        await close()
+        upstream.raise_for_status()
+
+    response_headers = {
+        name: upstream.headers[name]
+        for name in FORWARDED_HEADERS
+        if name in upstream.headers
+    }
+    upstream_encoding = upstream.headers.get("content-encoding", "identity").lower()
+    media_type = upstream.headers.get("content-type", "application/json")
+
+    if upstream_encoding != "identity" and accepts_encoding(client_accept, upstream_encoding):
+        # Zero-copy: forward the encoded bytes exactly as received
+        body = upstream.aiter_raw()
+        if on_complete:
+            body = _captured(body, on_complete, upstream_encoding, media_type)
+        response_headers["Content-Encoding"] = upstream_encoding
+        if "content-length" in upstream.headers:
+            response_headers["Content-Length"] = upstream.headers["content-length"]
+    else:
+        # Either identity upstream, or a coding the client can't read (decoded here)
+        body = upstream.aiter_raw() if upstream_encoding == "identity" else upstream.aiter_bytes()
+        if on_complete:
+            body = _captured(body, on_complete, "identity", media_type)
+        encoding = negotiate_encoding(client_accept) if compress else None
+        if not compress:
+            skip_compression(request.scope)
+        if encoding:
+            body = _compressed(body, StreamCompressor(encoding))
+            response_headers["Content-Encoding"] = encoding
+        elif upstream_encoding == "identity" and "content-length" in upstream.headers:
+            response_headers["Content-Length"] = upstream.headers["content-length"]
+
+    response_headers["Vary"] = "Accept-Encoding"
+
+    return StreamingResponse(
+        body,
+        status_code=upstream.status_code,
+        headers=response_headers,
+        media_type=media_type,
+        background=BackgroundTask(close),
+    )